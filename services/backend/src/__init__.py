@@ -67,7 +67,7 @@ def create_app(script_info=None):
 
     # set up extensions
     db.init_app(app)
-    cors.init_app(app, resources={r"*": {"origins": "*"}})
+    cors.init_app(app, resources={r"*": {"origins": "*"}}, expose_headers=["X-Next-Cursor", "Server-Timing"])
     bcrypt.init_app(app)
     if os.getenv("FLASK_ENV") == "development":
         admin.init_app(app)
@@ -77,6 +77,16 @@ def create_app(script_info=None):
 
     api.init_app(app)
 
+    if app.config.get("TRACING_ENABLED"):
+        from src.api.metrics.tracing import finish_trace
+
+        app.after_request(finish_trace)
+
+    if app.config.get("METRIC_SINK_ENABLED"):
+        from src.api.metrics.sink import MetricSink
+
+        MetricSink().start(app)
+
     # shell context for flask cli
     @app.shell_context_processor
     def ctx():
@@ -86,5 +96,23 @@ def create_app(script_info=None):
         db.create_all() # only create tables if they don't exist
         before_first_request_checks()
         before_first_request_instantiate(app)
+        if app.config.get("INCREMENTAL_INGESTION_INTERVAL_SECONDS"):
+            from src.data_structures.user_based_recommender.data_collector import (
+                start_incremental_ingestion,
+            )
+
+            start_incremental_ingestion(app)
+        if app.config.get("POPULARITY_LEADERBOARD_REFRESH_SECONDS"):
+            from src.data_structures.popularity_leaderboard import start_leaderboard_refresh
+
+            start_leaderboard_refresh(app)
+        if app.config.get("CONTENT_ENGAGEMENT_STATS_ROLLUP_SECONDS"):
+            from src.api.engagement.stats import start_content_engagement_stats_rollup
+
+            start_content_engagement_stats_rollup(app)
+        if app.config.get("ANN_REBUILD_INTERVAL_SECONDS"):
+            from src.data_structures.approximate_nearest_neighbor.two_tower_ann import start_index_refresh
+
+            start_index_refresh(app)
         print("FULLY DONE INSTANTIATION USE THE APP")
     return app
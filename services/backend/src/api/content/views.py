@@ -5,13 +5,10 @@ import uuid
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from src.api.content.models import MediaType
-from src.api.engagement.crud import (
-    get_dislike_count_by_content_id,
-    get_engagement_by_content_and_user_and_type,
-    get_like_count_by_content_id,
-)
-from src.api.engagement.models import EngagementType, LikeDislike
+from src.api.engagement.crud import get_like_dislike_data_by_content_ids
+from src.api.engagement.models import LikeDislike
 from src.api.utils.auth_utils import get_user
+from src.data_structures.feed_cursor import FeedCursor
 from src.recommendation_system.recommendation_flow.retriever import (
     ControllerEnum,
     get_content_data,
@@ -26,6 +23,7 @@ parser.add_argument("limit")
 parser.add_argument("controller")
 parser.add_argument("content_id")
 parser.add_argument("seed")
+parser.add_argument("cursor")
 
 controllers = content_namespace.model(
     "Controllers", {"controller": fields.String(required=True)}
@@ -56,23 +54,16 @@ content = content_namespace.model(
 
 
 def add_content_data(responses, user_id):
-    # TODO, can we do this all in one query to be faster?
+    like_dislike_data = get_like_dislike_data_by_content_ids(
+        user_id, [response["id"] for response in responses]
+    )
     for response in responses:
-        response["total_likes"] = get_like_count_by_content_id(response["id"])
-        response["total_dislikes"] = get_dislike_count_by_content_id(response["id"])
-
-        user_likes = get_engagement_by_content_and_user_and_type(
-            user_id, response["id"], EngagementType.Like
-        )
-        response["user_likes"] = (
-            user_likes.engagement_value == int(LikeDislike.Like)
-            if user_likes
-            else False
-        )
-        response["user_dislikes"] = (
-            user_likes.engagement_value == int(LikeDislike.Dislike)
-            if user_likes
-            else False
+        data = like_dislike_data[response["id"]]
+        response["total_likes"] = data["total_likes"]
+        response["total_dislikes"] = data["total_dislikes"]
+        response["user_likes"] = data["user_engagement_value"] == int(LikeDislike.Like)
+        response["user_dislikes"] = data["user_engagement_value"] == int(
+            LikeDislike.Dislike
         )
 
         if response.get("text") is None:
@@ -95,6 +86,7 @@ class ListControllers(Resource):
 class ContentPagination(Resource):
     @content_namespace.marshal_with(content, as_list=True)
     @content_namespace.response(200, "Success", model=content, as_list=True)
+    @content_namespace.response(400, "Invalid cursor")
     @content_namespace.response(500, "ERROR")
     def get(self):
         """
@@ -121,6 +113,19 @@ class ContentPagination(Resource):
             or ControllerEnum.RANDOM.human_string()
         )
         seed = float(request.args.get("seed", random.random()))
+        # keyset pagination, an empty cursor starts the feed and X-Next-Cursor continues it
+        cursor = None
+        if "cursor" in request.args:
+            try:
+                if request.args["cursor"]:
+                    cursor = FeedCursor.decode(request.args["cursor"])
+                else:
+                    cursor = FeedCursor(limit, seed)
+            except ValueError as e:
+                print(e)
+                return [{"errors": str(e), "id": 0}], 400
+            page, limit, seed = cursor.page, cursor.limit, cursor.seed
+        request.feed_cursor = cursor
         offset = page * limit
         # logged-out user is 0
         # don't need page for random (most of the time)
@@ -148,6 +153,8 @@ class ContentPagination(Resource):
             print(f"failed to retrieve get_content_data {e} for {request.args.get('controller')}")
             print(traceback.format_exc())
             return [{ "errors": str(e), "id": 0, "traceback": traceback.format_exc()}], 500
+        if cursor is not None:
+            return add_content_data(responses, user_id), 200, {"X-Next-Cursor": cursor.next_cursor().encode()}
         return add_content_data(responses, user_id), 200
 
 
@@ -1,6 +1,9 @@
 from sqlalchemy import func
 from src import db
 from src.api.engagement.models import Engagement, EngagementType, LikeDislike
+from src.api.engagement.stats import apply_engagement_change, get_content_engagement_stats
+from src.data_structures.artist_style_lookup import invalidate_user_styles, record_user_style_engagement
+from src.data_structures.user_embedding_cache import invalidate_user_embeddings
 
 
 def get_all_engagements():
@@ -49,6 +52,36 @@ def get_dislike_count_by_content_id(content_id):
     )
 
 
+def get_like_dislike_data_by_content_ids(user_id, content_ids):
+    """
+    Like/dislike totals plus the user's own like state for a batch of content, the
+    totals read from content_engagement_stats and the user's likes in one query.
+    Returns {content_id: {"total_likes", "total_dislikes", "user_engagement_value"}}
+    with zeroed entries for content nobody has liked or disliked yet
+    """
+    if not content_ids:
+        return {}
+    stats = get_content_engagement_stats(content_ids)
+    user_engagement_values = dict(
+        db.session.query(Engagement.content_id, func.max(Engagement.engagement_value))
+        .filter(
+            Engagement.user_id == user_id,
+            Engagement.content_id.in_(list(stats.index)),
+            Engagement.engagement_type == EngagementType.Like,
+        )
+        .group_by(Engagement.content_id)
+        .all()
+    )
+    return {
+        int(content_id): {
+            "total_likes": int(likes),
+            "total_dislikes": int(dislikes),
+            "user_engagement_value": user_engagement_values.get(content_id),
+        }
+        for content_id, likes, dislikes in zip(stats.index, stats["likes"], stats["dislikes"])
+    }
+
+
 def get_all_engagements_by_user_id(user_id):
     return Engagement.query.filter_by(user_id=user_id).all()
 
@@ -89,13 +122,20 @@ def add_engagement(user_id, content_id, engagement_type, engagement_value, metad
             engagement_metadata=metadata,
         )
     db.session.add(engagement)
+    apply_engagement_change(content_id, engagement_type, new_value=engagement_value, added=True)
     db.session.commit()
+    invalidate_user_embeddings(user_id)
+    record_user_style_engagement(user_id, content_id)
     return engagement
 
 
 def update_engagement(engagement, engagement_value):
+    apply_engagement_change(
+        engagement.content_id, engagement.engagement_type, engagement.engagement_value, engagement_value
+    )
     engagement.engagement_value = engagement_value
     db.session.commit()
+    invalidate_user_embeddings(engagement.user_id)
 
 
 def increment_engagement(engagement_id, increment):
@@ -105,12 +145,23 @@ def increment_engagement(engagement_id, increment):
         .filter_by(id=engagement_id)
         .first()
     )
+    apply_engagement_change(
+        engagement.content_id, engagement.engagement_type,
+        engagement.engagement_value, engagement.engagement_value + increment,
+    )
     engagement.engagement_value += increment
     db.session.commit()
+    invalidate_user_embeddings(engagement.user_id)
     return engagement
 
 
 def delete_engagement(engagement):
+    user_id = engagement.user_id
+    apply_engagement_change(
+        engagement.content_id, engagement.engagement_type, old_value=engagement.engagement_value, removed=True
+    )
     db.session.delete(engagement)
     db.session.commit()
+    invalidate_user_embeddings(user_id)
+    invalidate_user_styles(user_id)
     return
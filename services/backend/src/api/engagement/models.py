@@ -43,3 +43,19 @@ class Engagement(BaseModel):
     )  # the value of the engagement_type
     created_date = db.Column(db.DateTime, default=func.now(), nullable=False)
     engagement_metadata = db.Column(db.JSON, nullable=True)
+
+
+class ContentEngagementStats(BaseModel):
+    """
+    Per content engagement totals, kept up to date by the engagement crud in the same
+    transaction as the engagement and periodically rolled up from the engagement table
+    """
+    __tablename__ = "content_engagement_stats"
+    content_id = db.Column(
+        db.Integer, ForeignKey("content.id"), primary_key=True
+    )
+    likes = db.Column(db.Integer, default=0, nullable=False)  # Like engagements with value 1
+    dislikes = db.Column(db.Integer, default=0, nullable=False)  # Like engagements with value -1
+    engagement_time_sum = db.Column(db.BigInteger, default=0, nullable=False)  # MillisecondsEngagedWith values
+    engagement_time_count = db.Column(db.Integer, default=0, nullable=False)  # MillisecondsEngagedWith rows
+    updated_date = db.Column(db.DateTime, default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,163 @@
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from src import db
+from src.api.engagement.models import ContentEngagementStats, Engagement, EngagementType, LikeDislike
+
+STATS_COLUMNS = ["likes", "dislikes", "engagement_time_sum", "engagement_time_count"]
+
+
+def _contribution(engagement_type, engagement_value):
+    # what one engagement row adds to its content's stats, in STATS_COLUMNS order
+    if engagement_type == EngagementType.Like:
+        return (
+            int(engagement_value == int(LikeDislike.Like)),
+            int(engagement_value == int(LikeDislike.Dislike)),
+            0, 0,
+        )
+    if engagement_type == EngagementType.MillisecondsEngagedWith and engagement_value is not None:
+        return 0, 0, int(engagement_value), 1
+    return 0, 0, 0, 0
+
+
+def _increment(content_id, delta):
+    # relative update, so concurrent requests for the same content don't overwrite each other
+    return ContentEngagementStats.query.filter_by(content_id=content_id).update(
+        {getattr(ContentEngagementStats, column): getattr(ContentEngagementStats, column) + value
+         for column, value in delta.items()},
+        synchronize_session=False,
+    )
+
+
+def apply_engagement_change(content_id, engagement_type, old_value=None, new_value=None, added=False, removed=False):
+    """
+    Moves content_id's stats by what an engagement being added, changed from old_value to
+    new_value, or removed changes. Only stages the update, so it commits (or rolls back)
+    together with the engagement itself
+    """
+    before = _contribution(engagement_type, old_value) if not added else (0, 0, 0, 0)
+    after = _contribution(engagement_type, new_value) if not removed else (0, 0, 0, 0)
+    delta = dict(zip(STATS_COLUMNS, (a - b for a, b in zip(after, before))))
+    if content_id is None or not any(delta.values()):
+        return
+    if _increment(content_id, delta):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ContentEngagementStats(content_id=content_id, **delta))
+    except IntegrityError:
+        _increment(content_id, delta)  # another request created the row first
+
+
+def get_content_engagement_stats(content_ids):
+    """DataFrame indexed by content_id with STATS_COLUMNS, zeros for content without engagements"""
+    content_ids = list(content_ids)
+    stats = pd.DataFrame(
+        db.session.query(
+            ContentEngagementStats.content_id,
+            *[getattr(ContentEngagementStats, column) for column in STATS_COLUMNS],
+        ).filter(ContentEngagementStats.content_id.in_(content_ids)).all(),
+        columns=["content_id"] + STATS_COLUMNS,
+    ).set_index("content_id")
+    return stats.reindex(content_ids, fill_value=0).astype(np.int64)
+
+
+def _totals(content_ids=None):
+    # STATS_COLUMNS of each content, recomputed from the engagement table
+    is_like = Engagement.engagement_type == EngagementType.Like
+    is_time = Engagement.engagement_type == EngagementType.MillisecondsEngagedWith
+    query = (
+        db.session.query(
+            Engagement.content_id,
+            func.sum(case((is_like & (Engagement.engagement_value == int(LikeDislike.Like)), 1), else_=0)),
+            func.sum(case((is_like & (Engagement.engagement_value == int(LikeDislike.Dislike)), 1), else_=0)),
+            func.sum(case((is_time, Engagement.engagement_value), else_=0)),
+            func.count(case((is_time, Engagement.engagement_value), else_=None)),
+        )
+        .filter(Engagement.content_id.isnot(None))
+        .group_by(Engagement.content_id)
+    )
+    if content_ids is not None:
+        query = query.filter(Engagement.content_id.in_(content_ids))
+    return pd.DataFrame(
+        [[int(value or 0) for value in row] for row in query.all()],
+        columns=["content_id"] + STATS_COLUMNS,
+        dtype=np.int64,
+    ).set_index("content_id")
+
+
+def _reconcile(content_id):
+    # the stats row stays locked from the recompute to the commit, a concurrent increment
+    # waits and then lands on the corrected totals
+    stats = ContentEngagementStats.query.filter_by(content_id=content_id).with_for_update().first()
+    totals = _totals([content_id]).reindex([content_id], fill_value=0).loc[content_id]
+    values = {column: int(totals[column]) for column in STATS_COLUMNS}
+    if stats is None:
+        db.session.add(ContentEngagementStats(content_id=content_id, **values))
+    else:
+        for column, value in values.items():
+            setattr(stats, column, value)
+    db.session.commit()
+
+
+def rollup_content_engagement_stats():
+    """
+    Recomputes every content's stats from the engagement table and corrects the ones that
+    drifted from it (e.g. engagements written outside the crud). The full aggregate takes
+    no locks, each drifted content is then recomputed and written in its own short
+    transaction. Returns the number of content corrected
+    """
+    expected = _totals()
+    current = pd.DataFrame(
+        db.session.query(
+            ContentEngagementStats.content_id,
+            *[getattr(ContentEngagementStats, column) for column in STATS_COLUMNS],
+        ).all(),
+        columns=["content_id"] + STATS_COLUMNS,
+    ).set_index("content_id")
+    db.session.commit()  # ends the read, the corrections below each run in their own transaction
+    content_ids = expected.index.union(current.index)
+    drifted = content_ids[
+        (expected.reindex(content_ids, fill_value=0) != current.reindex(content_ids, fill_value=0)).any(axis=1)
+    ]
+    corrected = 0
+    for content_id in drifted.tolist():
+        try:
+            _reconcile(int(content_id))
+            corrected += 1
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to correct the engagement stats of content {content_id}, {e}")
+            print(traceback.format_exc())
+    return corrected
+
+
+def start_content_engagement_stats_rollup(app):
+    interval = app.config.get("CONTENT_ENGAGEMENT_STATS_ROLLUP_SECONDS")
+
+    def rollup():
+        with app.app_context():
+            try:
+                started = time.time()
+                count = rollup_content_engagement_stats()
+                print(f"corrected the engagement stats of {count} content in {time.time() - started:.1f}s")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to roll up content engagement stats, {e}")
+                print(traceback.format_exc())
+
+    rollup()  # fills the table before the first request
+
+    def run():
+        while True:
+            time.sleep(interval)
+            rollup()
+
+    thread = threading.Thread(target=run, name="content-engagement-stats", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,9 @@
+from datetime import datetime
+
 from sqlalchemy import func
 from src import db
 from src.api.metrics.models import Metric, MetricType
+from src.api.metrics.sink import MetricSink
 
 def get_all_metrics():
     return Metric.query.all()
@@ -10,6 +13,22 @@ def get_engagement_by_id(metric_id):
 
 def add_metric(request_id, team_name, funnel_name, user_id, content_id, 
     metric_funnel_type, metric_type, metric_value, metric_metadata):
+    sink = MetricSink()
+    if sink.is_running():
+        # written later in bulk by the sink's background thread
+        sink.enqueue(dict(
+            request_id=str(request_id),
+            team_name=team_name,
+            funnel_name=funnel_name,
+            user_id=user_id,
+            content_id=content_id,
+            metric_funnel_type=metric_funnel_type,
+            metric_type=metric_type,
+            metric_value=metric_value,
+            metric_metadata=metric_metadata,
+            created_date=datetime.now(),
+        ))
+        return None
     metric = Metric(
         request_id=request_id,
         team_name=team_name,
@@ -23,4 +42,4 @@ def add_metric(request_id, team_name, funnel_name, user_id, content_id,
     )
     db.session.add(metric)
     db.session.commit()
-    return metric
\ No newline at end of file
+    return metric
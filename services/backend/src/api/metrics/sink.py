@@ -0,0 +1,128 @@
+import atexit
+import queue
+import threading
+import time
+import traceback
+
+from sqlalchemy import insert
+from src import db
+from src.api.metrics.models import Metric
+
+
+class MetricSink:
+    """
+    Buffers metric rows in memory and writes them with bulk inserts from a
+    background thread, so the request thread never waits on a metric commit.
+    The queue is bounded: once it is full new rows wait up to
+    METRIC_SINK_ENQUEUE_TIMEOUT_SECONDS for space and are then dropped (and counted).
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricSink, cls).__new__(cls)
+            cls._instance._app = None
+            cls._instance._queue = None
+            cls._instance._thread = None
+            cls._instance._stop_event = threading.Event()
+            cls._instance._lock = threading.Lock()
+            cls._instance.enqueued = 0
+            cls._instance.dropped = 0
+            cls._instance.flushed = 0
+            cls._instance.failed = 0
+        return cls._instance
+
+    def start(self, app):
+        if self.is_running():
+            return
+        self._app = app
+        self._queue = queue.Queue(maxsize=app.config.get("METRIC_SINK_MAX_QUEUE_SIZE", 10000))
+        self._flush_size = app.config.get("METRIC_SINK_FLUSH_SIZE", 200)
+        self._flush_interval = app.config.get("METRIC_SINK_FLUSH_INTERVAL_SECONDS", 2.0)
+        self._enqueue_timeout = app.config.get("METRIC_SINK_ENQUEUE_TIMEOUT_SECONDS", 0)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metric-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def enqueue(self, row):
+        try:
+            if self._enqueue_timeout > 0:
+                self._queue.put(row, timeout=self._enqueue_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                print(f"metric sink queue full, dropped {dropped} metrics so far")
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+            }
+
+    def stop(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        # whatever the worker did not get to is written out before the process exits
+        rows = self._drain(self._queue.qsize())
+        for i in range(0, len(rows), self._flush_size):
+            self._write(rows[i:i + self._flush_size])
+
+    def _drain(self, max_rows):
+        rows = []
+        while len(rows) < max_rows:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            rows = []
+            deadline = time.monotonic() + self._flush_interval
+            while len(rows) < self._flush_size and not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    # short polls so stop() does not wait out a whole flush interval
+                    rows.append(self._queue.get(timeout=min(remaining, 0.25)))
+                except queue.Empty:
+                    continue
+            if rows:
+                self._write(rows)
+
+    def _write(self, rows):
+        if not rows:
+            return
+        with self._app.app_context():
+            try:
+                db.session.execute(insert(Metric), rows)
+                db.session.commit()
+                with self._lock:
+                    self.flushed += len(rows)
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    self.failed += len(rows)
+                print(f"metric sink failed to write {len(rows)} metrics, {e}")
+                print(traceback.format_exc())
@@ -0,0 +1,129 @@
+import contextvars
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from flask import current_app, has_request_context, request
+from src import db
+from src.api.metrics.crud import add_metric
+from src.api.metrics.models import MetricFunnelType, MetricType
+
+# names of the spans enclosing the running code, a ContextVar so generator workers
+# started with contextvars.copy_context() nest under the span that started them
+_span_path = contextvars.ContextVar("span_path", default=())
+_trace_lock = threading.Lock()
+_NOT_A_TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class RequestTrace:
+    """The spans of one request, in the order they finished"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.team_name = None
+        self.user_id = None
+        self.spans = []  # (path, funnel_type, start offset seconds, duration seconds)
+
+    def record(self, path, funnel_type, started, duration):
+        self.spans.append((path, funnel_type, started - self.started, duration))  # list.append is atomic
+
+    def durations_ms(self):
+        """Total milliseconds per span path, a path can run more than once per request"""
+        totals = {}
+        for path, _, _, duration in self.spans:
+            totals[path] = totals.get(path, 0.0) + 1000 * duration
+        return totals
+
+
+def current_trace():
+    """The RequestTrace of the request being served, None outside of one or with TRACING_ENABLED off"""
+    if not has_request_context() or not current_app.config.get("TRACING_ENABLED"):
+        return None
+    trace = getattr(request, "trace", None)
+    if trace is None:
+        with _trace_lock:
+            trace = getattr(request, "trace", None)
+            if trace is None:
+                trace = request.trace = RequestTrace()
+    return trace
+
+
+def set_trace_owner(team_name, user_id):
+    """Spans are only written as metrics once the request knows which team it serves"""
+    trace = current_trace()
+    if trace is not None:
+        trace.team_name = team_name
+        trace.user_id = user_id
+
+
+@contextmanager
+def span(name, funnel_type=MetricFunnelType.Controller):
+    """Times the enclosed block as name, nested under the spans already open"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    path = _span_path.get() + (name,)
+    token = _span_path.set(path)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(".".join(path), funnel_type, started, time.perf_counter() - started)
+        _span_path.reset(token)
+
+
+def carry_span_path(fn):
+    """
+    fn run with the spans open here, for a worker thread. Only the span path crosses over,
+    copying the whole context would also hand the worker this thread's app context and db session
+    """
+    path = _span_path.get()
+
+    def run(*args, **kwargs):
+        token = _span_path.set(path)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _span_path.reset(token)
+    return run
+
+
+def finish_trace(response):
+    """after_request hook, writes the request's spans as TimeTakenMS metrics and the Server-Timing header"""
+    trace = getattr(request, "trace", None)
+    if trace is None or not trace.spans:
+        return response
+    spans = list(trace.spans)
+    if current_app.config.get("TRACING_SERVER_TIMING_HEADER"):
+        response.headers["Server-Timing"] = ", ".join(
+            f"{_NOT_A_TOKEN.sub('_', path)};dur={duration:.1f}"
+            for path, duration in trace.durations_ms().items()
+        )
+        response.headers["Timing-Allow-Origin"] = "*"
+    if trace.team_name is None:
+        return response
+    try:
+        for path, funnel_type, start, duration in spans:
+            add_metric(
+                request_id=request.request_id,
+                team_name=trace.team_name,
+                funnel_name=path[:255],
+                user_id=trace.user_id if trace.user_id else None,
+                content_id=None,
+                metric_funnel_type=funnel_type,
+                metric_type=MetricType.TimeTakenMS,
+                metric_value=int(round(1000 * duration)),
+                metric_metadata={
+                    "span": path,
+                    "start_ms": round(1000 * start, 3),
+                    "duration_ms": round(1000 * duration, 3),
+                },
+            )
+    except Exception as e:
+        db.session.rollback()
+        print(f"exception trying to add the request trace {trace.team_name}, {e}")
+        print(traceback.format_exc())
+    return response
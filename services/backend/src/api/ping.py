@@ -1,4 +1,8 @@
 from flask_restx import Namespace, Resource
+from src.data_structures.approximate_nearest_neighbor.two_tower_ann import index_stats
+from src.data_structures.artist_style_lookup import UserStyleCache
+from src.data_structures.candidate_pool_cache import CandidatePoolCache
+from src.data_structures.user_embedding_cache import UserEmbeddingCache
 
 ping_namespace = Namespace("ping")
 
@@ -10,4 +14,24 @@ class Ping(Resource):
         return {"status": "success", "message": "pong!"}
 
 
+class CacheStats(Resource):
+    @ping_namespace.response(200, "Success")
+    def get(self):
+        """Hit/miss counters of the in memory caches, for sizing them"""
+        return {
+            "user_embedding_cache": UserEmbeddingCache().stats(),
+            "candidate_pool_cache": CandidatePoolCache().stats(),
+            "user_style_cache": UserStyleCache().stats(),
+        }
+
+
+class AnnIndexes(Resource):
+    @ping_namespace.response(200, "Success")
+    def get(self):
+        """Size and last rebuild of each team's two tower ANN index"""
+        return index_stats()
+
+
 ping_namespace.add_resource(Ping, "")
+ping_namespace.add_resource(CacheStats, "/caches")
+ping_namespace.add_resource(AnnIndexes, "/ann")
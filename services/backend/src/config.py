@@ -10,7 +10,53 @@ class BaseConfig:
     REFRESH_TOKEN_EXPIRATION = 2592000  # 30 days
     NUMBER_OF_CONTENT_IN_ANN = 1000 # UPDATE THIS WHEN DEVELOPING ANN
     INSTANTIATE_PROMPT_ANN = False
+    ANN_NEIGHBOR_CACHE_SIZE = 2000 # query contents whose ranked prompt neighbors feed cursor pages reuse, 0 disables
+    # persisted two tower indexes, None rebuilds every boot
+    ANN_SNAPSHOT_DIR = os.getenv("ANN_SNAPSHOT_DIR", "/usr/src/app/ann_snapshots")
+    # how often the two tower indexes are rebuilt in the background once content changed, 0 disables
+    ANN_REBUILD_INTERVAL_SECONDS = 3600
+    # "float16" or "int8" searches compressed vectors and reranks exactly instead of building MRPT indexes, None keeps
+    # MRPT. Half or a quarter of the memory when the float32 rows are memory mapped (ANN_SNAPSHOT_DIR set), but the
+    # search scans every vector: ~40 ms (int8) to ~130 ms (float16) per query on 50k x 512 against MRPT's under 1 ms
+    ANN_VECTOR_QUANTIZATION = os.getenv("ANN_VECTOR_QUANTIZATION")
+    ANN_RERANK_FACTOR = 4 # a quantized search reranks this many candidates per neighbor asked for
+    # memory mapped float32 prompt embeddings, None builds them in memory every boot
+    PROMPT_EMBEDDING_STORE_DIR = os.getenv("PROMPT_EMBEDDING_STORE_DIR", "/usr/src/app/prompt_embeddings")
     TEAMS_TO_RUN_FOR = ["alpha", "beta", "charlie", "delta", "echo", "foxtrot", "golf"]
+    METRIC_SINK_ENABLED = True # write metrics in bulk from a background thread
+    METRIC_SINK_MAX_QUEUE_SIZE = 10000
+    METRIC_SINK_FLUSH_SIZE = 200
+    METRIC_SINK_FLUSH_INTERVAL_SECONDS = 2.0
+    METRIC_SINK_ENQUEUE_TIMEOUT_SECONDS = 0 # 0 drops immediately when the queue is full
+    INCREMENTAL_INGESTION_INTERVAL_SECONDS = 60 # how often new engagements reach the engagement snapshot, 0 disables
+    USER_BASED_RECOMMENDER_REBUILD_SECONDS = 3600 # how often the recommenders are rebuilt from it, 0 never
+    USER_EMBEDDING_CACHE_SIZE = 10000 # (team, user_id) two tower user embeddings kept in memory, 0 disables
+    USER_EMBEDDING_CACHE_TTL_SECONDS = 600
+    USER_STYLE_CACHE_SIZE = 10000 # users whose engaged artist styles ExampleModel keeps in memory, 0 disables
+    USER_STYLE_CACHE_TTL_SECONDS = 3600
+    # threads running candidate generators concurrently, 0 runs them sequentially. gunicorn's 5 request threads
+    # times the 3 generators a controller runs at most
+    GENERATOR_EXECUTOR_MAX_WORKERS = 15
+    # every generator worker holds a db connection, on top of the 5 request threads' sessions and the ingestion,
+    # leaderboard, stats rollup, ANN rebuild and metric sink threads: 15 + 5 + 5 = 25 at peak, the default pool
+    # (5 + 10 overflow) would make generators wait up to pool_timeout, far past GENERATOR_TIMEOUT_SECONDS
+    SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": 10, "max_overflow": 20}
+    GENERATOR_TIMEOUT_SECONDS = 5.0 # a generator slower than this is dropped from the request
+    POPULARITY_LEADERBOARD_SIZE = 10000 # content kept per popularity board
+    POPULARITY_LEADERBOARD_REFRESH_SECONDS = 30 # how often new engagements reach the boards, 0 disables
+    POPULARITY_LEADERBOARD_REBUILD_SECONDS = 900 # full rebuild, picks up changed and removed likes
+    # full recompute of content_engagement_stats, the engagement crud keeps it current in between, 0 disables
+    CONTENT_ENGAGEMENT_STATS_ROLLUP_SECONDS = 3600
+    # ranked content kept per feed session, pages past it run the pipeline per page, 0 disables
+    CANDIDATE_POOL_SIZE = 200
+    CANDIDATE_POOL_CACHE_SIZE = 2000 # feed sessions kept in memory
+    CANDIDATE_POOL_TTL_SECONDS = 900
+    TRACING_ENABLED = True # per stage spans of the feed pipeline, written as TimeTakenMS metrics
+    TRACING_SERVER_TIMING_HEADER = False # also return the spans in a Server-Timing response header
+    # "eager", "torchscript" or "onnx" (needs onnxruntime)
+    TWO_TOWER_INFERENCE_BACKEND = os.getenv("TWO_TOWER_INFERENCE_BACKEND", "eager")
+    # torch threads per tower call, gunicorn already serves 5 requests at once, 0 leaves torch's default
+    TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", 1))
 
 
 class DevelopmentConfig(BaseConfig):
@@ -23,6 +69,15 @@ class TestingConfig(BaseConfig):
     BCRYPT_LOG_ROUNDS = 4
     ACCESS_TOKEN_EXPIRATION = 3
     REFRESH_TOKEN_EXPIRATION = 3
+    METRIC_SINK_ENABLED = False
+    ANN_SNAPSHOT_DIR = None
+    PROMPT_EMBEDDING_STORE_DIR = None
+    INCREMENTAL_INGESTION_INTERVAL_SECONDS = 0
+    POPULARITY_LEADERBOARD_REFRESH_SECONDS = 0
+    CONTENT_ENGAGEMENT_STATS_ROLLUP_SECONDS = 0
+    CANDIDATE_POOL_SIZE = 0
+    TRACING_ENABLED = False
+    ANN_REBUILD_INTERVAL_SECONDS = 0
 
 
 class ProductionConfig(BaseConfig):
@@ -1,74 +1,70 @@
-import os
-import pickle
 from functools import lru_cache
+import heapq
+import operator
 import random
 from flask import current_app
 import mrpt
 import numpy as np
 from src.api.content.models import Content, GeneratedContentMetadata
+from src.data_structures.approximate_nearest_neighbor.prompt_embedding_store import PromptEmbeddingStore
+from src.data_structures.approximate_nearest_neighbor.quantized_index import QuantizedIndex
+from src.data_structures.feed_cursor import current_cursor
+from src.data_structures.lru_cache import LRUCache
 
 INDEXES = {}  # (target recall => index)
-INDEX_TO_CONTENT_ID = {}
-CONTENT_ID_TO_INDEX = {}
+NEIGHBORS = None  # LRUCache, (content_id, target recall) => the ranked neighbors ann_after pages through
 
 
 @lru_cache(1)
 def read_data():
     if not current_app.config.get("INSTANTIATE_PROMPT_ANN"):
         return np.array([])
-
-    global INDEX_TO_CONTENT_ID
-    if os.path.isfile("/usr/src/app/id_to_pickle_dict.pkl"):
-        print("reading data from id_to_pickle_dict.pkl")
-        with open("/usr/src/app/id_to_pickle_dict.pkl", "rb") as f:
-            data = pickle.load(f)
-    else:
-        data = GeneratedContentMetadata.query.with_entities(
-            GeneratedContentMetadata.content_id,
-            GeneratedContentMetadata.prompt_embedding,
-        ).all()
-    np_data = []
-    i = 0
-    if len(data) == 0:
+    store = PromptEmbeddingStore()
+    if len(store) == 0:
         raise ValueError(
             """
             You probably don't have the prompt_to_embedding file, ask for help
         """
         )
-    if isinstance(data, dict):
-        data_gen = data.items()
-    else:
-        data_gen = data
-    for (content_id, embedding) in data_gen:
-        if embedding is None:
-            continue
-        INDEX_TO_CONTENT_ID[i] = content_id
-        CONTENT_ID_TO_INDEX[content_id] = i
-        i += 1
-        np_data.append(np.array(embedding, dtype=np.float32))
-    return np.array(np_data)
+    return store.embeddings
 
 
 def instantiate(target_recall, k=25):  # instantiate k=25, but can ask for more later
     if not current_app.config.get("INSTANTIATE_PROMPT_ANN"):
         return
     global INDEXES
+    neighbor_cache().clear()  # ranked by the index being replaced
+    if current_app.config.get("ANN_VECTOR_QUANTIZATION"):
+        # the rerank is exact, so one quantized index serves every target_recall
+        INDEXES[target_recall] = quantized_index()
+        return
     data = read_data()
     index = mrpt.MRPTIndex(data)
     index.build_autotune_sample(target_recall, k)
     INDEXES[target_recall] = index
 
 
+@lru_cache(1)
+def quantized_index():
+    return QuantizedIndex.from_config(read_data())
+
+
 def get_embedding(content_id):
-    # Explore keeping data in memory for all embeddings if this is too slow
-    return np.array(
+    """The prompt embedding of content_id as a float32 vector, None for content without one"""
+    embedding = PromptEmbeddingStore().get(content_id)
+    if embedding is not None:
+        return embedding
+    # content created after the store was built
+    row = (
         GeneratedContentMetadata.query.with_entities(
             GeneratedContentMetadata.prompt_embedding
         )
         .filter_by(content_id=content_id)
-        .first(),
-        dtype=np.float32,
+        .first()
     )
+    if row is None or row[0] is None:
+        return None
+    return np.array(row[0], dtype=np.float32)
 
 
 def ann(content_id, target_recall, k=25, return_distances=False):
@@ -76,9 +72,10 @@ def ann(content_id, target_recall, k=25, return_distances=False):
         return db.session.query(
             Content.id
         ).order_by(func.random()).limit(k).all(), [random.rand() for _ in range(k)]
-    global INDEXES, INDEX_TO_CONTENT_ID
+    global INDEXES
     model = INDEXES[target_recall]
-    idx = CONTENT_ID_TO_INDEX.get(content_id, None)
+    store = PromptEmbeddingStore()
+    idx = store.row(content_id)
     if idx is None:
         return None, None
     q = read_data()[idx]
@@ -88,9 +85,7 @@ def ann(content_id, target_recall, k=25, return_distances=False):
         data_indexes, scores = rtn
     else:
         data_indexes = rtn
-    content_ids = list(
-        filter(None, map(lambda index: INDEX_TO_CONTENT_ID.get(index), data_indexes))
-    )
+    content_ids = [int(store.content_ids[index]) for index in data_indexes if index >= 0]
     return content_ids, scores
 
 
@@ -103,3 +98,138 @@ def ann_with_offset(content_id, target_recall, limit, offset, return_distances=F
     if offset == 0 and content_ids[0] != content_id:
         content_ids = [content_id] + content_ids
     return content_ids[offset:], (scores[offset:] if scores is not None else None)
+
+
+def _ann_batch(content_ids, target_recall, k, offset):
+    # (neighbor content_ids, distances) of each query content, after skipping offset
+    if not current_app.config.get("INSTANTIATE_PROMPT_ANN"):
+        for content_id in content_ids:
+            yield ann_with_offset(content_id, target_recall, k, offset, return_distances=True)
+        return
+    store = PromptEmbeddingStore()
+    rows = store.rows(content_ids)
+    known = rows >= 0
+    if not known.any():
+        yield from (([], []) for _ in content_ids)
+        return
+    # one index call for every query vector
+    indices, distances = INDEXES[target_recall].ann(
+        np.atleast_2d(read_data()[rows[known]]), k=k + offset, return_distances=True
+    )
+    indices, distances = np.atleast_2d(indices)[:, offset:], np.atleast_2d(distances)[:, offset:]
+    neighbor_ids = np.where(indices >= 0, store.content_ids[indices], -1)
+    answers = iter(zip(neighbor_ids, distances))
+    for is_known in known:
+        if not is_known:
+            yield [], []  # no embedding for this query, like ann_with_offset
+            continue
+        query_neighbors, query_distances = next(answers)
+        found = query_neighbors >= 0
+        yield query_neighbors[found].tolist(), query_distances[found].tolist()
+
+
+def ann_many(content_ids, target_recall, k, offset=0, weights=None, limit=None):
+    """
+    ann_with_offset for several query contents at once. Their vectors go to the index in
+    one call, a neighbor several queries found is kept once with its best score (distance
+    times its query's weight, lower is better), and the limit best are picked with a
+    bounded heap. Returns (content_ids, scores), best first
+    """
+    weights = [1] * len(content_ids) if weights is None else list(weights)
+    best = {}
+    for (neighbors, distances), weight in zip(_ann_batch(content_ids, target_recall, k, offset), weights):
+        for neighbor, distance in zip(neighbors, distances or []):
+            score = distance * weight
+            if score < best.get(neighbor, float("inf")):
+                best[neighbor] = score
+    top = heapq.nsmallest(len(best) if limit is None else limit, best.items(), key=operator.itemgetter(1))
+    return [content_id for content_id, _ in top], [score for _, score in top]
+
+
+def neighbor_cache():
+    global NEIGHBORS
+    if NEIGHBORS is None:
+        NEIGHBORS = LRUCache(current_app.config.get("ANN_NEIGHBOR_CACHE_SIZE"))
+    return NEIGHBORS
+
+
+def _ranked_neighbors(content_id, target_recall, k):
+    """
+    (content_ids, distances, complete) of at least k of content_id's nearest neighbors, nearest
+    first with ties by content_id, complete when that is every embedding. Distances are exact, so
+    pages agree on them whichever way the neighbors were found. The neighbors come from the index
+    when it returns k of them, otherwise from an exact scan. Cached per query content, and when a
+    later page needs more than the cache holds, twice as many are looked up
+    """
+    cache = neighbor_cache()
+    key = (content_id, target_recall)
+    cached = cache.get(key)
+    if cached is not None and (len(cached[0]) >= k or cached[2]):
+        return cached
+    store = PromptEmbeddingStore()
+    idx = store.row(content_id)
+    if idx is None:
+        return None
+    data = read_data()
+    if cached is not None:
+        k = max(k, 2 * len(cached[0]))
+    rows = None
+    if k < len(data):
+        indices = np.asarray(INDEXES[target_recall].ann(data[idx], k=k)).ravel()
+        if (indices >= 0).sum() >= k:
+            rows = indices[indices >= 0]
+    if rows is None:
+        # the index can't go this deep, scan for the k nearest
+        distances = np.sqrt(np.square(data - data[idx]).sum(axis=1, dtype=np.float64))
+        if k < len(data):
+            # argpartition splits ties at the boundary arbitrarily, keep all of them
+            boundary = distances[np.argpartition(distances, k - 1)[k - 1]]
+            rows = np.flatnonzero(distances <= boundary)
+        else:
+            rows = np.arange(len(data))
+    distances = np.sqrt(np.square(data[rows] - data[idx]).sum(axis=1, dtype=np.float64))
+    content_ids = store.content_ids[rows]
+    order = np.lexsort((content_ids, distances))
+    ranked = (content_ids[order], distances[order], len(rows) >= len(data))
+    cache.put(key, ranked)
+    return ranked
+
+
+def ann_after(content_id, target_recall, limit, after=None, return_distances=False):
+    """
+    The next limit neighbors strictly after the (distance, content_id) of the last one
+    already returned, nearest first with ties by content_id, so a page doesn't have to
+    search for and skip all the neighbors before it. The first page is an index query,
+    later pages read the query content's cached ranked neighbors, which grow when a page
+    runs past them
+    """
+    if not current_app.config.get("INSTANTIATE_PROMPT_ANN"):
+        return ann(content_id, target_recall, k=limit, return_distances=return_distances)
+    k = limit
+    while True:
+        ranked = _ranked_neighbors(content_id, target_recall, k)
+        if ranked is None:
+            return [], []
+        content_ids, distances, complete = ranked
+        start = 0
+        if after is not None:
+            after_distance, after_content_id = after
+            later = (distances > after_distance) | ((distances == after_distance) & (content_ids > after_content_id))
+            start = int(np.argmax(later)) if later.any() else len(content_ids)
+        if len(content_ids) - start >= limit or complete:
+            break
+        k = len(content_ids) + limit
+    page = slice(start, start + limit)
+    return content_ids[page].tolist(), (distances[page].tolist() if return_distances else None)
+
+
+def ann_page(cursor_key, content_id, target_recall, limit, offset, return_distances=False):
+    """ann_with_offset, or ann_after resuming from cursor_key when the request pages with a FeedCursor"""
+    cursor = current_cursor()
+    if cursor is None:
+        return ann_with_offset(content_id, target_recall, limit, offset, return_distances=return_distances)
+    content_ids, distances = ann_after(
+        content_id, target_recall, limit, cursor.after(cursor_key), return_distances=True
+    )
+    cursor.advance(cursor_key, list(zip(distances, content_ids)))
+    return content_ids, (distances if return_distances else None)
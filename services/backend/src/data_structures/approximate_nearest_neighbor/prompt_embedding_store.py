@@ -0,0 +1,173 @@
+import io
+import json
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+from flask import current_app
+from src.api.content.models import GeneratedContentMetadata
+from src.data_structures.approximate_nearest_neighbor.snapshot import content_fingerprint
+
+# bump whenever the on-disk layout below changes, old stores are then rebuilt
+STORE_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"  # raw row major float32, shape in the manifest
+CONTENT_IDS_FILE = "content_ids.npy"
+PICKLED_EMBEDDINGS_PATH = "/usr/src/app/id_to_pickle_dict.pkl"
+BUILD_BATCH_SIZE = 1000
+
+
+class PromptEmbeddingStore:
+    """
+    Every content's prompt embedding in one contiguous float32 matrix, with the content_id
+    of each row (ascending) and a dense content_id => row array, so the prompt ANN and the
+    two tower wrappers read vectors by row instead of querying and json decoding
+    GeneratedContentMetadata.prompt_embedding.
+    Built once from the database (or id_to_pickle_dict.pkl when it exists) into
+    PROMPT_EMBEDDING_STORE_DIR and memory mapped read only after that, so every worker
+    shares the same pages. It is rebuilt when the content table grew or shrank.
+    Without a directory it's built in memory on every boot
+    """
+    _instance = None  # Singleton instance reference
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(PromptEmbeddingStore, cls).__new__(cls)
+                instance._open()
+                cls._instance = instance
+        return cls._instance
+
+    @classmethod
+    def from_arrays(cls, embeddings, content_ids):
+        """A store over embeddings already in memory, rows in the order of content_ids"""
+        store = super(PromptEmbeddingStore, cls).__new__(cls)
+        store._set(np.asarray(embeddings, dtype=np.float32), np.asarray(content_ids, dtype=np.int64))
+        return store
+
+    def _open(self):
+        directory = current_app.config.get("PROMPT_EMBEDDING_STORE_DIR")
+        if not directory:
+            buffer = io.BytesIO()
+            content_ids, dim = self._write_rows(buffer)
+            embeddings = np.frombuffer(buffer.getbuffer(), dtype=np.float32).reshape(len(content_ids), dim)
+            self._set(embeddings, content_ids)
+            return
+        fingerprint = {"version": STORE_VERSION, "content": content_fingerprint()}
+        if not self._load(directory, fingerprint):
+            print("building the prompt embedding store")
+            self._build(directory, fingerprint)
+            self._load(directory, fingerprint)
+
+    def _load(self, directory, fingerprint):
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") != fingerprint:
+            print("prompt embedding store is stale, rebuilding")
+            return False
+        rows, dim = manifest["shape"]
+        embeddings = (
+            np.memmap(os.path.join(directory, EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(rows, dim))
+            if rows > 0 else np.zeros((0, dim), dtype=np.float32)
+        )
+        self._set(embeddings, np.load(os.path.join(directory, CONTENT_IDS_FILE)))
+        return True
+
+    def _build(self, directory, fingerprint):
+        tmp_directory = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        with open(os.path.join(tmp_directory, EMBEDDINGS_FILE), "wb") as f:
+            content_ids, dim = self._write_rows(f)
+        np.save(os.path.join(tmp_directory, CONTENT_IDS_FILE), content_ids)
+        # the manifest goes in last, a store without one is never loaded
+        with open(os.path.join(tmp_directory, MANIFEST_FILE), "w") as f:
+            json.dump({"fingerprint": fingerprint, "shape": [len(content_ids), dim]}, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+
+    def _source(self):
+        # (content_id, embedding) in content_id order
+        if os.path.isfile(PICKLED_EMBEDDINGS_PATH):
+            print("reading prompt embeddings from id_to_pickle_dict.pkl")
+            with open(PICKLED_EMBEDDINGS_PATH, "rb") as f:
+                yield from sorted(pickle.load(f).items())
+            return
+        yield from (
+            GeneratedContentMetadata.query.with_entities(
+                GeneratedContentMetadata.content_id,
+                GeneratedContentMetadata.prompt_embedding,
+            )
+            .order_by(GeneratedContentMetadata.content_id)
+            .yield_per(BUILD_BATCH_SIZE)
+        )
+
+    def _write_rows(self, out):
+        """Streams the float32 rows into out, returns (content_ids, dim)"""
+        content_ids, dim = [], None
+        for content_id, embedding in self._source():
+            if embedding is None:
+                continue
+            vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+            if dim is None:
+                dim = len(vector)
+            elif len(vector) != dim:
+                print(f"skipping the prompt embedding of {content_id}, it has {len(vector)} dimensions not {dim}")
+                continue
+            out.write(vector.tobytes())
+            content_ids.append(content_id)
+        return np.asarray(content_ids, dtype=np.int64), dim or 0
+
+    def _set(self, embeddings, content_ids):
+        self.embeddings = embeddings
+        self.content_ids = content_ids
+        self._row_by_content_id = np.full(int(content_ids.max()) + 1 if len(content_ids) else 0, -1, dtype=np.int64)
+        self._row_by_content_id[content_ids] = np.arange(len(content_ids))
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def rows(self, content_ids):
+        """Row of each content_id, -1 for content without a stored embedding"""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        known = (content_ids >= 0) & (content_ids < len(self._row_by_content_id))
+        rows = np.full(len(content_ids), -1, dtype=np.int64)
+        rows[known] = self._row_by_content_id[content_ids[known]]
+        return rows
+
+    def row(self, content_id):
+        row = self.rows([content_id])[0]
+        return int(row) if row >= 0 else None
+
+    def get(self, content_id):
+        row = self.row(content_id)
+        return self.embeddings[row] if row is not None else None
+
+    def column(self, content_ids):
+        """
+        The embedding of each content_id as a list, like the prompt_embedding column of a
+        query. Content created after the store was built is read from the database in one query
+        """
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        rows = self.rows(content_ids)
+        missing = {}
+        if (rows < 0).any():
+            missing = dict(
+                GeneratedContentMetadata.query.with_entities(
+                    GeneratedContentMetadata.content_id,
+                    GeneratedContentMetadata.prompt_embedding,
+                )
+                .filter(GeneratedContentMetadata.content_id.in_(np.unique(content_ids[rows < 0]).tolist()))
+                .all()
+            )
+        return [
+            self.embeddings[row] if row >= 0 else missing.get(int(content_id))
+            for content_id, row in zip(content_ids, rows)
+        ]
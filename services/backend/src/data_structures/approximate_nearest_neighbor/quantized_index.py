@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from flask import current_app
+
+QUANTIZATIONS = ["float16", "int8"]
+CHUNK_ROWS = 16384  # rows decoded to float32 at a time, bounds the scratch memory of a search
+QUERY_BLOCK_BYTES = 64 * 2**20  # coarse distances held at once, queries are scanned in blocks that fit
+
+
+class QuantizedIndex:
+    """
+    A drop in for mrpt.MRPTIndex.ann that keeps its vectors as float16, or as int8 codes
+    with a per dimension scale and offset, a half or a quarter of float32. A query scans
+    every code for its rerank_factor * k nearest candidates, then ranks those by their
+    exact float32 distance, read from data, which stays memory mapped when it is (the
+    PromptEmbeddingStore and the ANN snapshots are), so only the candidates' pages are touched.
+    Distances are euclidean like MRPT's, missing neighbors are -1 with an inf distance.
+    The scan is exhaustive, tens of milliseconds per query on tens of thousands of vectors
+    where MRPT takes under one, and a batch of queries is scanned in blocks whose coarse
+    distances fit in QUERY_BLOCK_BYTES
+    """
+
+    def __init__(self, data, quantization="int8", rerank_factor=4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"unknown vector quantization {quantization}, expected one of {QUANTIZATIONS}")
+        self.data = data
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        rows, dim = data.shape
+        if quantization == "int8":
+            low = np.full(dim, np.inf, dtype=np.float32)
+            high = np.full(dim, -np.inf, dtype=np.float32)
+            for start in range(0, rows, CHUNK_ROWS):
+                chunk = np.asarray(data[start:start + CHUNK_ROWS], dtype=np.float32)
+                low, high = np.minimum(low, chunk.min(axis=0)), np.maximum(high, chunk.max(axis=0))
+            self.scale = (
+                np.where(high > low, (high - low) / 255, 1).astype(np.float32) if rows else np.ones(dim, np.float32)
+            )
+            self.offset = (low + 128 * self.scale).astype(np.float32) if rows else np.zeros(dim, np.float32)
+        else:
+            self.scale, self.offset = None, None
+        self.codes = np.empty((rows, dim), dtype=np.int8 if quantization == "int8" else np.float16)
+        self.norms = np.empty(rows, dtype=np.float32)  # squared norms of the decoded vectors
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = np.asarray(data[start:start + CHUNK_ROWS], dtype=np.float32)
+            if quantization == "int8":
+                codes = np.clip(np.rint((chunk - self.offset) / self.scale), -128, 127).astype(np.int8)
+            else:
+                codes = chunk.astype(np.float16)
+            self.codes[start:start + len(chunk)] = codes
+            self.norms[start:start + len(chunk)] = np.square(self._decode(codes)).sum(axis=1)
+
+    @classmethod
+    def from_config(cls, data):
+        return cls(
+            data,
+            current_app.config.get("ANN_VECTOR_QUANTIZATION"),
+            current_app.config.get("ANN_RERANK_FACTOR"),
+        )
+
+    def _decode(self, codes):
+        decoded = codes.astype(np.float32)
+        if self.quantization == "int8":
+            decoded = decoded * self.scale + self.offset
+        return decoded
+
+    @property
+    def nbytes(self):
+        """Memory held by the index itself, data isn't counted"""
+        extra = self.scale.nbytes + self.offset.nbytes if self.scale is not None else 0
+        return self.codes.nbytes + self.norms.nbytes + extra
+
+    def _coarse(self, queries):
+        # squared distance from each query to every decoded vector, without decoding them all at once
+        distances = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        query_norms = np.square(queries).sum(axis=1)[:, None]
+        for start in range(0, len(self.codes), CHUNK_ROWS):
+            codes = self.codes[start:start + CHUNK_ROWS]
+            if self.quantization == "int8":
+                # decoded . q == codes . (scale * q) + offset . q
+                dot = codes.astype(np.float32) @ (queries * self.scale).T + (queries @ self.offset)[None, :]
+            else:
+                dot = codes.astype(np.float32) @ queries.T
+            norms = self.norms[start:start + len(codes)][None, :]
+            distances[:, start:start + len(codes)] = norms - 2 * dot.T + query_norms
+        return distances
+
+    def ann(self, q, k, return_distances=False):
+        queries = np.asarray(q, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        n_candidates = min(len(self.codes), max(k, self.rerank_factor * k))
+        block = max(1, QUERY_BLOCK_BYTES // (4 * max(1, len(self.codes))))
+        for block_start in range(0, len(queries) if n_candidates > 0 else 0, block):
+            block_queries = queries[block_start:block_start + block]
+            coarse = self._coarse(block_queries)
+            if n_candidates < len(self.codes):
+                candidates = np.argpartition(coarse, n_candidates - 1, axis=1)[:, :n_candidates]
+            else:
+                candidates = np.broadcast_to(np.arange(len(self.codes)), coarse.shape)
+            for i, (query, rows) in enumerate(zip(block_queries, candidates), start=block_start):
+                rows = np.sort(rows)  # ascending rows read the memory mapped data in order
+                exact = np.sqrt(np.square(np.asarray(self.data[rows], dtype=np.float32) - query).sum(axis=1))
+                order = np.lexsort((rows, exact))[:k]
+                indices[i, :len(order)] = rows[order]
+                distances[i, :len(order)] = exact[order]
+        if single:
+            indices, distances = indices[0], distances[0]
+        return (indices, distances) if return_distances else indices
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            arrays = {"codes": self.codes, "norms": self.norms}
+            if self.scale is not None:
+                arrays.update(scale=self.scale, offset=self.offset)
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path, data, rerank_factor=4):
+        """An index saved by save, over the same data"""
+        index = cls.__new__(cls)
+        with np.load(path) as arrays:
+            index.codes, index.norms = arrays["codes"], arrays["norms"]
+            index.scale = arrays["scale"] if "scale" in arrays else None
+            index.offset = arrays["offset"] if "offset" in arrays else None
+        index.data = data
+        index.quantization = "int8" if index.codes.dtype == np.int8 else "float16"
+        index.rerank_factor = rerank_factor
+        return index
+
+
+def _exact(data, queries, k):
+    distances = np.sqrt(np.maximum(
+        np.square(queries).sum(axis=1)[:, None] - 2 * queries @ data.T + np.square(data).sum(axis=1)[None, :], 0
+    ))
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def compare(data, queries, k=25, rerank_factor=4, target_recall=0.9):
+    """
+    recall@k against an exact search, milliseconds per query and bytes held, of the MRPT
+    index the app builds today and of each quantization. MRPT counts its float32 vectors
+    (its trees come on top), the quantized indexes their codes, the float32 rows they
+    rerank from stay on disk
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    truth = _exact(data, queries, k)
+    indexes = {}
+    try:
+        import mrpt
+
+        index = mrpt.MRPTIndex(data)
+        index.build_autotune_sample(target_recall, k)
+        indexes["mrpt float32"] = (index, data.nbytes)
+    except ImportError:
+        print("mrpt isn't installed, comparing the quantized indexes only")
+    for quantization in QUANTIZATIONS:
+        index = QuantizedIndex(data, quantization, rerank_factor)
+        indexes[f"{quantization} + rerank"] = (index, index.nbytes)
+
+    report = []
+    for name, (index, nbytes) in indexes.items():
+        started = time.perf_counter()
+        found = [index.ann(query, k=k) for query in queries]
+        ms = 1000 * (time.perf_counter() - started) / len(queries)
+        recall = np.mean([
+            len(np.intersect1d(neighbors[neighbors >= 0], expected)) / k for neighbors, expected in zip(found, truth)
+        ])
+        report.append({"index": name, "recall": float(recall), "ms_per_query": ms, "bytes": int(nbytes)})
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.data_structures.approximate_nearest_neighbor.quantized_index \
+    #     /usr/src/app/ann_snapshots/beta/embeddings.npy
+    parser = argparse.ArgumentParser(description="recall, latency and memory of the quantized ANN index against MRPT")
+    parser.add_argument("embeddings", help="an ANN snapshot's embeddings.npy or a prompt embedding store directory")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=25)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--target-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.embeddings):
+        with open(os.path.join(args.embeddings, "manifest.json")) as f:
+            shape = tuple(json.load(f)["shape"])
+        embeddings = np.memmap(
+            os.path.join(args.embeddings, "embeddings.f32"), dtype=np.float32, mode="r", shape=shape
+        )
+    else:
+        embeddings = np.load(args.embeddings, mmap_mode="r")
+    rows = np.random.default_rng(0).choice(len(embeddings), min(args.queries, len(embeddings)), replace=False)
+    for row in compare(embeddings, embeddings[np.sort(rows)], args.k, args.rerank_factor, args.target_recall):
+        print(
+            f"{row['index']:<16} recall@{args.k} {row['recall']:.3f} {row['ms_per_query']:8.3f} ms/query "
+            f"{row['bytes'] / 2**20:9.2f} MiB"
+        )
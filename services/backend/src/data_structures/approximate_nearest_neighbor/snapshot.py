@@ -0,0 +1,121 @@
+import json
+import os
+import pickle
+import shutil
+
+import mrpt
+import numpy as np
+from flask import current_app
+from sqlalchemy.sql.expression import func
+from src import db
+from src.api.content.models import Content
+from src.data_structures.approximate_nearest_neighbor.quantized_index import QuantizedIndex
+
+# bump whenever the on-disk layout below changes, old snapshots are then rebuilt
+SNAPSHOT_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CONTENT_IDS_FILE = "index_to_content_id.npy"
+INDEX_FILE = "mrpt.index"
+CONTENT_TRANSFORMER_FILE = "content_transformer.pkl"
+
+ML_MODELS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "recommendation_system",
+    "ml_models",
+)
+
+
+def _snapshot_dir(team):
+    return os.path.join(current_app.config.get("ANN_SNAPSHOT_DIR"), team)
+
+
+def _model_files_fingerprint(team):
+    # size + mtime of everything the team's model reads (weights, pickles, code),
+    # cheap enough to run on every boot unlike hashing the weights
+    team_dir = os.path.join(ML_MODELS_DIR, team)
+    files = {}
+    for root, dirs, names in os.walk(team_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, team_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def content_fingerprint():
+    count, max_id = db.session.query(func.count(Content.id), func.max(Content.id)).one()
+    return {"count": count, "max_id": max_id}
+
+
+def snapshot_fingerprint(team, content):
+    return {
+        "version": SNAPSHOT_VERSION,
+        "team": team,
+        "number_of_content_in_ann": current_app.config.get("NUMBER_OF_CONTENT_IN_ANN"),
+        "vector_quantization": current_app.config.get("ANN_VECTOR_QUANTIZATION"),
+        "content": content,
+        "model_files": _model_files_fingerprint(team),
+    }
+
+
+def snapshots_enabled():
+    return bool(current_app.config.get("ANN_SNAPSHOT_DIR"))
+
+
+def load_snapshot(team, fingerprint):
+    """
+    Returns (index, embeddings, index_to_content_id, content_transformer) read from the team's
+    snapshot, or None when there is no snapshot or its manifest does not match the fingerprint.
+    content_transformer is the preprocessing the wrapper fit while building the index, or None.
+    The embeddings are memory mapped read only so every worker shares the same pages
+    """
+    directory = _snapshot_dir(team)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("fingerprint") != fingerprint:
+        print(f"ANN snapshot for {team} is stale, rebuilding")
+        return None
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+    index_to_content_id = np.load(os.path.join(directory, CONTENT_IDS_FILE))
+    if len(embeddings) != len(index_to_content_id):
+        print(f"ANN snapshot for {team} has {len(embeddings)} embeddings for {len(index_to_content_id)} content ids")
+        return None
+    if current_app.config.get("ANN_VECTOR_QUANTIZATION"):
+        index = QuantizedIndex.load(
+            os.path.join(directory, INDEX_FILE), embeddings, current_app.config.get("ANN_RERANK_FACTOR")
+        )
+    else:
+        index = mrpt.MRPTIndex(embeddings)
+        index.load(os.path.join(directory, INDEX_FILE))
+    content_transformer = None
+    content_transformer_path = os.path.join(directory, CONTENT_TRANSFORMER_FILE)
+    if os.path.exists(content_transformer_path):
+        with open(content_transformer_path, "rb") as f:
+            content_transformer = pickle.load(f)
+    return index, embeddings, index_to_content_id, content_transformer
+
+
+def save_snapshot(team, fingerprint, index, embeddings, index_to_content_id, content_transformer=None):
+    """Writes the team's snapshot, returns its embeddings memory mapped read only"""
+    directory = _snapshot_dir(team)
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    np.save(os.path.join(tmp_directory, EMBEDDINGS_FILE), np.ascontiguousarray(embeddings, dtype=np.float32))
+    np.save(os.path.join(tmp_directory, CONTENT_IDS_FILE), np.asarray(index_to_content_id, dtype=np.int64))
+    index.save(os.path.join(tmp_directory, INDEX_FILE))
+    if content_transformer is not None:
+        with open(os.path.join(tmp_directory, CONTENT_TRANSFORMER_FILE), "wb") as f:
+            pickle.dump(content_transformer, f)
+    # the manifest goes in last, a snapshot without one is never loaded
+    with open(os.path.join(tmp_directory, MANIFEST_FILE), "w") as f:
+        json.dump({"fingerprint": fingerprint, "shape": list(embeddings.shape)}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
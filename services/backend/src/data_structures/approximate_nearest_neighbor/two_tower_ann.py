@@ -1,17 +1,84 @@
 from src import db
+from sqlalchemy import distinct, or_, select
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql.expression import func
 from src.api.content.models import Content, GeneratedContentMetadata
 from src.api.engagement.models import Engagement
+from src.api.metrics.crud import add_metric
+from src.api.metrics.models import MetricFunnelType, MetricType, TeamName
 from flask import current_app
+from types import MappingProxyType
 import mrpt
+import numpy as np
 import pandas as pd
+import threading
+import time
 import traceback
+from src.data_structures.approximate_nearest_neighbor.prompt_embedding_store import PromptEmbeddingStore
+from src.data_structures.approximate_nearest_neighbor.quantized_index import QuantizedIndex
+from src.data_structures.approximate_nearest_neighbor.snapshot import (
+    load_snapshot,
+    save_snapshot,
+    snapshot_fingerprint,
+    snapshots_enabled,
+)
+from src.data_structures.user_based_recommender.data_collector import INGESTION_LOOKBACK_IDS
+from src.data_structures.user_embedding_cache import UserEmbeddingCache
 
-# Global Variables
-INDEXES = {}
-index_to_content_id = {}
-content_id_to_index = {}
+# Global Variables, all keyed by team
+BUNDLES = {}  # the published IndexBundle, replaced whole by a rebuild and never changed in place
 team_wrappers = {}
+_rebuild_locks = {}  # one rebuild per team at a time
+_rebuild_locks_lock = threading.Lock()
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class IndexBundle:
+    """
+    A team's ANN index, the embeddings it was built on and the index row <=> content_id
+    mappings, built together and never changed after. Readers take BUNDLES[team] once per
+    query, so a rebuild publishing the next bundle can't hand them an index that doesn't
+    match its mapping
+    """
+
+    def __init__(
+        self, index, embeddings, index_to_content_id, content, generation, build_seconds, source, engagement_mark=None
+    ):
+        self.index = index
+        self.embeddings = embeddings
+        self.index_to_content_id = _read_only(np.asarray(index_to_content_id, dtype=np.int64))
+        self.content_id_to_index = MappingProxyType(
+            {int(content_id): i for i, content_id in enumerate(self.index_to_content_id)}
+        )
+        self.content = content  # engaged_content_fingerprint() when it was built, a rebuild is due once it changes
+        self.engagement_mark = engagement_mark  # latest_engagement_id() before its rows were read
+        self.generation = generation
+        self.build_seconds = build_seconds
+        self.source = source  # "build" or "snapshot"
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.index_to_content_id)
+
+    def index_bytes(self):
+        """Memory of the vectors the index searches, MRPT's trees come on top"""
+        return int(getattr(self.index, "nbytes", self.embeddings.nbytes))
+
+    def stats(self):
+        return {
+            "rows": len(self),
+            "embedding_bytes": int(self.embeddings.nbytes),
+            "index_bytes": self.index_bytes(),
+            "generation": self.generation,
+            "build_seconds": round(self.build_seconds, 3),
+            "built_at": self.built_at,
+            "source": self.source,
+        }
+
 
 def fetch_data_stub():
     try:
@@ -26,7 +93,6 @@ def fetch_data_stub():
             GeneratedContentMetadata.artist_style,
             GeneratedContentMetadata.source,
             GeneratedContentMetadata.model_version,
-            GeneratedContentMetadata.prompt_embedding
         ).join(
             GeneratedContentMetadata, Engagement.content_id == GeneratedContentMetadata.content_id
         )
@@ -35,65 +101,237 @@ def fetch_data_stub():
         print(traceback.format_exc())
         return None
 
-def instantiate_indexes():
-    try:
-        if current_app.config.get("NUMBER_OF_CONTENT_IN_ANN") == 0:
-            return
-        distinct_content_ids_subquery = db.session.query(
-            Content.id
-        ).order_by(func.random()).limit(current_app.config.get("NUMBER_OF_CONTENT_IN_ANN")).subquery()
+def engaged_content_fingerprint():
+    # the index rows come from fetch_data_stub(), so content only counts once it has an engagement
+    count, max_id = db.session.query(
+        func.count(distinct(Engagement.content_id)), func.max(Engagement.content_id)
+    ).join(
+        GeneratedContentMetadata, Engagement.content_id == GeneratedContentMetadata.content_id
+    ).one()
+    return {"count": count, "max_id": max_id}
+
+def latest_engagement_id():
+    return db.session.query(func.max(Engagement.id)).scalar() or 0
+
+def to_dataframe(rows):
+    # prompt embeddings come from the PromptEmbeddingStore instead of a json column per engagement
+    df = pd.DataFrame(rows)
+    if len(df) > 0:
+        df['prompt_embedding'] = PromptEmbeddingStore().column(df['content_id'])
+    return df
+
+def fetch_ann_content_data(engaged_after=None):
+    # a random NUMBER_OF_CONTENT_IN_ANN content, plus all content engaged with since the engagement
+    # id engaged_after, so a rebuild picks up what got its first engagement since the previous index.
+    # INGESTION_LOOKBACK_IDS below it, for engagements committed late under a lower id
+    distinct_content_ids_subquery = db.session.query(
+        Content.id
+    ).order_by(func.random()).limit(current_app.config.get("NUMBER_OF_CONTENT_IN_ANN")).subquery()
+    if engaged_after is None:
         contents = fetch_data_stub().join(
             distinct_content_ids_subquery, distinct_content_ids_subquery.c.id == Engagement.content_id
-        ).order_by(Engagement.content_id).all()
-        df = pd.DataFrame(contents)
+        )
+    else:
+        # aliased, so the subquery doesn't correlate with the Engagement rows of the outer query
+        recent = aliased(Engagement)
+        recently_engaged = select(recent.content_id).where(recent.id > engaged_after - INGESTION_LOOKBACK_IDS)
+        contents = fetch_data_stub().filter(or_(
+            Engagement.content_id.in_(select(distinct_content_ids_subquery.c.id)),
+            Engagement.content_id.in_(recently_engaged),
+        ))
+    contents = contents.order_by(Engagement.content_id).all()
+    return to_dataframe(contents)
 
-        global team_wrappers
-        teams = current_app.config.get("TEAMS_TO_RUN_FOR")
-        for team in teams:
-            module_path = f"src.recommendation_system.ml_models.{team}.two_tower"
+def build_index(team, df):
+    wrapper = team_wrappers[team]
+    if getattr(wrapper, "content_transformer", False) is None:
+        # no prefit preprocessing shipped, fit it once on the rows the index is built from
+        wrapper.fit_content_transformer(df)
+    # one embedding row per distinct content_id, in content_id order
+    data = wrapper.generate_content_embeddings(df.copy())
+    content_ids = np.sort(df['content_id'].unique())
+    if len(data) != len(content_ids):
+        raise ValueError(f"{team} made {len(data)} content embeddings for {len(content_ids)} content")
+    if len(data) < 101:
+        raise ValueError(f"len(data) == {len(data)} < 101")
+    if current_app.config.get("ANN_VECTOR_QUANTIZATION"):
+        return QuantizedIndex.from_config(data), data, content_ids
+    index = mrpt.MRPTIndex(data)
+    index.build_autotune_sample(0.9, 200)
+    return index, data, content_ids
+
+def load_wrappers(teams):
+    global team_wrappers
+    for team in teams:
+        module_path = f"src.recommendation_system.ml_models.{team}.two_tower"
+        try:
+            ModelWrapper = __import__(module_path, fromlist=['ModelWrapper']).ModelWrapper
+            team_wrappers[team] = ModelWrapper()
+            print(f"Done ModelWrapper instantiation for {team} successfully")
+        except Exception as e:
+            print(f"Error during ModelWrapper instantiation for {team}, {e}")
+            print(traceback.format_exc())
+            team_wrappers[team] = None
+
+def make_bundle(team, content, fetch_df, use_snapshot=True, engagement_mark=None):
+    """
+    The team's IndexBundle, from its snapshot when one matches, otherwise built from
+    fetch_df() and saved as the new snapshot
+    """
+    started = time.time()
+    use_snapshots = snapshots_enabled()
+    fingerprint = snapshot_fingerprint(team, content) if use_snapshots else None
+    snapshot = None
+    if use_snapshots and use_snapshot:
+        try:
+            snapshot = load_snapshot(team, fingerprint)
+        except Exception as e:
+            print(f"Error loading ANN snapshot for {team}, {e}")
+            print(traceback.format_exc())
+    if snapshot is not None:
+        index, data, content_ids, content_transformer = snapshot
+        if content_transformer is not None and getattr(team_wrappers[team], "content_transformer", False) is None:
+            team_wrappers[team].content_transformer = content_transformer
+        source = "snapshot"
+    else:
+        index, data, content_ids = build_index(team, fetch_df())
+        if use_snapshots:
+            # a snapshot only saves the next boot a build, failing to write one keeps this index
             try:
-                ModelWrapper = __import__(module_path, fromlist=['ModelWrapper']).ModelWrapper
-                team_wrappers[team] = ModelWrapper()
-                print(f"Done ModelWrapper instantiation for {team} successfully")
+                saved = save_snapshot(
+                    team, fingerprint, index, data, content_ids,
+                    getattr(team_wrappers[team], "content_transformer", None),
+                )
+                if isinstance(index, QuantizedIndex):
+                    # rerank from the saved rows, instead of holding the float32 matrix next to the codes
+                    data = index.data = saved
             except Exception as e:
-                print(f"Error during ModelWrapper instantiation for {team}, {e}")
+                print(f"Error saving ANN snapshot for {team}, {e}")
                 print(traceback.format_exc())
-                team_wrappers[team] = None
+        source = "build"
+    previous = BUNDLES.get(team)
+    generation = previous.generation + 1 if previous is not None else 1
+    return IndexBundle(index, data, content_ids, content, generation, time.time() - started, source, engagement_mark)
 
-        global index_to_content_id, content_id_to_index, INDEXES
-        index_to_content_id = df['content_id'].to_dict()
-        content_id_to_index = {v: k for k, v in index_to_content_id.items()}
+def publish_bundle(team, bundle):
+    # one reference swap, a query already holding the previous bundle finishes on it
+    BUNDLES[team] = bundle
+    add_bundle_metric(team, bundle)
+
+def add_bundle_metric(team, bundle):
+    try:
+        add_metric(
+            request_id=f"ann-rebuild-{team}-{bundle.generation}",
+            team_name=TeamName[f"{team.capitalize()}_F2023"],
+            funnel_name="ann-rebuild",
+            user_id=None,
+            content_id=None,
+            metric_funnel_type=MetricFunnelType.CandidateGeneration,
+            metric_type=MetricType.TimeTakenMS,
+            metric_value=int(round(1000 * bundle.build_seconds)),
+            metric_metadata=bundle.stats(),
+        )
+    except Exception as e:
+        db.session.rollback()
+        print(f"exception trying to add the ANN rebuild metric for {team}, {e}")
+        print(traceback.format_exc())
+
+def instantiate_indexes():
+    try:
+        if current_app.config.get("NUMBER_OF_CONTENT_IN_ANN") == 0:
+            return
+
+        teams = current_app.config.get("TEAMS_TO_RUN_FOR")
+        load_wrappers(teams)
+
+        content = engaged_content_fingerprint()
+        engagement_mark = latest_engagement_id()
+        df = []  # only queried when some team has no usable snapshot, then shared by all of them
+
+        def fetch_df():
+            if not df:
+                df.append(fetch_ann_content_data())
+            return df[0]
 
         for team in teams:
             try:
-                data = team_wrappers[team].generate_content_embeddings(df)
-                if len(data) < 101:
-                    raise ValueError(f"len(data) == {len(data)} < 101")
-                    index = None
-                else:
-                    index = mrpt.MRPTIndex(data)
-                    index.build_autotune_sample(0.9, 200)
-                print(f"Done index instantiation for {team} successfully")
+                bundle = make_bundle(team, content, fetch_df, engagement_mark=engagement_mark)
+                publish_bundle(team, bundle)
+                print(f"Done index instantiation for {team} successfully from its {bundle.source}")
             except Exception as e:
                 print(f"Error during index instantiation for {team}, {e}")
                 print(traceback.format_exc())
-                index = None
-            INDEXES[team] = index
+                BUNDLES.pop(team, None)
     except Exception as e:
         print(f"Error during index instantiation: {e}")
         print(traceback.format_exc())
 
+def _rebuild_lock(team):
+    with _rebuild_locks_lock:
+        return _rebuild_locks.setdefault(team, threading.Lock())
+
+def rebuild_index(team, force=False):
+    """
+    Rebuilds the team's bundle from a fresh sample of content, plus all content engaged with
+    since the published one was built, and publishes it, unless no content got its first
+    engagement since (or force). Returns the new bundle, or None when nothing was rebuilt. A rebuild already
+    running for the team wins
+    """
+    lock = _rebuild_lock(team)
+    if not lock.acquire(blocking=False):
+        return None
+    try:
+        if team_wrappers.get(team) is None:
+            return None
+        content = engaged_content_fingerprint()
+        previous = BUNDLES.get(team)
+        if not force and previous is not None and previous.content == content:
+            return None
+        engaged_after = previous.engagement_mark if previous is not None else None
+        engagement_mark = latest_engagement_id()
+        bundle = make_bundle(
+            team, content, lambda: fetch_ann_content_data(engaged_after), use_snapshot=not force,
+            engagement_mark=engagement_mark,
+        )
+        publish_bundle(team, bundle)
+        print(f"Rebuilt the ANN index of {team}, {len(bundle)} content in {bundle.build_seconds:.1f}s")
+        return bundle
+    finally:
+        lock.release()
+
+def start_index_refresh(app):
+    interval = app.config.get("ANN_REBUILD_INTERVAL_SECONDS")
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                for team in list(team_wrappers):
+                    try:
+                        rebuild_index(team)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Failed to rebuild the ANN index of {team}, {e}")
+                        print(traceback.format_exc())
+
+    thread = threading.Thread(target=run, name="ann-index-refresh", daemon=True)
+    thread.start()
+    return thread
+
+def index_stats():
+    return {team: bundle.stats() for team, bundle in BUNDLES.items()}
+
 def get_ANN_recommednations(embedding, team, K):
     try:
         K = min(100, K)
-        global index_to_content_id, INDEXES
-        if INDEXES[team] is None:
+        bundle = BUNDLES.get(team)  # read once, the index and mapping below stay consistent
+        if bundle is None or bundle.index is None:
             return [], []
-        similar_indices, scores = INDEXES[team].ann(embedding, k=K, return_distances=True)
+        similar_indices, scores = bundle.index.ann(embedding, k=K, return_distances=True)
         new_similar_content, new_scores = [], []
         for idx, score in zip(similar_indices[0], scores[0]):
             if idx != -1:
-                new_similar_content.append(index_to_content_id[idx])
+                new_similar_content.append(int(bundle.index_to_content_id[idx]))
                 new_scores.append(score) 
         return new_similar_content, new_scores
     except Exception as e:
@@ -103,17 +341,22 @@ def get_ANN_recommednations(embedding, team, K):
 
 def get_ANN_recommendations_from_user(user_id, team, K):
     try:
-        # Fetch engagements for user
-        user_engagements = fetch_data_stub().filter(
-            Engagement.user_id == user_id
-        ).all()
+        cache = UserEmbeddingCache()
+        user_embedding = cache.get(team, user_id)
+        if user_embedding is None:
+            generation = cache.generation(user_id)
+            # Fetch engagements for user
+            user_engagements = fetch_data_stub().filter(
+                Engagement.user_id == user_id
+            ).all()
 
-        user_df = pd.DataFrame(user_engagements)
-        
-        if len(user_df) == 0:
-            return [], []
+            user_df = to_dataframe(user_engagements)
+
+            if len(user_df) == 0:
+                return [], []
 
-        user_embedding = team_wrappers[team].generate_user_embeddings(user_df)
+            user_embedding = team_wrappers[team].generate_user_embeddings(user_df)
+            cache.put(team, user_id, user_embedding, generation)
 
         if len(user_embedding) == 0:
             return [], []
@@ -131,7 +374,7 @@ def get_ANN_recommendations_from_content(content_id, team, K):
             Content.id == content_id
         ).all()
 
-        content_df = pd.DataFrame(user_engagements_for_content)
+        content_df = to_dataframe(user_engagements_for_content)
 
         if len(content_df) == 0:
             return [], []
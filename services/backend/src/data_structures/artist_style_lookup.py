@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+from flask import current_app
+from src import db
+from src.api.content.models import GeneratedContentMetadata
+from src.api.engagement.models import Engagement
+from src.data_structures.lru_cache import LRUCache
+
+NO_STYLE = -1  # code of content without generated content metadata
+
+
+class ArtistStyleLookup:
+    """
+    Every content's artist_style as a small integer code in a dense content_id => code
+    array, so ExampleModel tests style membership for a whole batch with numpy instead
+    of querying generated_content_metadata per request. Loaded once, content uploaded
+    after that is read in one query the first time a content_id past the loaded range,
+    and past any looked up before, shows up (or when refresh is called)
+    """
+    _instance = None  # Singleton instance reference
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(ArtistStyleLookup, cls).__new__(cls)
+                instance.styles = []  # code => artist_style, None is a style like any other
+                instance._code_by_style = {}
+                instance._codes = np.zeros(0, dtype=np.int32)
+                instance._checked = -1  # highest content_id a lookup refreshed for
+                instance._load_after(0)
+                cls._instance = instance
+        return cls._instance
+
+    def _load_after(self, content_id):
+        rows = (
+            GeneratedContentMetadata.query.with_entities(
+                GeneratedContentMetadata.content_id,
+                GeneratedContentMetadata.artist_style,
+            )
+            .filter(GeneratedContentMetadata.content_id > content_id)
+            .all()
+        )
+        if not rows:
+            return 0
+        content_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        codes = np.fromiter((self._code(row[1]) for row in rows), dtype=np.int32, count=len(rows))
+        grown = np.full(max(len(self._codes), int(content_ids.max()) + 1), NO_STYLE, dtype=np.int32)
+        grown[:len(self._codes)] = self._codes
+        grown[content_ids] = codes
+        self._codes = grown  # swapped in one assignment, readers never see a half filled array
+        return len(rows)
+
+    def _code(self, style):
+        code = self._code_by_style.get(style)
+        if code is None:
+            code = self._code_by_style[style] = len(self.styles)
+            self.styles.append(style)
+        return code
+
+    def refresh(self):
+        """Loads the content uploaded since the last load, returns how many it found"""
+        with self._lock:
+            return self._load_after(len(self._codes) - 1)
+
+    def codes(self, content_ids):
+        """Style code of each content_id, NO_STYLE for content without metadata"""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        highest = int(content_ids.max()) if len(content_ids) else -1
+        if highest >= len(self._codes) and highest > self._checked:
+            # newer content than what's loaded. Content without metadata stays past the
+            # loaded range, remembering it keeps it from querying again on every request
+            self._checked = highest
+            self.refresh()
+        codes_by_content_id = self._codes
+        known = (content_ids >= 0) & (content_ids < len(codes_by_content_id))
+        codes = np.full(len(content_ids), NO_STYLE, dtype=np.int32)
+        codes[known] = codes_by_content_id[content_ids[known]]
+        return codes
+
+
+class UserStyleCache:
+    """
+    The style codes (see ArtistStyleLookup) of the content each user engaged with, so
+    scoring by style doesn't re-query the user's engagements every request. A new
+    engagement adds its content's style to the cached set, a removed one drops the user.
+    Sized by USER_STYLE_CACHE_SIZE and USER_STYLE_CACHE_TTL_SECONDS
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UserStyleCache, cls).__new__(cls)
+            cls._instance.cache = LRUCache(
+                current_app.config.get("USER_STYLE_CACHE_SIZE", 0),
+                current_app.config.get("USER_STYLE_CACHE_TTL_SECONDS"),
+            )
+            # bumped whenever a user engages, a set read before the bump is never stored
+            cls._instance._generations = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def _query(self, user_id):
+        content_ids = [
+            row[0] for row in
+            db.session.query(Engagement.content_id).filter(Engagement.user_id == user_id).distinct().all()
+        ]
+        return frozenset(ArtistStyleLookup().codes(content_ids).tolist()) - {NO_STYLE}
+
+    def get(self, user_id):
+        user_id = int(user_id)
+        styles = self.cache.get(user_id)
+        if styles is None:
+            generation = self._generations.get(user_id, 0)
+            styles = self._query(user_id)
+            with self._lock:
+                if self._generations.get(user_id, 0) == generation:
+                    self.cache.put(user_id, styles)
+        return styles
+
+    def add_engagement(self, user_id, content_id):
+        code = int(ArtistStyleLookup().codes([content_id])[0])
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            styles = self.cache.get(user_id)
+            if styles is not None and code != NO_STYLE:
+                self.cache.put(user_id, styles | {code})
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.cache.pop(user_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def record_user_style_engagement(user_id, content_id):
+    # nothing to update until the first recommendation request creates the cache
+    if UserStyleCache._instance is not None and user_id is not None and content_id is not None:
+        UserStyleCache._instance.add_engagement(int(user_id), content_id)
+
+
+def invalidate_user_styles(user_id):
+    if UserStyleCache._instance is not None and user_id is not None:
+        UserStyleCache._instance.invalidate_user(int(user_id))
@@ -0,0 +1,36 @@
+import json
+
+from flask import current_app
+from src.data_structures.lru_cache import LRUCache
+
+
+class CandidatePoolCache:
+    """
+    The ranked, filtered content ids of a feed session, keyed by (user_id, controller,
+    seed, starting_point), so the first page runs the recommendation pipeline once for
+    CANDIDATE_POOL_SIZE items and the following pages are slices of it.
+    Sized by CANDIDATE_POOL_CACHE_SIZE sessions, kept CANDIDATE_POOL_TTL_SECONDS
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CandidatePoolCache, cls).__new__(cls)
+            cls._instance.cache = LRUCache(
+                current_app.config.get("CANDIDATE_POOL_CACHE_SIZE", 0),
+                current_app.config.get("CANDIDATE_POOL_TTL_SECONDS"),
+            )
+        return cls._instance
+
+    @staticmethod
+    def key(user_id, controller, seed, starting_point):
+        return (user_id, controller.human_string(), seed, json.dumps(starting_point, sort_keys=True))
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def put(self, key, content_ids):
+        self.cache.put(key, tuple(content_ids))
+
+    def stats(self):
+        return self.cache.stats()
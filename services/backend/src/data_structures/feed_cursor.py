@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+
+from flask import has_request_context, request
+
+CURSOR_VERSION = 1
+
+
+class FeedCursor:
+    """
+    Keyset pagination state for the content feed, handed to the client as an opaque
+    token. Per generator key it holds the sort key (e.g. [score, content_id]) of the
+    last item the previous page moved past, so a generator resumes strictly after it
+    instead of re-ranking and discarding page * limit rows, and page N costs what
+    page 1 does. It also carries the page, limit and seed, so the generators that
+    still page by offset and the random ones stay consistent across pages.
+    The generators read and advance the cursor of the current request, see current_cursor
+    """
+
+    def __init__(self, limit, seed, page=0, positions=None):
+        self.limit = int(limit)
+        self.seed = float(seed)
+        self.page = int(page)
+        self.positions = dict(positions or {})
+        self._next_positions = dict(self.positions)
+
+    @classmethod
+    def decode(cls, token):
+        """Raises ValueError for a token this version didn't encode"""
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if data["v"] != CURSOR_VERSION:
+                raise ValueError(f"unsupported cursor version {data['v']}")
+            return cls(data["limit"], data["seed"], data["page"], data["positions"])
+        except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f"invalid cursor, {e}")
+
+    def encode(self):
+        data = {
+            "v": CURSOR_VERSION,
+            "limit": self.limit,
+            "seed": self.seed,
+            "page": self.page,
+            "positions": self.positions,
+        }
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+    def after(self, key):
+        """Sort key the page of key starts after, None on the first page"""
+        position = self.positions.get(key)
+        return tuple(position) if position is not None else None
+
+    def advance(self, key, sort_keys):
+        """
+        Records where the next page of key starts, given the sort keys of what this page
+        returned, in order. A page moves past limit items, like offset = page * limit does,
+        whatever number of candidates the generator was asked for
+        """
+        if len(sort_keys) > 0:
+            last = sort_keys[min(self.limit, len(sort_keys)) - 1]
+            # numpy scalars to plain python, so the cursor stays json
+            self._next_positions[key] = [value.item() if hasattr(value, "item") else value for value in last]
+
+    def next_cursor(self):
+        return FeedCursor(self.limit, self.seed, self.page + 1, self._next_positions)
+
+
+def current_cursor():
+    """The FeedCursor of the request being served, None when it pages by offset"""
+    return getattr(request, "feed_cursor", None) if has_request_context() else None
@@ -0,0 +1,211 @@
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import and_, case, func
+from src import db
+from src.api.engagement.models import Engagement, EngagementType
+from src.data_structures.feed_cursor import current_cursor
+from src.data_structures.user_based_recommender.data_collector import INGESTION_LOOKBACK_IDS
+
+# seconds in ten years, a like's weight in TIME_DECAYED_LIKABILITY goes down by one every second
+DECAY_HORIZON_SECONDS = 315360000
+# dwell times counted by LONGEST_DWELL_TIME, shorter is a scroll past and longer left open
+DWELL_TIME_RANGE_MS = (1000, 20000)
+
+LIKE_COUNT = "like_count"  # Like engagements, likes and dislikes
+POSITIVE_LIKE_COUNT = "positive_like_count"  # Like engagements with engagement_value 1
+DWELL_TIME_SUM = "dwell_time_sum"  # sum of MillisecondsEngagedWith
+LONGEST_DWELL_TIME = "longest_dwell_time"  # longest MillisecondsEngagedWith within DWELL_TIME_RANGE_MS
+TIME_DECAYED_LIKABILITY = "time_decayed_likability"  # sum(like value * (DECAY_HORIZON_SECONDS - age in seconds))
+
+SUM_COLUMNS = [
+    "like_count", "positive_like_count", "dwell_count", "dwell_time_sum",
+    "like_value_sum", "like_value_created_sum",
+]
+MAX_COLUMNS = ["longest_dwell_time"]
+
+
+class PopularityLeaderboard:
+    """
+    Ranked content_ids for the popularity boards the YourChoice generators page through,
+    so a request reads a slice of a precomputed list instead of grouping the whole
+    engagement table. Per content aggregates are kept in memory and refreshed
+    incrementally from the engagements past a high water mark, less a lookback window
+    for engagements that commit late, with a periodic full rebuild picking up likes
+    that were changed or removed.
+    Each board keeps its top POPULARITY_LEADERBOARD_SIZE content
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(PopularityLeaderboard, cls).__new__(cls)
+            instance._lock = threading.Lock()
+            instance.rebuild()
+            cls._instance = instance
+        return cls._instance
+
+    def _latest_engagement_id(self):
+        return db.session.query(func.max(Engagement.id)).scalar() or 0
+
+    def _engagement_ids(self, low_id, high_id=None):
+        query = db.session.query(Engagement.id).filter(Engagement.id > low_id)
+        if high_id is not None:
+            query = query.filter(Engagement.id <= high_id)
+        return {row.id for row in query}
+
+    def _query_aggregates(self, high_id=None, ids=None):
+        is_like = Engagement.engagement_type == EngagementType.Like
+        is_dwell = Engagement.engagement_type == EngagementType.MillisecondsEngagedWith
+        rows = (
+            db.session.query(
+                Engagement.content_id,
+                func.sum(case((is_like, 1), else_=0)),
+                func.sum(case((and_(is_like, Engagement.engagement_value == 1), 1), else_=0)),
+                func.sum(case((is_dwell, 1), else_=0)),
+                func.sum(case((is_dwell, Engagement.engagement_value), else_=0)),
+                func.sum(case((is_like, Engagement.engagement_value), else_=0)),
+                func.sum(case(
+                    (is_like, Engagement.engagement_value * func.unix_timestamp(Engagement.created_date)), else_=0
+                )),
+                func.max(case(
+                    (
+                        and_(is_dwell, Engagement.engagement_value.between(*DWELL_TIME_RANGE_MS)),
+                        Engagement.engagement_value,
+                    ),
+                    else_=None,
+                )),
+            )
+            .filter(
+                Engagement.id <= high_id if high_id is not None else Engagement.id.in_(ids),
+            )
+            .group_by(Engagement.content_id)
+            .all()
+        )
+        return pd.DataFrame(
+            [tuple(row) for row in rows], columns=["content_id"] + SUM_COLUMNS + MAX_COLUMNS, dtype=np.float64
+        ).set_index("content_id")
+
+    def rebuild(self):
+        with self._lock:
+            high_water_mark = self._latest_engagement_id()
+            self.aggregates = self._query_aggregates(high_id=high_water_mark)
+            self.high_water_mark = high_water_mark
+            # read in the same transaction as the aggregates, so these are exactly the window's counted ids
+            self.counted_ids = self._engagement_ids(high_water_mark - INGESTION_LOOKBACK_IDS, high_water_mark)
+            self.rebuilt_at = time.time()
+            self._rank()
+
+    def refresh(self):
+        """Folds in the engagements committed since the last refresh, returns how many"""
+        with self._lock:
+            # ids are handed out at insert, not at commit, so the lookback window below the high water mark
+            # is read again and only the ids not counted yet are aggregated
+            new_ids = self._engagement_ids(self.high_water_mark - INGESTION_LOOKBACK_IDS) - self.counted_ids
+            if not new_ids:
+                self._rank()  # nothing new, but the time decayed board still moves
+                return 0
+            new = self._query_aggregates(ids=sorted(new_ids))
+            aggregates = self.aggregates[SUM_COLUMNS].add(new[SUM_COLUMNS], fill_value=0)
+            aggregates[MAX_COLUMNS] = np.fmax(
+                self.aggregates[MAX_COLUMNS].reindex(aggregates.index),
+                new[MAX_COLUMNS].reindex(aggregates.index),
+            )
+            self.aggregates = aggregates
+            self.high_water_mark = max(self.high_water_mark, max(new_ids))
+            low_id = self.high_water_mark - INGESTION_LOOKBACK_IDS
+            self.counted_ids = {
+                engagement_id for engagement_id in self.counted_ids | new_ids if engagement_id > low_id
+            }
+            self._rank()
+            return len(new_ids)
+
+    def _rank(self):
+        aggregates = self.aggregates
+        now = int(time.time())  # created dates are compared as unix timestamps, so no time zone mixups
+        board_scores = {
+            LIKE_COUNT: aggregates["like_count"][aggregates["like_count"] > 0],
+            POSITIVE_LIKE_COUNT: aggregates["positive_like_count"][aggregates["positive_like_count"] > 0],
+            DWELL_TIME_SUM: aggregates["dwell_time_sum"][aggregates["dwell_count"] > 0],
+            LONGEST_DWELL_TIME: aggregates["longest_dwell_time"].dropna(),
+            # sum(value * (horizon - (now - created))) = sum(value) * (horizon - now) + sum(value * created)
+            TIME_DECAYED_LIKABILITY: (
+                aggregates["like_value_sum"] * (DECAY_HORIZON_SECONDS - now) + aggregates["like_value_created_sum"]
+            )[aggregates["like_count"] > 0],
+        }
+        size = current_app.config.get("POPULARITY_LEADERBOARD_SIZE")
+        boards = {}
+        for board, scores in board_scores.items():
+            content_ids = scores.index.to_numpy(dtype=np.int64)
+            values = scores.to_numpy()
+            # best first, ties by content_id so pages are stable
+            order = np.lexsort((content_ids, -values))[:size]
+            boards[board] = (content_ids[order], values[order])
+        self.boards = boards  # swapped in one assignment, readers never see a half built board
+
+    def top(self, board, limit, offset=0):
+        """(content_ids, scores) of the board, best first, skipping the first offset"""
+        content_ids, scores = self.boards[board]
+        return (
+            content_ids[offset:offset + limit].tolist(),
+            scores[offset:offset + limit].tolist(),
+        )
+
+    def top_after(self, board, limit, after=None):
+        """(content_ids, scores) of the board strictly after the (score, content_id) a previous page ended on"""
+        content_ids, scores = self.boards[board]
+        start = 0
+        if after is not None:
+            after_score, after_content_id = after
+            # boards are sorted by (-score, content_id), binary search the score then the content_id
+            low = np.searchsorted(-scores, -after_score, side="left")
+            high = np.searchsorted(-scores, -after_score, side="right")
+            start = low + np.searchsorted(content_ids[low:high], after_content_id, side="right")
+        return (
+            content_ids[start:start + limit].tolist(),
+            scores[start:start + limit].tolist(),
+        )
+
+    def top_page(self, board, limit, offset=0):
+        """top, or top_after resuming from the board's position when the request pages with a FeedCursor"""
+        cursor = current_cursor()
+        if cursor is None:
+            return self.top(board, limit, offset)
+        content_ids, scores = self.top_after(board, limit, cursor.after(board))
+        cursor.advance(board, list(zip(scores, content_ids)))
+        return content_ids, scores
+
+
+def start_leaderboard_refresh(app):
+    interval = app.config.get("POPULARITY_LEADERBOARD_REFRESH_SECONDS")
+    rebuild_interval = app.config.get("POPULARITY_LEADERBOARD_REBUILD_SECONDS")
+    with app.app_context():
+        try:
+            PopularityLeaderboard()  # build it now rather than in the first request
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to build the popularity leaderboard, {e}")
+            print(traceback.format_exc())
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    leaderboard = PopularityLeaderboard()
+                    if rebuild_interval and time.time() - leaderboard.rebuilt_at >= rebuild_interval:
+                        leaderboard.rebuild()
+                    else:
+                        leaderboard.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Failed to refresh the popularity leaderboard, {e}")
+                    print(traceback.format_exc())
+
+    thread = threading.Thread(target=run, name="popularity-leaderboard", daemon=True)
+    thread.start()
+    return thread
@@ -5,11 +5,9 @@ from src.api.engagement.models import Engagement
 from src import db
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy.sparse import csr_matrix
-import pdb
 from src.api.engagement.models import EngagementType, LikeDislike
 from src.data_structures.user_based_recommender.data_collector import DataCollector
+from src.data_structures.user_based_recommender.sparse_collaborative_filter import SparseCollaborativeFilter
 
 class UserBasedRecommender:
 
@@ -18,45 +16,39 @@ class UserBasedRecommender:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(UserBasedRecommender, cls).__new__(cls)
-            cls._instance.user_similarity_map = {}
             cls._instance.gather_data()
             cls._instance.compute_similarity()
         return cls._instance
 
     def gather_data(self):
-        self.interactions = DataCollector().get_data()
+        self.interactions_df = DataCollector().get_data_df()
+        self.seen_content_ids = self.interactions_df.groupby('user_id')['content_id'].unique()
 
     def compute_similarity(self, threshhold_percentile=70):
-        interactions_df = DataCollector().get_data_df()
+        interactions_df = self.interactions_df
         like_data = interactions_df[interactions_df['engagement_type'] == EngagementType.Like]
-        user_item_matrix = like_data.pivot_table(
-            index='user_id',
-            columns='content_id',
-            values='engagement_value',
-            fill_value=0,
-            aggfunc='sum'
+        # keep the (100 - threshhold_percentile)% most similar users of every user
+        n_users = like_data['user_id'].nunique()
+        self.engine = SparseCollaborativeFilter(
+            like_data['user_id'].values,
+            like_data['content_id'].values,
+            like_data['engagement_value'].values,
+            n_neighbours=max(1, int(n_users * (100 - threshhold_percentile) / 100)),
+            min_similarity=-np.inf,
         )
-        user_ids = user_item_matrix.index.tolist()
-        for i, sim in enumerate(cosine_similarity(csr_matrix(user_item_matrix))):
-            threshold = np.percentile(sim, threshhold_percentile)
-            above_threshold = sim >= threshold
-            self.user_similarity_map[user_ids[i]] = list(np.array(user_ids)[above_threshold])
-            self.user_similarity_map[user_ids[i]].remove(user_ids[i])
 
     def get_similar_users(self, user_id):
         # Fetch the list of similar users for a given user_id from the map.
-        return self.user_similarity_map.get(user_id, [])
+        return [similar_user for similar_user, _ in self.engine.similar_users(user_id)]
 
     def recommend_items(self, user_id, num_recommendations=500):
-        # For a given user, fetch the list of similar users.
-        # Recommend items engaged by those users, which the given user hasn't seen.
-        similar_users = self.get_similar_users(user_id)
-        seen_items = [interaction.content_id for interaction in self.interactions if interaction.user_id==user_id]
-        recommend_items = set()
-        for interaction in self.interactions:
-
-            if(interaction.engagement_type==EngagementType.Like and interaction.engagement_value==1 and interaction.user_id in similar_users and interaction.content_id not in seen_items):
-                recommend_items.add(interaction.content_id)
-            if len(recommend_items) == num_recommendations:
-                break
-        return list(recommend_items)
\ No newline at end of file
+        # Recommend items liked by similar users, which the given user hasn't seen.
+        seen_items = self.seen_content_ids.get(user_id)
+        recommend_items, _ = self.engine.recommend(
+            user_id,
+            num_recommendations,
+            weighted=False,
+            exclude_content_ids=seen_items,
+            min_score=0,
+        )
+        return recommend_items
@@ -6,16 +6,17 @@ from sklearn.preprocessing import StandardScaler
 from src.api.content.models import Content, GeneratedContentMetadata
 from src.api.engagement.models import Engagement
 from src import db
+from src.data_structures.user_based_recommender.sparse_collaborative_filter import top_k_similar_rows
 
 
 class UserBasedRecommender:
 
     _instance = None  # Singleton instance reference
+    refresh_on_ingestion = False  # aggregates the whole engagement table, not the DataCollector snapshot
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(UserBasedRecommender, cls).__new__(cls)
-            cls._instance.user_similarity_map = {}
             cls._instance.gather_data()
             cls._instance.compute_similarity()
         return cls._instance
@@ -41,20 +42,20 @@ class UserBasedRecommender:
         std_data = scaler.fit_transform(non_std_data)
         std_data = pd.DataFrame(std_data, columns=data_columns)
         result_df = pd.concat([result_df[["user_id"]], std_data], axis=1)
+        self.user_features = result_df
         return result_df
 
     def compute_similarity(self):
-        data = self.gather_data()
-        user_ids = data["user_id"].tolist()
-        sim_matrix = pd.DataFrame(columns=data["user_id"], index=data["user_id"])
-        data = data.set_index(keys="user_id")
-        for i in user_ids:
-            for j in user_ids:
-                user_i = np.array(data.loc[i])
-                user_j = np.array(data.loc[j])
-                sim_matrix.loc[i, j] = user_i.dot(user_j) / (np.linalg.norm(user_i) * np.linalg.norm(user_j))
-        for user in user_ids:
-            self.user_similarity_map[user] = sim_matrix.loc[user].sort_values(ascending=False).index.tolist()[1:]
+        data = self.user_features
+        user_ids = data["user_id"].values
+        data_columns = ["num_of_contents", "avg_engagement_time", "num_of_likes", "num_of_dislikes"]
+        neighbours = top_k_similar_rows(data[data_columns].values, n_neighbours=50, min_similarity=-np.inf)
+        user_similarity_map = {}
+        for i, user in enumerate(user_ids):
+            row = neighbours.getrow(i)
+            order = np.argsort(-row.data, kind="stable")
+            user_similarity_map[int(user)] = user_ids[row.indices[order]].tolist()
+        self.user_similarity_map = user_similarity_map
 
     def get_similar_users(self, user_id):
         # Fetch the list of similar users for a given user_id from the map.
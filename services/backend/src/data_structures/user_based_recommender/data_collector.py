@@ -1,12 +1,89 @@
 
 from src import db
+import numpy as np
 import pandas as pd
 from src.api.engagement.models import Engagement
-import copy
+from collections import namedtuple
+import threading
+import time
+import traceback
 from sqlalchemy import text, func, over, and_, or_
 from sqlalchemy.sql import alias
 from sqlalchemy.sql.expression import bindparam
 
+# same fields, in the same order, as the rows of the gather_data query
+EngagementRow = namedtuple("EngagementRow", ["content_id", "user_id", "engagement_type", "engagement_value"])
+MAX_ENGAGEMENTS_PER_USER = 1000
+# ids are handed out at insert, not at commit, so an engagement can commit after a higher id was already read.
+# This many ids below the high water mark are read again on every ingestion, the ones already seen skipped
+INGESTION_LOOKBACK_IDS = 5000
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class EngagementSnapshot:
+    """
+    Immutable column oriented engagement data, one read only NumPy array per column.
+    Everything handed out (the arrays, the DataFrame) shares this memory instead of copying it
+    """
+    columns = list(EngagementRow._fields)
+
+    def __init__(self, content_id, user_id, engagement_type, engagement_value):
+        self.content_id = _read_only(content_id)
+        self.user_id = _read_only(user_id)
+        self.engagement_type = _read_only(engagement_type)
+        self.engagement_value = _read_only(engagement_value)
+        self._df = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        engagement_values = [row[3] for row in rows]
+        if any(value is None for value in engagement_values):
+            engagement_values = np.array(
+                [np.nan if value is None else value for value in engagement_values], dtype=np.float64
+            )
+        else:
+            engagement_values = np.array(engagement_values, dtype=np.int64)
+        engagement_type = np.empty(len(rows), dtype=object)
+        engagement_type[:] = [row[2] for row in rows]
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.int64),
+            engagement_type,
+            engagement_values,
+        )
+
+    def append(self, rows, max_per_user=MAX_ENGAGEMENTS_PER_USER):
+        # a new snapshot, this one stays valid for whoever is still reading it.
+        # Grouped by user like gather_data's rows, a user past max_per_user drops their oldest
+        # (randomly ordered) snapshot rows first, so it never grows past what a restart would load
+        new = EngagementSnapshot.from_rows(rows)
+        user_id = np.concatenate([self.user_id, new.user_id])
+        order = np.argsort(user_id, kind="stable")
+        sorted_user_id = user_id[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_user_id[1:] != sorted_user_id[:-1]])
+        group_size = np.diff(np.r_[group_start, len(sorted_user_id)])
+        position = np.arange(len(sorted_user_id)) - np.repeat(group_start, group_size)
+        keep = order[position >= np.repeat(group_size, group_size) - max_per_user]
+        return EngagementSnapshot(*[
+            np.concatenate([getattr(self, column), getattr(new, column)])[keep] for column in self.columns
+        ])
+
+    def __len__(self):
+        return len(self.content_id)
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = pd.DataFrame({column: getattr(self, column) for column in self.columns})
+        return self._df
+
+    def rows(self):
+        return [EngagementRow(*row) for row in zip(*[getattr(self, column) for column in self.columns])]
+
 
 class DataCollector:
     _instance = None  # Singleton instance reference
@@ -17,6 +94,8 @@ class DataCollector:
         return cls._instance
 
     def gather_data(self):
+        # everything up to the high water mark is in the snapshot, later rows come in through ingest_new_engagements
+        self.high_water_mark = db.session.query(func.max(Engagement.id)).scalar() or 0
         random_order_cte = (
             db.session.query(
                 Engagement.content_id,
@@ -33,10 +112,11 @@ class DataCollector:
                 or_(
                     Engagement.user_id >= 77,  # first user of Fall 2023
                     Engagement.user_id == 1,
-                )
+                ),
+                Engagement.id <= self.high_water_mark,
             )
         ).cte()
-        self.result = (
+        result = (
             db.session.query(
                 random_order_cte.c.content_id,
                 random_order_cte.c.user_id,
@@ -44,18 +124,130 @@ class DataCollector:
                 random_order_cte.c.engagement_value
             )
             .filter(
-                text("rn <= 1000")  # get a max of 2k records per user
+                text(f"rn <= {MAX_ENGAGEMENTS_PER_USER}")  # get a max of 2k records per user
             )
             .order_by(
                 random_order_cte.c.user_id,
                 text("rn")
             )
         ).all()
+        self.snapshot = EngagementSnapshot.from_rows(result)
+        # the lookback window's ids that were already there, in the snapshot or left out by the per user cap.
+        # Read in the same transaction as the rows, so a row that commits in between is in neither
+        self.seen_ids = {
+            row.id for row in self._query_new_engagements(
+                self.high_water_mark - INGESTION_LOOKBACK_IDS, Engagement.id <= self.high_water_mark
+            )
+        }
+
+    def _query_new_engagements(self, after_id, *criteria):
+        return (
+            db.session.query(
+                Engagement.id,
+                Engagement.content_id,
+                Engagement.user_id,
+                Engagement.engagement_type,
+                Engagement.engagement_value,
+            )
+            .filter(
+                Engagement.id > after_id,
+                or_(
+                    Engagement.user_id >= 77,  # first user of Fall 2023
+                    Engagement.user_id == 1,
+                ),
+                *criteria,
+            )
+            .order_by(Engagement.id)
+        )
+
+    def ingest_new_engagements(self, batch_size=10000):
+        """Adds the engagements committed since the last call to the snapshot, returns how many"""
+        # from INGESTION_LOOKBACK_IDS below the high water mark, a batch at a time, skipping the ids already seen
+        after_id = self.high_water_mark - INGESTION_LOOKBACK_IDS
+        ingested = 0
+        while True:
+            rows = self._query_new_engagements(after_id).limit(batch_size).all()
+            new_rows = [row for row in rows if row.id not in self.seen_ids]
+            if new_rows:
+                # rebinding instead of appending keeps readers on a consistent snapshot
+                self.snapshot = self.snapshot.append([row[1:] for row in new_rows])
+                self.seen_ids.update(row.id for row in new_rows)
+                self.high_water_mark = max(self.high_water_mark, new_rows[-1].id)
+                ingested += len(new_rows)
+            if len(rows) < batch_size:
+                break
+            after_id = rows[-1].id
+        low_id = self.high_water_mark - INGESTION_LOOKBACK_IDS
+        self.seen_ids = {engagement_id for engagement_id in self.seen_ids if engagement_id > low_id}
+        return ingested
+
+    def get_snapshot(self):
+        # read only columns, zero copy
+        return self.snapshot
 
     def get_data(self):
-    	return copy.deepcopy(self.result)
+        return self.snapshot.rows()
 
     def get_data_df(self):
-    	return pd.DataFrame(self.get_data(), columns=[
-            'content_id', 'user_id', 'engagement_type', 'engagement_value'
-        ])
+        # shallow copy: shares the snapshot's data, but adding or replacing columns won't touch it
+        return self.snapshot.df.copy(deep=False)
+
+
+def refresh_recommender(recommender_class):
+    # build the new singleton off to the side so requests keep using the old one until it is ready
+    instance = object.__new__(recommender_class)
+    instance.gather_data()
+    instance.compute_similarity()
+    recommender_class._instance = instance
+
+
+def ingest_engagements():
+    # every engagement committed since the last ingestion
+    return DataCollector().ingest_new_engagements()
+
+
+def refresh_recommenders(teams):
+    for team in teams:
+        module_path = f"src.data_structures.user_based_recommender.{team}.UserBasedRecommender"
+        TeamSpecificUserBasedRecommender = __import__(
+            module_path, fromlist=['UserBasedRecommender']
+        ).UserBasedRecommender
+        if TeamSpecificUserBasedRecommender._instance is None:
+            continue  # never instantiated, it will pick up the new rows when it is
+        if not getattr(TeamSpecificUserBasedRecommender, "refresh_on_ingestion", True):
+            continue  # reads the engagement table itself, rebuilding it would scan the whole table
+        try:
+            refresh_recommender(TeamSpecificUserBasedRecommender)
+        except Exception as e:
+            print(f"Failed to refresh user based recommender for {team}, {e}")
+            print(traceback.format_exc())
+
+
+def start_incremental_ingestion(app):
+    interval = app.config.get("INCREMENTAL_INGESTION_INTERVAL_SECONDS")
+    rebuild_interval = app.config.get("USER_BASED_RECOMMENDER_REBUILD_SECONDS")
+    teams = app.config.get("TEAMS_TO_RUN_FOR")
+
+    def run():
+        # new rows reach the snapshot every interval, but rebuilding the recommenders from it
+        # recomputes their similarities from scratch, so that only happens every rebuild_interval
+        pending_rows = 0
+        last_rebuild = time.time()
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    pending_rows += ingest_engagements()
+                    if pending_rows and rebuild_interval and time.time() - last_rebuild >= rebuild_interval:
+                        refresh_recommenders(teams)
+                        print(f"rebuilt the user based recommenders with {pending_rows} new engagements")
+                        pending_rows = 0
+                        last_rebuild = time.time()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Failed to ingest new engagements, {e}")
+                    print(traceback.format_exc())
+
+    thread = threading.Thread(target=run, name="engagement-ingestion", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,137 @@
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+
+def top_k_similar_rows(matrix, n_neighbours, min_similarity=0.0, block_size=1024):
+    """
+    Cosine similarity between the rows of `matrix` (sparse or dense) keeping only the
+    n_neighbours most similar other rows per row, as a sparse rows x rows matrix.
+    Works on blocks of rows so the dense similarity scratch space is block_size x rows
+    instead of rows x rows
+    """
+    matrix = csr_matrix(matrix, dtype=np.float64)
+    n_rows = matrix.shape[0]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = diags(1.0 / norms) @ matrix
+    normalized_t = normalized.T.tocsr()
+    k = min(n_neighbours, n_rows - 1)
+    rows, cols, data = [], [], []
+    if k <= 0:
+        return csr_matrix((n_rows, n_rows))
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        similarities = (normalized[start:stop] @ normalized_t).toarray()
+        block_rows = np.arange(stop - start)
+        similarities[block_rows, block_rows + start] = -np.inf  # never your own neighbour
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        keep = top_similarities > min_similarity
+        rows.append(np.repeat(block_rows + start, k)[keep.ravel()])
+        cols.append(top[keep])
+        data.append(top_similarities[keep])
+    return csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, n_rows),
+    )
+
+
+class SparseCollaborativeFilter:
+    """
+    User based collaborative filtering over a CSR users x content interaction matrix.
+    Only the top n_neighbours similar users are stored per user, and recommending is a
+    single sparse vector-matrix product of the user's neighbour weights with the
+    interaction matrix, so memory and latency scale with the number of interactions
+    rather than users x content.
+
+    Duplicate (user_id, content_id) pairs are summed, or for the similarity only their last
+    value is kept when similarity_keep_last. similarity_content_ids restricts the columns
+    used to compute similarity (recommendations still come from all content)
+    """
+
+    def __init__(self, user_ids, content_ids, values, n_neighbours=20, min_similarity=0.0,
+                 similarity_content_ids=None, similarity_keep_last=False):
+        user_ids = np.asarray(user_ids)
+        content_ids = np.asarray(content_ids)
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))  # missing values count as 0
+        self.user_ids, user_rows = np.unique(user_ids, return_inverse=True)
+        self.content_ids, content_cols = np.unique(content_ids, return_inverse=True)
+        self.user_id_to_index = {int(user_id): i for i, user_id in enumerate(self.user_ids)}
+        self.interactions = csr_matrix(
+            (values, (user_rows, content_cols)),
+            shape=(len(self.user_ids), len(self.content_ids)),
+        )
+        self.interactions.sum_duplicates()
+        self.engaged = self.interactions.copy()
+        self.engaged.data = np.ones_like(self.engaged.data)
+
+        similarity_matrix = self.interactions
+        if similarity_keep_last:
+            # the last row of each (user, content) pair, like assigning them into a dense matrix in order
+            pairs = user_rows.astype(np.int64) * len(self.content_ids) + content_cols
+            _, reversed_first = np.unique(pairs[::-1], return_index=True)
+            last = len(pairs) - 1 - reversed_first
+            similarity_matrix = csr_matrix(
+                (values[last], (user_rows[last], content_cols[last])),
+                shape=self.interactions.shape,
+            )
+        if similarity_content_ids is not None:
+            columns = np.flatnonzero(np.isin(self.content_ids, np.asarray(similarity_content_ids)))
+            similarity_matrix = self.interactions[:, columns]
+        self.neighbours = top_k_similar_rows(similarity_matrix, n_neighbours, min_similarity)
+
+    def _user_index(self, user_id):
+        if user_id is None:
+            return None
+        return self.user_id_to_index.get(int(user_id))
+
+    def similar_users(self, user_id):
+        """[(user_id, similarity), ...] most similar first"""
+        index = self._user_index(user_id)
+        if index is None:
+            return []
+        row = self.neighbours.getrow(index)
+        order = np.argsort(-row.data, kind="stable")
+        return [(int(self.user_ids[row.indices[i]]), float(row.data[i])) for i in order]
+
+    def seen_content_ids(self, user_id):
+        index = self._user_index(user_id)
+        if index is None:
+            return np.array([], dtype=self.content_ids.dtype)
+        return self.content_ids[self.interactions.getrow(index).indices]
+
+    def recommend(self, user_id, num_recommendations, weighted=True, binary=False, exclude_seen=True,
+                  exclude_content_ids=None, min_score=None):
+        """
+        Content the user's neighbours engaged with, best first, as (content_ids, scores).
+        Each neighbour contributes its similarity (weighted) or 1 (unweighted) times its
+        interaction value (or 1 when binary, i.e. counting engagements).
+        Content scoring min_score or less is left out
+        """
+        index = self._user_index(user_id)
+        if index is None or num_recommendations <= 0:
+            return [], []
+        weights = self.neighbours.getrow(index)
+        if not weighted:
+            weights.data = np.ones_like(weights.data)
+        values = self.engaged if binary else self.interactions
+        scores = (weights @ values).tocsr()
+        scores.sum_duplicates()
+        columns, column_scores = scores.indices, scores.data
+        if exclude_seen:
+            unseen = ~np.isin(columns, self.interactions.getrow(index).indices)
+            columns, column_scores = columns[unseen], column_scores[unseen]
+        if exclude_content_ids is not None and len(exclude_content_ids):
+            keep = ~np.isin(self.content_ids[columns], np.asarray(exclude_content_ids))
+            columns, column_scores = columns[keep], column_scores[keep]
+        if min_score is not None:
+            keep = column_scores > min_score
+            columns, column_scores = columns[keep], column_scores[keep]
+        if num_recommendations < len(columns):
+            top = np.argpartition(-column_scores, num_recommendations - 1)[:num_recommendations]
+            columns, column_scores = columns[top], column_scores[top]
+        order = np.argsort(-column_scores, kind="stable")
+        return (
+            [int(content_id) for content_id in self.content_ids[columns[order]]],
+            [float(score) for score in column_scores[order]],
+        )
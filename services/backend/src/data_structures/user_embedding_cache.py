@@ -0,0 +1,56 @@
+import threading
+
+from flask import current_app
+from src.data_structures.lru_cache import LRUCache
+
+
+class UserEmbeddingCache:
+    """
+    Two tower user embeddings keyed by (team, user_id), so paging through a feed
+    doesn't re-query the user's engagements and re-run the user tower every page.
+    A new engagement by the user invalidates their entries for every team.
+    Sized by USER_EMBEDDING_CACHE_SIZE and USER_EMBEDDING_CACHE_TTL_SECONDS
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UserEmbeddingCache, cls).__new__(cls)
+            cls._instance.cache = LRUCache(
+                current_app.config.get("USER_EMBEDDING_CACHE_SIZE", 0),
+                current_app.config.get("USER_EMBEDDING_CACHE_TTL_SECONDS"),
+            )
+            cls._instance._teams = set()
+            # bumped on every invalidation, an embedding computed before the bump is never stored
+            cls._instance._generations = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def generation(self, user_id):
+        return self._generations.get(int(user_id), 0)
+
+    def get(self, team, user_id):
+        return self.cache.get((team, int(user_id)))
+
+    def put(self, team, user_id, embedding, generation):
+        with self._lock:
+            if self.generation(user_id) != generation:
+                return  # the user engaged while this embedding was being computed
+            self._teams.add(team)
+            self.cache.put((team, int(user_id)), embedding)
+
+    def invalidate_user(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for team in self._teams:
+                self.cache.pop((team, user_id))
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def invalidate_user_embeddings(user_id):
+    # nothing to invalidate until the first recommendation request creates the cache
+    if UserEmbeddingCache._instance is not None and user_id is not None:
+        UserEmbeddingCache._instance.invalidate_user(user_id)
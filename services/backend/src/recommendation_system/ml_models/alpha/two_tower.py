@@ -4,8 +4,10 @@ import torch.nn as nn
 import pandas as pd
 import numpy as np
 import logging
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import os
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
+from src.recommendation_system.ml_models.user_feature_builder import UserFeatureBuilder
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
 script_dir = os.path.dirname(os.path.abspath(__file__))
 legalize = lambda s:os.path.join(script_dir, s)
 import warnings
@@ -163,91 +165,31 @@ class ModelWrapper:
             self.model.load_state_dict(torch.load(legalize(model_path), map_location=torch.device('cpu')))
 
         self.model.eval()
+        # prefit content_transformer.pkl if shipped, otherwise fit once when the ANN index is built
+        self.content_transformer = ContentFeatureTransformer.load_if_exists(legalize("content_transformer.pkl"))
+
+    def fit_content_transformer(self, df):
+        self.content_transformer = ContentFeatureTransformer.fit(df)
+
+    def get_content_transformer(self, df):
+        if self.content_transformer is None:
+            return ContentFeatureTransformer.fit(df)
+        return self.content_transformer
 
     def generate_content_embeddings(self, df):
        # Configuration options
-        TOP_ARTIST_STYLES = 30
-        TOP_SOURCES = 30
-        TOP_SEEDS = 14
         TOP_CONTENT = 251
         PROMPT_EMBEDDING_LENGTH = 512
 
-        # Get the top artist styles, sources, and seeds
-        top_artist_styles = df['artist_style'].value_counts().nlargest(TOP_ARTIST_STYLES).index.tolist()
-        top_sources = df['source'].value_counts().nlargest(TOP_SOURCES).index.tolist()
-        top_seeds = df['seed'].value_counts().nlargest(TOP_SEEDS).index.tolist()
-
-        # Replace less frequent artist styles, sources, and seeds with 'other'
-        df['artist_style'] = df['artist_style'].apply(lambda x: x if x in top_artist_styles else 'other')
-        df['source'] = df['source'].apply(lambda x: x if x in top_sources else 'other')
-        df['seed'] = df['seed'].apply(lambda x: str(x) if x in top_seeds else 'other')
-
-        # One-hot encode categorical features
-        encoder = OneHotEncoder()
-        content_onehot = encoder.fit_transform(df[['artist_style', 'model_version', 'seed', 'source']])
-        content_onehot_df = pd.DataFrame(content_onehot.toarray(), columns=encoder.get_feature_names_out(['artist_style', 'model_version', 'seed', 'source']))
-        df = pd.concat([df, content_onehot_df], axis=1)
-
-        # Normalizing linear features
-        scaler = StandardScaler()
-        df[['guidance_scale', 'num_inference_steps']] = scaler.fit_transform(df[['guidance_scale', 'num_inference_steps']])
+        # Top artist styles, sources and seeds, one-hot encoding and normalizing linear features
+        df = self.get_content_transformer(df).transform(df)
 
         # Compute top N content pieces based on engagement_value
-        from collections import defaultdict
         top_n_content = df.groupby('content_id')['engagement_value'].count().nlargest(TOP_CONTENT).index.tolist()
-        user_vector_dict = defaultdict(lambda: {
-            'millisecond_engaged_vector': np.zeros(len(top_n_content)),
-            'like_vector': np.zeros(len(top_n_content)),
-            'dislike_vector': np.zeros(len(top_n_content))
-        })
-
-        # Initialize vectors for each user
-        def aggregate_engagement(group):
-            # Summing millisecond engagement values
-            millisecond_engagement_sum = group.loc[group['engagement_type'] != 'Like', 'engagement_value'].sum()
-
-            # Counting likes and dislikes
-            likes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == 1)].shape[0]
-            dislikes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == -1)].shape[0]
-
-            return pd.Series({
-                'millisecond_engagement_sum': millisecond_engagement_sum,
-                'likes_count': likes_count,
-                'dislikes_count': dislikes_count
-            })
-
-        # Group by user_id and content_id, then apply the function
-        engagement_aggregate = df[df['content_id'].isin(top_n_content)].groupby(['user_id', 'content_id']).apply(aggregate_engagement).reset_index()
-
-        # Now, populate your user_vector_dict
-        for _, row in engagement_aggregate.iterrows():
-            user_id = row['user_id']
-            content_id = row['content_id']
-            idx = top_n_content.index(content_id)
-
-            user_vector_dict[user_id]['millisecond_engaged_vector'][idx] = row['millisecond_engagement_sum']
-            user_vector_dict[user_id]['like_vector'][idx] = row['likes_count']
-            user_vector_dict[user_id]['dislike_vector'][idx] = row['dislikes_count']
-
-        # Convert to DataFrame
-        user_vector_df = pd.DataFrame.from_dict(user_vector_dict, orient='index')
-        del user_vector_dict
-
-
-        TOP_CONTENT = len(user_vector_df['millisecond_engaged_vector'].tolist()[0])
-
-
-        # Unpack vector columns into individual columns
-        millisecond_columns = [f"ms_engaged_{i}" for i in range(TOP_CONTENT)]
-        like_columns = [f"like_vector_{i}" for i in range(TOP_CONTENT)]
-        dislike_columns = [f"dislike_vector_{i}" for i in range(TOP_CONTENT)]
-
-        user_vector_df[millisecond_columns] = pd.DataFrame(user_vector_df['millisecond_engaged_vector'].tolist(), index=user_vector_df.index)
-        user_vector_df[like_columns] = pd.DataFrame(user_vector_df['like_vector'].tolist(), index=user_vector_df.index)
-        user_vector_df[dislike_columns] = pd.DataFrame(user_vector_df['dislike_vector'].tolist(), index=user_vector_df.index)
+        TOP_CONTENT = len(top_n_content)
 
-        # Drop the original vector columns
-        user_vector_df.drop(['millisecond_engaged_vector', 'like_vector', 'dislike_vector'], axis=1, inplace=True)
+        # ms_engaged_i, like_vector_i and dislike_vector_i per user with an engagement on the top content
+        user_vector_df = UserFeatureBuilder(top_n_content).frame(df)
 
         # Join User Vector To Df
         df = df.merge(
@@ -303,7 +245,7 @@ class ModelWrapper:
         content_tensor = df_to_content_tensor(df)
         content_tensor = content_tensor[:, :593]
 
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -312,90 +254,18 @@ class ModelWrapper:
 
     def generate_user_embeddings(self, df):
         # Configuration options
-        TOP_ARTIST_STYLES = 30
-        TOP_SOURCES = 30
-        TOP_SEEDS = 14
         TOP_CONTENT = 251
         PROMPT_EMBEDDING_LENGTH = 512
 
-        # Get the top artist styles, sources, and seeds
-        top_artist_styles = df['artist_style'].value_counts().nlargest(TOP_ARTIST_STYLES).index.tolist()
-        top_sources = df['source'].value_counts().nlargest(TOP_SOURCES).index.tolist()
-        top_seeds = df['seed'].value_counts().nlargest(TOP_SEEDS).index.tolist()
-
-        # Replace less frequent artist styles, sources, and seeds with 'other'
-        df['artist_style'] = df['artist_style'].apply(lambda x: x if x in top_artist_styles else 'other')
-        df['source'] = df['source'].apply(lambda x: x if x in top_sources else 'other')
-        df['seed'] = df['seed'].apply(lambda x: str(x) if x in top_seeds else 'other')
-
-        # One-hot encode categorical features
-        encoder = OneHotEncoder()
-        content_onehot = encoder.fit_transform(df[['artist_style', 'model_version', 'seed', 'source']])
-        content_onehot_df = pd.DataFrame(content_onehot.toarray(), columns=encoder.get_feature_names_out(['artist_style', 'model_version', 'seed', 'source']))
-        df = pd.concat([df, content_onehot_df], axis=1)
-
-        # Normalizing linear features
-        scaler = StandardScaler()
-        df[['guidance_scale', 'num_inference_steps']] = scaler.fit_transform(df[['guidance_scale', 'num_inference_steps']])
+        # Top artist styles, sources and seeds, one-hot encoding and normalizing linear features
+        df = self.get_content_transformer(df).transform(df)
 
         # Compute top N content pieces based on engagement_value
-        from collections import defaultdict
         top_n_content = df.groupby('content_id')['engagement_value'].count().nlargest(TOP_CONTENT).index.tolist()
-        user_vector_dict = defaultdict(lambda: {
-            'millisecond_engaged_vector': np.zeros(len(top_n_content)),
-            'like_vector': np.zeros(len(top_n_content)),
-            'dislike_vector': np.zeros(len(top_n_content))
-        })
-
-        # Initialize vectors for each user
-        def aggregate_engagement(group):
-            # Summing millisecond engagement values
-            millisecond_engagement_sum = group.loc[group['engagement_type'] != 'Like', 'engagement_value'].sum()
-
-            # Counting likes and dislikes
-            likes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == 1)].shape[0]
-            dislikes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == -1)].shape[0]
-
-            return pd.Series({
-                'millisecond_engagement_sum': millisecond_engagement_sum,
-                'likes_count': likes_count,
-                'dislikes_count': dislikes_count
-            })
-
-        # Group by user_id and content_id, then apply the function
-        engagement_aggregate = df[df['content_id'].isin(top_n_content)].groupby(['user_id', 'content_id']).apply(aggregate_engagement).reset_index()
-
-        # Now, populate your user_vector_dict
-        for _, row in engagement_aggregate.iterrows():
-            user_id = row['user_id']
-            content_id = row['content_id']
-            idx = top_n_content.index(content_id)
-
-            user_vector_dict[user_id]['millisecond_engaged_vector'][idx] = row['millisecond_engagement_sum']
-            user_vector_dict[user_id]['like_vector'][idx] = row['likes_count']
-            user_vector_dict[user_id]['dislike_vector'][idx] = row['dislikes_count']
-
-
-        # Convert to DataFrame
-        user_vector_df = pd.DataFrame.from_dict(user_vector_dict, orient='index')
-        del user_vector_dict
-
-
-        TOP_CONTENT = len(user_vector_df['millisecond_engaged_vector'].tolist()[0])
-
-        # Unpack vector columns into individual columns
-        millisecond_columns = [f"ms_engaged_{i}" for i in range(TOP_CONTENT)]
-        like_columns = [f"like_vector_{i}" for i in range(TOP_CONTENT)]
-        dislike_columns = [f"dislike_vector_{i}" for i in range(TOP_CONTENT)]
-
-
-        user_vector_df[millisecond_columns] = pd.DataFrame(user_vector_df['millisecond_engaged_vector'].tolist(), index=user_vector_df.index)
-
-        user_vector_df[like_columns] = pd.DataFrame(user_vector_df['like_vector'].tolist(), index=user_vector_df.index)
-        user_vector_df[dislike_columns] = pd.DataFrame(user_vector_df['dislike_vector'].tolist(), index=user_vector_df.index)
+        TOP_CONTENT = len(top_n_content)
 
-        # Drop the original vector columns
-        user_vector_df.drop(['millisecond_engaged_vector', 'like_vector', 'dislike_vector'], axis=1, inplace=True)
+        # ms_engaged_i, like_vector_i and dislike_vector_i per user with an engagement on the top content
+        user_vector_df = UserFeatureBuilder(top_n_content).frame(df)
 
         # Join User Vector To Df
         df = df.merge(
@@ -451,7 +321,7 @@ class ModelWrapper:
         if len(df["user_id"].unique()) != len(user_tensor):
             logging.error("Mismatch in user tensor length")
             return np.array([])
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
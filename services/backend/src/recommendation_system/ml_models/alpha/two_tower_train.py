@@ -9,8 +9,15 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import torch
 import pickle
 import random
+import os
+import sys
+
+# Run from this directory (python two_tower_train.py), which is how two_tower is imported below. two_tower and
+# the shared preprocessing import from src, so services/backend goes on the path as well
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
 from two_tower import TwoTowerModel, ContrastiveLoss
 from engagement_dataset import EngagementDataset
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
 
 # Load data and preprocess (use your preprocessing code here)
 # ...
@@ -64,6 +71,11 @@ df[["guidance_scale", "num_inference_steps"]] = scaler.fit_transform(
     df[["guidance_scale", "num_inference_steps"]]
 )
 
+# Persist the fitted preprocessing, the ModelWrapper loads it instead of refitting
+ContentFeatureTransformer.from_sklearn(
+    top_artist_styles, top_sources, top_seeds, encoder, scaler
+).save("content_transformer.pkl")
+
 # Compute top N content pieces based on engagement_value
 from collections import defaultdict
 
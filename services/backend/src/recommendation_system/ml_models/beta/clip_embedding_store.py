@@ -0,0 +1,112 @@
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def legalize(s):
+    return os.path.join(script_dir, s)
+
+
+PICKLED_EMBEDDINGS_FILE = "clip_embed.pkl"  # (rows, 512) float16, rows in the order of the lookup
+LOOKUP_FILE = "clip_lookup.csv"
+CACHE_FILE = "clip_embed.f32"  # raw row major float32, shape and source in CACHE_FILE.json
+# matrices at least this large are memory mapped from CACHE_FILE instead of held in memory
+MEMMAP_MIN_BYTES = 64 * 1024 * 1024
+
+
+class ClipEmbeddingStore:
+    """
+    The CLIP embeddings of the content beta trained on, loaded once into one contiguous
+    float32 matrix with a content_id => row hash index, so the content tensor builder
+    gathers its rows with one fancy index instead of unpickling clip_embed.pkl and
+    reading clip_lookup.csv on every call.
+    Matrices past MEMMAP_MIN_BYTES are converted once into CACHE_FILE and memory mapped
+    read only, so every worker shares the same pages
+    """
+    _instance = None  # Singleton instance reference
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(ClipEmbeddingStore, cls).__new__(cls)
+                instance._open()
+                cls._instance = instance
+        return cls._instance
+
+    @classmethod
+    def from_arrays(cls, embeddings, content_ids):
+        """A store over embeddings already in memory, rows in the order of content_ids"""
+        store = super(ClipEmbeddingStore, cls).__new__(cls)
+        store._set(np.ascontiguousarray(embeddings, dtype=np.float32), content_ids)
+        return store
+
+    def _open(self):
+        content_ids = pd.read_csv(legalize(LOOKUP_FILE), usecols=["content_id"])["content_id"].to_numpy(dtype=np.int64)
+        source = os.stat(legalize(PICKLED_EMBEDDINGS_FILE))
+        fingerprint = {"size": source.st_size, "mtime": source.st_mtime, "rows": len(content_ids)}
+        embeddings = self._load_cache(fingerprint)
+        if embeddings is None:
+            with open(legalize(PICKLED_EMBEDDINGS_FILE), "rb") as f:
+                embeddings = np.ascontiguousarray(pickle.load(f), dtype=np.float32)
+            if embeddings.nbytes >= MEMMAP_MIN_BYTES:
+                embeddings = self._write_cache(embeddings, fingerprint)
+        self._set(embeddings, content_ids)
+
+    def _load_cache(self, fingerprint):
+        try:
+            with open(legalize(f"{CACHE_FILE}.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("fingerprint") != fingerprint:
+            return None
+        return np.memmap(legalize(CACHE_FILE), dtype=np.float32, mode="r", shape=tuple(manifest["shape"]))
+
+    def _write_cache(self, embeddings, fingerprint):
+        """The embeddings memory mapped from CACHE_FILE, or left in memory when it can't be written"""
+        tmp_suffix = f".tmp-{os.getpid()}"
+        try:
+            embeddings.tofile(legalize(CACHE_FILE + tmp_suffix))
+            os.replace(legalize(CACHE_FILE + tmp_suffix), legalize(CACHE_FILE))
+            # the manifest goes in last, a cache without a matching one is never loaded
+            with open(legalize(f"{CACHE_FILE}.json{tmp_suffix}"), "w") as f:
+                json.dump({"fingerprint": fingerprint, "shape": list(embeddings.shape)}, f)
+            os.replace(legalize(f"{CACHE_FILE}.json{tmp_suffix}"), legalize(f"{CACHE_FILE}.json"))
+        except OSError as e:
+            print(f"keeping the clip embeddings in memory, can't write {CACHE_FILE}, {e}")
+            return embeddings
+        return self._load_cache(fingerprint)
+
+    def _set(self, embeddings, content_ids):
+        self.embeddings = embeddings
+        # a content_id listed twice keeps its first row, like the lookup's boolean mask did
+        unique_content_ids, first_rows = np.unique(np.asarray(content_ids, dtype=np.int64), return_index=True)
+        self._index = pd.Index(unique_content_ids)
+        self._first_rows = first_rows
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+    def rows(self, content_ids):
+        """Row of each content_id, -1 for content without a CLIP embedding"""
+        positions = self._index.get_indexer(np.asarray(content_ids, dtype=np.int64))
+        return np.where(positions >= 0, self._first_rows[positions], -1)
+
+    def vectors(self, content_ids):
+        """(len(content_ids), dim) float32 matrix of their embeddings, zeros for content without one"""
+        rows = self.rows(content_ids)
+        vectors = np.zeros((len(rows), self.dim), dtype=np.float32)
+        known = rows >= 0
+        vectors[known] = self.embeddings[rows[known]]
+        return vectors
@@ -3,10 +3,23 @@ import torch
 import torch.nn as nn
 import pandas as pd
 import numpy as np
+import json
 import logging
 import os
 script_dir = os.path.dirname(os.path.abspath(__file__))
 legalize = lambda s:os.path.join(script_dir, s)
+from src.recommendation_system.ml_models.beta.clip_embedding_store import ClipEmbeddingStore
+from src.recommendation_system.ml_models.user_feature_builder import UserFeatureBuilder
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
+
+with open(legalize('top_n_content.json'), 'r') as file:
+    user_feature_builder = UserFeatureBuilder(json.load(file))
+
+with open(legalize('top_data.json'), 'r') as file:
+    top_data = json.load(file)
+top_data['top_artist_styles'].append('other')
+top_data['top_sources'].append('other')
+top_data['top_seeds'].append('other')
 
 # Set up basic logging configuration
 logging.basicConfig(level=logging.ERROR)
@@ -44,30 +57,13 @@ class DummyTwoTowerModel(nn.Module):
 def df_to_content_tensor(df):
     from collections import defaultdict
     from sklearn.preprocessing import OneHotEncoder, StandardScaler
-    import pickle
-    import json
 
     TOP_ARTIST_STYLES = 30
     TOP_SOURCES = 30
     TOP_SEEDS = 14
-    PROMPT_EMBEDDING_LENGTH = 512
-
 
     df['seed'] = df.seed.apply(str)
 
-    with open(legalize("clip_embed.pkl"), "rb") as f:
-        clip_embed = pickle.load(f)
-
-    clip_embedding = pd.read_csv(legalize('clip_lookup.csv'))
-    clip_embedding['vecs'] = list(clip_embed)
-
-    with open(legalize('top_data.json'), 'r') as file:
-        top_data = json.load(file)
-    top_data['top_artist_styles'].append('other')
-    top_data['top_sources'].append('other')
-    top_data['top_seeds'].append('other')
-
-
     df = df.groupby('content_id').agg({'artist_style':lambda x: x.iloc[0],
                                       'source':lambda x: x.iloc[0],
                                       'seed':lambda x: x.iloc[0],
@@ -75,15 +71,8 @@ def df_to_content_tensor(df):
                                       'num_inference_steps':lambda x: x.iloc[0],
                                       'content_id':lambda x:x.iloc[0]})
 
-    clip_e = []
-
-    for i in df.content_id:
-        if i in clip_embedding.content_id:
-            clip_embedding[clip_embedding.content_id==i].vecs.iloc[0].astype(np.float32)
-        else:
-            clip_e.append(np.full((PROMPT_EMBEDDING_LENGTH,), 0, dtype=np.float32))
-
-    clip_e = np.array(clip_e)
+    # the CLIP vector of each content, zeros for content the lookup doesn't have
+    clip_e = ClipEmbeddingStore().vectors(df.content_id)
 
 
     NUM = {
@@ -129,36 +118,6 @@ def df_to_content_tensor(df):
     return content_features_tensor
 
 def df_to_user_tensor(df):
-    from collections import defaultdict
-    import json
-
-
-    TOP_CONTENT = 251
-    with open(legalize('top_n_content.json'), 'r') as file:
-        top_n_content = json.load(file)
-
-    user_columns = (
-        [f'ms_engaged_{i}' for i in range(TOP_CONTENT)] +
-        [f'like_vector_{i}' for i in range(TOP_CONTENT)] +
-        [f'dislike_vector_{i}' for i in range(TOP_CONTENT)]
-    )
-
-    # User: Construct groupby-like columns for each user using
-    def aggregate_engagement(group):
-        # Summing millisecond engagement values
-        millisecond_engagement_sum = group.loc[group['engagement_type'] != 'Like', 'engagement_value'].sum()
-
-        # Counting likes and dislikes
-        likes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == 1)].shape[0]
-        dislikes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == -1)].shape[0]
-
-        return pd.Series({
-            'millisecond_engagement_sum': millisecond_engagement_sum,
-            'likes_count': likes_count,
-            'dislikes_count': dislikes_count
-        })
-
-    # Group by user_id and content_id, then apply the function
     try:
         df.created_date = pd.to_datetime(df.created_date)
         df['contentCmltLike'] = ((df.engagement_type == 'Like') & (df.engagement_value == 1)).groupby(df.content_id).cumsum()
@@ -228,29 +187,8 @@ def df_to_user_tensor(df):
         basic_dislike['score'] = -basic_dislike['engagement_value_x']/basic_dislike['engagement_value_y']
         #basic_dislike
 
-        engagement_aggregate = df[df['content_id'].isin(top_n_content)].groupby(['user_id', 'content_id'],group_keys=False).apply(aggregate_engagement).reset_index()
-
-        #print(f'Successfully aggregated, {engagement_aggregate.shape}')
-        user_vector_dict = defaultdict(lambda: {
-            'millisecond_engaged_vector': np.zeros(len(top_n_content)),
-            'like_vector': np.zeros(len(top_n_content)),
-            'dislike_vector': np.zeros(len(top_n_content))
-        })
-        # Now, populate your user_vector_dict
-        for _, row in engagement_aggregate.iterrows():
-            user_id = row['user_id']
-            content_id = row['content_id']
-            idx = top_n_content.index(content_id)
-
-            user_vector_dict[user_id]['millisecond_engaged_vector'][idx] = row['millisecond_engagement_sum']
-            user_vector_dict[user_id]['like_vector'][idx] = row['likes_count']
-            user_vector_dict[user_id]['dislike_vector'][idx] = row['dislikes_count']
-
-
-
-        # Convert to DataFrame
-        user_vector_df = pd.DataFrame.from_dict(user_vector_dict, orient='index')
-        del user_vector_dict
+        # ms_engaged_i, like_vector_i and dislike_vector_i per user with an engagement on the top content
+        user_vector_df = user_feature_builder.frame(df)
 
         user_vector_df_new = user_vector_df
         user_vector_df_new = user_vector_df_new.merge(basic_like[['user_id','score']], right_on='user_id',left_index=True, how = "left").drop(columns=['user_id'])
@@ -260,14 +198,8 @@ def df_to_user_tensor(df):
         user_vector_df_new.fillna(0, inplace=True)
 
 
-        user_vector_mil = np.vstack(user_vector_df['millisecond_engaged_vector']).astype(np.float32)
-        user_vector_like = np.vstack(user_vector_df['like_vector']).astype(np.float32)
-        user_vector_dislike = np.vstack(user_vector_df['dislike_vector']).astype(np.float32)
-
         #print('Sucessfully constructed user_vectors')
-        user_features_tensor = torch.FloatTensor(
-            np.hstack([user_vector_mil,user_vector_like,user_vector_dislike])
-        )
+        user_features_tensor = torch.FloatTensor(user_vector_df.values.astype(np.float32))
     except:
         user_features_tensor = torch.ones((753,), dtype=torch.float32)
 
@@ -289,7 +221,7 @@ class ModelWrapper:
             logging.error("Mismatch in content tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -302,7 +234,7 @@ class ModelWrapper:
             logging.error("Mismatch in user tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
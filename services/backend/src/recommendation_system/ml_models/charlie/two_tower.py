@@ -8,7 +8,8 @@ from sklearn.model_selection import train_test_split
 import numpy as np
 import pandas as pd
 import logging
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
 import torch
 # import pickle
 # import random
@@ -133,33 +134,13 @@ class ContrastiveLoss(nn.Module):
 # Functions to convert DataFrame to Tensors
 
 
-def preprocessing(df):
+def preprocessing(df, content_transformer):
     # Configuration options
-    TOP_ARTIST_STYLES = 30
-    TOP_SOURCES = 30
-    TOP_SEEDS = 14
     TOP_CONTENT = 251
     PROMPT_EMBEDDING_LENGTH = 512
 
-    # Get the top artist styles, sources, and seeds
-    top_artist_styles = df['artist_style'].value_counts().nlargest(TOP_ARTIST_STYLES).index.tolist()
-    top_sources = df['source'].value_counts().nlargest(TOP_SOURCES).index.tolist()
-    top_seeds = df['seed'].value_counts().nlargest(TOP_SEEDS).index.tolist()
-
-    # Replace less frequent artist styles, sources, and seeds with 'other'
-    df['artist_style'] = df['artist_style'].apply(lambda x: x if x in top_artist_styles else 'other')
-    df['source'] = df['source'].apply(lambda x: x if x in top_sources else 'other')
-    df['seed'] = df['seed'].apply(lambda x: str(x) if x in top_seeds else 'other')
-
-    # One-hot encode categorical features
-    encoder = OneHotEncoder()
-    content_onehot = encoder.fit_transform(df[['artist_style', 'model_version', 'seed', 'source']])
-    content_onehot_df = pd.DataFrame(content_onehot.toarray(), columns=encoder.get_feature_names_out(['artist_style', 'model_version', 'seed', 'source']))
-    df = pd.concat([df, content_onehot_df], axis=1)
-
-    # Normalizing linear features
-    scaler = StandardScaler()
-    df[['guidance_scale', 'num_inference_steps']] = scaler.fit_transform(df[['guidance_scale', 'num_inference_steps']])
+    # Top artist styles, sources and seeds, one-hot encoding and normalizing linear features
+    df = content_transformer.transform(df)
 
     # Compute top N content pieces based on engagement_value
     from collections import defaultdict
@@ -239,16 +220,16 @@ def preprocessing(df):
     return df
 
 
-def df_to_content_tensor(df):
+def df_to_content_tensor(df, content_transformer):
     # Group by content_id and sum
-    df = preprocessing(df)
+    df = preprocessing(df, content_transformer)
     aggregated = df.groupby('content_id').sum()
     content_tensor = torch.tensor(aggregated.values, dtype=torch.float32)
     return content_tensor
 
-def df_to_user_tensor(df):
+def df_to_user_tensor(df, content_transformer):
     # Group by user_id and sum
-    df = preprocessing(df)
+    df = preprocessing(df, content_transformer)
     aggregated = df.groupby('user_id').sum()
     user_tensor = torch.tensor(aggregated.values, dtype=torch.float32)
     return user_tensor
@@ -263,14 +244,26 @@ class ModelWrapper:
             self.model = TwoTowerModel(754, 594, 64)
             self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
         self.model.eval()
+        # prefit content_transformer.pkl if shipped, otherwise fit once when the ANN index is built
+        self.content_transformer = ContentFeatureTransformer.load_if_exists(
+            "/usr/src/app/src/recommendation_system/ml_models/charlie/content_transformer.pkl"
+        )
+
+    def fit_content_transformer(self, df):
+        self.content_transformer = ContentFeatureTransformer.fit(df)
+
+    def get_content_transformer(self, df):
+        if self.content_transformer is None:
+            return ContentFeatureTransformer.fit(df)
+        return self.content_transformer
 
     def generate_content_embeddings(self, df):
-        content_tensor = df_to_content_tensor(df)
+        content_tensor = df_to_content_tensor(df, self.get_content_transformer(df))
         if len(df["content_id"].unique()) != len(content_tensor):
             logging.error("Mismatch in content tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -278,12 +271,12 @@ class ModelWrapper:
         return embeddings
 
     def generate_user_embeddings(self, df):
-        user_tensor = df_to_user_tensor(df)
+        user_tensor = df_to_user_tensor(df, self.get_content_transformer(df))
         if len(df["user_id"].unique()) != len(user_tensor):
             logging.error("Mismatch in user tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -9,8 +9,15 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import torch
 import pickle
 import random
+import os
+import sys
+
+# Run from this directory (python two_tower_train.py), which is how two_tower is imported below. two_tower and
+# the shared preprocessing import from src, so services/backend goes on the path as well
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
 from two_tower import TwoTowerModel, ContrastiveLoss, EngagementDataset
 from two_tower import preprocessing
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
 
 # Load data and preprocess (use your preprocessing code here)
 df = pd.read_csv("C:/Users/tanis/Desktop/Columbia/Coursework/Fall 2023/03. Recommendation Systems/Data/columbia_data.tsv", sep='\t')
@@ -20,7 +27,10 @@ prompt_embedding = pd.DataFrame(prompt_to_embedding.items(), columns=["content_i
 df = df.merge(prompt_embedding, on="content_id")
 del prompt_embedding
 
-df = preprocessing(df)
+# Persist the fitted preprocessing, the ModelWrapper loads it instead of refitting
+content_transformer = ContentFeatureTransformer.fit(df)
+content_transformer.save("content_transformer.pkl")
+df = preprocessing(df, content_transformer)
 # print(df[cont_avg_eng])
 
 # Create overall features
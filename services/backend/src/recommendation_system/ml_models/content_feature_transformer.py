@@ -0,0 +1,125 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['artist_style', 'model_version', 'seed', 'source']
+SCALED_COLUMNS = ['guidance_scale', 'num_inference_steps']
+
+TOP_ARTIST_STYLES = 30
+TOP_SOURCES = 30
+TOP_SEEDS = 14
+
+
+def _categories(values):
+    # the same (sorted) categories a OneHotEncoder would learn, missing values last
+    values = pd.Series(values)
+    missing = values.isna()
+    categories = sorted(values[~missing].unique().tolist())
+    if missing.any():
+        categories.append(None)
+    return categories
+
+
+def bucket_categories(df, top_artist_styles, top_sources, top_seeds):
+    """Replaces less frequent artist styles, sources and seeds with 'other' (seeds become strings), in place"""
+    df['artist_style'] = df['artist_style'].where(df['artist_style'].isin(top_artist_styles), 'other')
+    df['source'] = df['source'].where(df['source'].isin(top_sources), 'other')
+    df['seed'] = np.where(df['seed'].isin(top_seeds), df['seed'].astype(str), 'other')
+    return df
+
+
+class ContentFeatureTransformer:
+    """
+    The content feature preprocessing the two tower ModelWrappers share: keep the top
+    artist styles / sources / seeds (everything else becomes 'other'), one hot encode
+    artist_style, model_version, seed and source, and standard scale guidance_scale and
+    num_inference_steps. It is fit once (or built from a team's prefit encoder.pkl /
+    scaler.pkl) and then only applied, so a single content or user row ends up in the
+    same feature space as the rows the ANN index was built from.
+    Equivalent to OneHotEncoder / StandardScaler .transform, except that unknown
+    categories encode as all zeros instead of raising
+    """
+
+    def __init__(self, top_artist_styles, top_sources, top_seeds, categories, scaler_mean, scaler_scale):
+        self.top_artist_styles = list(top_artist_styles)
+        self.top_sources = list(top_sources)
+        self.top_seeds = list(top_seeds)
+        self.categories = [list(column_categories) for column_categories in categories]
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.feature_names = [
+            f"{column}_{category}"
+            for column, column_categories in zip(CATEGORICAL_COLUMNS, self.categories)
+            for category in column_categories
+        ]
+        self._category_codes = [
+            {category: i for i, category in enumerate(column_categories)}
+            for column_categories in self.categories
+        ]
+        self._offsets = np.cumsum([0] + [len(column_categories) for column_categories in self.categories])
+
+    @classmethod
+    def from_sklearn(cls, top_artist_styles, top_sources, top_seeds, encoder, scaler):
+        """From a prefit OneHotEncoder and StandardScaler, e.g. a team's encoder.pkl / scaler.pkl"""
+        return cls(
+            top_artist_styles, top_sources, top_seeds,
+            encoder.categories_, scaler.mean_, scaler.scale_,
+        )
+
+    @classmethod
+    def fit(cls, df, n_artist_styles=TOP_ARTIST_STYLES, n_sources=TOP_SOURCES, n_seeds=TOP_SEEDS):
+        """Learns what the ModelWrappers used to fit on every call, from an engagement DataFrame"""
+        top_artist_styles = df['artist_style'].value_counts().nlargest(n_artist_styles).index.tolist()
+        top_sources = df['source'].value_counts().nlargest(n_sources).index.tolist()
+        top_seeds = df['seed'].value_counts().nlargest(n_seeds).index.tolist()
+        bucketed = bucket_categories(df[CATEGORICAL_COLUMNS].copy(), top_artist_styles, top_sources, top_seeds)
+        scaled = df[SCALED_COLUMNS].to_numpy(dtype=np.float64)
+        scale = scaled.std(axis=0)
+        scale[scale == 0] = 1.0
+        return cls(
+            top_artist_styles, top_sources, top_seeds,
+            [_categories(bucketed[column]) for column in CATEGORICAL_COLUMNS],
+            scaled.mean(axis=0), scale,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_if_exists(cls, path):
+        return cls.load(path) if os.path.isfile(path) else None
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    def bucket(self, df):
+        return bucket_categories(df, self.top_artist_styles, self.top_sources, self.top_seeds)
+
+    def one_hot(self, df):
+        """
+        One hot DataFrame of the (already bucketed) categorical columns, named like
+        OneHotEncoder.get_feature_names_out
+        """
+        encoded = np.zeros((len(df), len(self.feature_names)), dtype=np.float64)
+        rows = np.arange(len(df))
+        for i, column in enumerate(CATEGORICAL_COLUMNS):
+            codes = df[column].map(self._category_codes[i]).to_numpy(dtype=np.float64, na_value=-1)
+            known = codes >= 0
+            encoded[rows[known], self._offsets[i] + codes[known].astype(np.int64)] = 1.0
+        return pd.DataFrame(encoded, columns=self.feature_names, index=df.index)
+
+    def scale(self, df):
+        """Standard scales guidance_scale and num_inference_steps, in place"""
+        df[SCALED_COLUMNS] = (df[SCALED_COLUMNS].to_numpy(dtype=np.float64) - self.scaler_mean) / self.scaler_scale
+        return df
+
+    def transform(self, df):
+        """bucket + one_hot + scale, returns df with the one hot columns appended"""
+        df = self.bucket(df)
+        df = pd.concat([df, self.one_hot(df)], axis=1)
+        return self.scale(df)
@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import torch.nn.functional as F
 import logging
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
 
 logging.basicConfig(level=logging.ERROR)
 
@@ -90,7 +91,7 @@ class ModelWrapper:
         if user_tensor.shape[1] < 593:
             zeros = torch.zeros((user_tensor.shape[0], 593 - user_tensor.shape[1]))
             user_tensor = torch.cat((user_tensor, zeros), dim=1)
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -106,7 +107,7 @@ class ModelWrapper:
         if user_tensor.shape[1] < 753:
             zeros = torch.zeros((user_tensor.shape[0], 753 - user_tensor.shape[1]))
             user_tensor = torch.cat((user_tensor, zeros), dim=1)
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -4,12 +4,15 @@ import torch.nn as nn
 import pandas as pd
 import numpy as np
 import logging
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
 from src.recommendation_system.ml_models.foxtrot.utils import (
     get_tops,
+    fit_content_transformer,
     preprocess_for_tensor,
     create_user_tensor,
     create_content_tensor,
 )
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
 
 # Set up basic logging configuration
 logging.basicConfig(level=logging.ERROR)
@@ -74,15 +77,13 @@ class DummyTwoTowerModel(nn.Module):
 
 
 # Functions to convert DataFrame to Tensors
-def df_to_content_tensor(df):
-    top_artist_styles, top_sources, top_seeds, top_n_content = get_tops(df)
-    df = preprocess_for_tensor(df, top_artist_styles, top_sources, top_seeds, top_n_content)
+def df_to_content_tensor(df, content_transformer, top_n_content):
+    df = preprocess_for_tensor(df, content_transformer, top_n_content)
     content_tensor, _ = create_content_tensor(df, True)
     return content_tensor
 
-def df_to_user_tensor(df):
-    top_artist_styles, top_sources, top_seeds, top_n_content = get_tops(df)
-    df = preprocess_for_tensor(df, top_artist_styles, top_sources, top_seeds, top_n_content)
+def df_to_user_tensor(df, content_transformer, top_n_content):
+    df = preprocess_for_tensor(df, content_transformer, top_n_content)
     user_tensor, _ = create_user_tensor(df, True)
     return user_tensor
 
@@ -95,14 +96,29 @@ class ModelWrapper:
             self.model = TwoTowerModel()
             self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
         self.model.eval()
+        # prefit content_transformer.pkl if shipped, otherwise fit once when the ANN index is built
+        self.content_transformer = ContentFeatureTransformer.load_if_exists(
+            "/usr/src/app/src/recommendation_system/ml_models/foxtrot/content_transformer.pkl"
+        )
+
+    def fit_content_transformer(self, df):
+        top_artist_styles, top_sources, top_seeds, _ = get_tops(df)
+        self.content_transformer = fit_content_transformer(df, top_artist_styles, top_sources, top_seeds)
+
+    def get_content_transformer(self, df):
+        if self.content_transformer is None:
+            top_artist_styles, top_sources, top_seeds, _ = get_tops(df)
+            return fit_content_transformer(df, top_artist_styles, top_sources, top_seeds)
+        return self.content_transformer
 
     def generate_content_embeddings(self, df):
-        content_tensor = df_to_content_tensor(df)
+        top_n_content = get_tops(df)[3]
+        content_tensor = df_to_content_tensor(df, self.get_content_transformer(df), top_n_content)
         if len(df["content_id"].unique()) != len(content_tensor):
             logging.error("Mismatch in content tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -110,12 +126,13 @@ class ModelWrapper:
         return embeddings
 
     def generate_user_embeddings(self, df):
-        user_tensor = df_to_user_tensor(df)
+        top_n_content = get_tops(df)[3]
+        user_tensor = df_to_user_tensor(df, self.get_content_transformer(df), top_n_content)
         if len(df["user_id"].unique()) != len(user_tensor):
             logging.error("Mismatch in user tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -7,13 +7,14 @@ from src import db
 from sqlalchemy import func
 from src.api.content.models import Content, GeneratedContentMetadata
 from src.api.engagement.models import Engagement
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
 #import matplotlib.pyplot as plt
 from PIL import Image
 import requests
 from io import BytesIO
 import pickle
 import traceback
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer, SCALED_COLUMNS
+from src.recommendation_system.ml_models.user_feature_builder import UserFeatureBuilder
 
 # Get a list image sources based given list of content id
 def fetch_database_data_by_contentid(content_id_list):
@@ -304,75 +305,37 @@ def get_tops(indf, top_content=500):
     else:
         return top_artist_styles, top_sources, top_seeds, top_n_content
 
-def preprocess_for_tensor(df, top_artist_styles, top_sources, top_seeds, top_n_content, top_content=500):
-    PROMPT_EMBEDDING_LENGTH = 512
-    TOP_CONTENT = top_content
-
-    # Replace less frequent artist styles, sources, and seeds with 'other'
-    df['artist_style'] = df['artist_style'].apply(lambda x: x if x in top_artist_styles else 'other')
-    df['source'] = df['source'].apply(lambda x: x if x in top_sources else 'other')
-    df['seed'] = df['seed'].apply(lambda x: str(x) if x in top_seeds else 'other')
-
+def fit_content_transformer(df, top_artist_styles, top_sources, top_seeds):
+    """
+    The one hot categories and scaler preprocess_for_tensor applies, fit once: the top
+    artist styles / seeds / sources plus 'other' (always, so the features line up with
+    the model's), the model versions in df, and guidance_scale / num_inference_steps
+    standard scaled over df
+    """
     # ensure the same columns(features) important!!!
-    str_top_artist_styles = [str(i) for i in top_artist_styles]
-    str_top_artist_styles.append('other')
-    str_top_seeds = [str(i) for i in top_seeds]
-    str_top_seeds.append('other')
-    str_top_sources = [str(i) for i in top_sources]
-    str_top_sources.append('other')
-    str_model = [str(i) for i in list(df['model_version'].unique())]
-
-    # One-hot encode categorical features
-    categories = [str_top_artist_styles, str_model, str_top_seeds, str_top_sources]
-    encoder = OneHotEncoder(categories=categories)
-    content_onehot = encoder.fit_transform(df[['artist_style', 'model_version', 'seed', 'source']])
-    content_onehot_df = pd.DataFrame(content_onehot.toarray(), columns=encoder.get_feature_names_out(['artist_style', 'model_version', 'seed', 'source']))
-    df = pd.concat([df, content_onehot_df], axis=1)
-
-    # Normalizing linear features
-    scaler = StandardScaler()
-    df[['guidance_scale', 'num_inference_steps']] = scaler.fit_transform(df[['guidance_scale', 'num_inference_steps']])
-
-    # Compute top N content pieces based on engagement_value
-    from collections import defaultdict
-    user_vector_dict = defaultdict(lambda: {
-        'millisecond_engaged_vector': np.zeros(len(top_n_content)),
-        'like_vector': np.zeros(len(top_n_content)),
-        'dislike_vector': np.zeros(len(top_n_content))
-    })
-
-    # Group by user_id and content_id, then apply the function
-    engagement_aggregate = (
-        df[df['content_id'].isin(top_n_content)]
-        .groupby(['user_id', 'content_id'])
-        .apply(aggregate_engagement)
+    categories = [
+        [str(i) for i in top_artist_styles] + ['other'],
+        [str(i) for i in df['model_version'].unique()],
+        [str(i) for i in top_seeds] + ['other'],
+        [str(i) for i in top_sources] + ['other'],
+    ]
+    scaled = df[SCALED_COLUMNS].to_numpy(dtype=np.float64)
+    scale = scaled.std(axis=0)
+    scale[scale == 0] = 1.0
+    return ContentFeatureTransformer(
+        top_artist_styles, top_sources, top_seeds, categories, scaled.mean(axis=0), scale
     )
 
-    # Now, populate your user_vector_dict
-    for index, row in engagement_aggregate.iterrows():
-        user_id, content_id = index
-        idx = top_n_content.index(content_id)
-
-        user_vector_dict[user_id]['millisecond_engaged_vector'][idx] = row['millisecond_engagement_sum']
-        user_vector_dict[user_id]['like_vector'][idx] = row['likes_count']
-        user_vector_dict[user_id]['dislike_vector'][idx] = row['dislikes_count']
 
-    # Convert to DataFrame
-    user_vector_df = pd.DataFrame.from_dict(user_vector_dict, orient='index')
-    del user_vector_dict
-
-
-    # Unpack vector columns into individual columns
-    millisecond_columns = [f"ms_engaged_{i}" for i in range(TOP_CONTENT)]
-    like_columns = [f"like_vector_{i}" for i in range(TOP_CONTENT)]
-    dislike_columns = [f"dislike_vector_{i}" for i in range(TOP_CONTENT)]
+def preprocess_for_tensor(df, content_transformer, top_n_content):
+    PROMPT_EMBEDDING_LENGTH = 512
 
-    user_vector_df[millisecond_columns] = pd.DataFrame(user_vector_df['millisecond_engaged_vector'].tolist(), index=user_vector_df.index)
-    user_vector_df[like_columns] = pd.DataFrame(user_vector_df['like_vector'].tolist(), index=user_vector_df.index)
-    user_vector_df[dislike_columns] = pd.DataFrame(user_vector_df['dislike_vector'].tolist(), index=user_vector_df.index)
+    # Replace less frequent artist styles, sources, and seeds with 'other', one-hot encode categorical
+    # features and normalize linear features
+    df = content_transformer.transform(df)
 
-    # Drop the original vector columns
-    user_vector_df.drop(['millisecond_engaged_vector', 'like_vector', 'dislike_vector'], axis=1, inplace=True)
+    # ms_engaged_i, like_vector_i and dislike_vector_i per user with an engagement on the top content
+    user_vector_df = UserFeatureBuilder(top_n_content).frame(df)
 
     # Join User Vector To Df
     df = df.merge(
@@ -431,7 +394,10 @@ def process_df_to_tensor(df):
     TOP_CONTENT = 500
     top_artist_styles, top_sources, top_seeds, top_n_content = get_tops(df, TOP_CONTENT)
 
-    df = preprocess_for_tensor(df, top_artist_styles, top_sources, top_seeds, top_n_content, TOP_CONTENT)
+    # Persist the fitted preprocessing, the ModelWrapper loads it instead of fitting its own
+    content_transformer = fit_content_transformer(df, top_artist_styles, top_sources, top_seeds)
+    content_transformer.save("content_transformer.pkl")
+    df = preprocess_for_tensor(df, content_transformer, top_n_content)
 
     user_features_tensor, user_columns = create_user_tensor(df)
 
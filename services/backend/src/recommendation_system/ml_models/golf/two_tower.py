@@ -5,6 +5,9 @@ import pandas as pd
 import numpy as np
 import logging
 import pickle
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
+from src.recommendation_system.ml_models.user_feature_builder import UserFeatureBuilder, user_feature_names
+from src.recommendation_system.ml_models.tower_runtime import tower_runner
 
 # Set up basic logging configuration
 logging.basicConfig(level=logging.ERROR)
@@ -15,12 +18,8 @@ def load_pickle(file):
     return data
 
 file_path = '/usr/src/app/src/recommendation_system/ml_models/golf/'
-top_artist_styles = load_pickle(file_path+'top_artist_styles.pkl')
-top_sources = load_pickle(file_path+'top_sources.pkl')
-top_seeds = load_pickle(file_path+'top_seeds.pkl')
 TOP_CONTENT_IDs = load_pickle(file_path+'TOP_CONTENT_IDs.pkl')
-encoder = load_pickle(file_path+'encoder.pkl')
-scaler = load_pickle(file_path+'scaler.pkl')
+user_feature_builder = UserFeatureBuilder(TOP_CONTENT_IDs)
 
 TOP_ARTIST_STYLES = 30
 TOP_SOURCES = 30
@@ -71,87 +70,29 @@ def df_to_user_tensor(df):
 
 
 
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-
 def preprocessing_user(df):
-    # import and define other functions
-    from collections import defaultdict
-    def aggregate_engagement(group):
-        # Summing millisecond engagement values
-        millisecond_engagement_sum = group.loc[group['engagement_type'] != 'Like', 'engagement_value'].sum()
-        # Counting likes and dislikes
-        likes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == 1)].shape[0]
-        dislikes_count = group.loc[(group['engagement_type'] == 'Like') & (group['engagement_value'] == -1)].shape[0]
-        return pd.Series({
-            'millisecond_engagement_sum': millisecond_engagement_sum,
-            'likes_count': likes_count,
-            'dislikes_count': dislikes_count
-        })
     # change data format
-    df['engagement_type'] = df['engagement_type'].apply(lambda x: x.name)    
-    user_vector_dict = defaultdict(lambda: {
-        'millisecond_engaged_vector': np.zeros(len(TOP_CONTENT_IDs)),
-        'like_vector': np.zeros(len(TOP_CONTENT_IDs)),
-        'dislike_vector': np.zeros(len(TOP_CONTENT_IDs))
-    })
-
-    for user_id in df['user_id'].unique():
-        _ = user_vector_dict[user_id]
-    if len(df[df['content_id'].isin(TOP_CONTENT_IDs)]) == 0:
-        pass
-    else:
-        engagement_aggregate = df[df['content_id'].isin(TOP_CONTENT_IDs)].groupby(['user_id', 'content_id']).apply(aggregate_engagement).reset_index()
-        for _, row in engagement_aggregate.iterrows():
-            user_id = row['user_id']
-            content_id = row['content_id']
-            idx = TOP_CONTENT_IDs.index(content_id)
-
-            user_vector_dict[user_id]['millisecond_engaged_vector'][idx] = row['millisecond_engagement_sum']
-            user_vector_dict[user_id]['like_vector'][idx] = row['likes_count']
-            user_vector_dict[user_id]['dislike_vector'][idx] = row['dislikes_count']
-
-    user_vector_df = pd.DataFrame.from_dict(user_vector_dict, orient='index')
-    millisecond_columns = [f"ms_engaged_{i}" for i in range(TOP_CONTENT)]
-    like_columns = [f"like_vector_{i}" for i in range(TOP_CONTENT)]
-    dislike_columns = [f"dislike_vector_{i}" for i in range(TOP_CONTENT)]
-
-    user_vector_df[millisecond_columns] = pd.DataFrame(user_vector_df['millisecond_engaged_vector'].tolist(), index=user_vector_df.index)
-    user_vector_df[like_columns] = pd.DataFrame(user_vector_df['like_vector'].tolist(), index=user_vector_df.index)
-    user_vector_df[dislike_columns] = pd.DataFrame(user_vector_df['dislike_vector'].tolist(), index=user_vector_df.index)
-    user_vector_df.drop(['millisecond_engaged_vector', 'like_vector', 'dislike_vector'], axis=1, inplace=True)
+    df['engagement_type'] = df['engagement_type'].apply(lambda x: x.name)
+    user_vector_df = user_feature_builder.frame(df, df['user_id'].unique())
 
+    # one row per engagement, df_to_user_tensor sums them per user
     df = df.merge(
         user_vector_df.reset_index().rename(columns={'index': 'user_id'}),
         on='user_id'
     )
 
-    user_columns = (
-        ['user_id'] + 
-        [f'ms_engaged_{i}' for i in range(TOP_CONTENT)] +
-        [f'like_vector_{i}' for i in range(TOP_CONTENT)] +
-        [f'dislike_vector_{i}' for i in range(TOP_CONTENT)]
-    )
+    user_columns = ['user_id'] + user_feature_names(TOP_CONTENT)
     user_features = df[user_columns]
     return user_features
 
-def preprocessing_content(df):
+def preprocessing_content(df, content_transformer):
     def try_eval(x):
         try:
             return eval(x)
         except:
             return 1.4
-    df['model_version'] = df['model_version'].apply(lambda x: try_eval(x))
-    df['artist_style'] = df['artist_style'].apply(lambda x: x if x in top_artist_styles else 'other')
-    df['source'] = df['source'].apply(lambda x: x if x in top_sources else 'other')
-    df['seed'] = df['seed'].apply(lambda x: str(x) if x in top_seeds else 'other')
-
-    # One-hot encode categorical features
-    content_onehot = encoder.transform(df[['artist_style', 'model_version', 'seed', 'source']])
-    content_onehot_df = pd.DataFrame(content_onehot.toarray(), columns=encoder.get_feature_names_out(['artist_style', 'model_version', 'seed', 'source']))
-    df = pd.concat([df, content_onehot_df], axis=1)
-
-
-    df[['guidance_scale', 'num_inference_steps']] = scaler.transform(df[['guidance_scale', 'num_inference_steps']])
+    df['model_version'] = df['model_version'].map({x: try_eval(x) for x in df['model_version'].unique()})
+    df = content_transformer.transform(df)
 
     prompt_columns = [f"prompt_embedding_{i}" for i in range(PROMPT_EMBEDDING_LENGTH)]
     df[prompt_columns] = pd.DataFrame(df['prompt_embedding'].tolist(), index=df.index)
@@ -179,15 +120,22 @@ class ModelWrapper:
             self.model = TwoTowerModel(753,593,64)
             self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
         self.model.eval()
+        self.content_transformer = ContentFeatureTransformer.from_sklearn(
+            load_pickle(file_path+'top_artist_styles.pkl'),
+            load_pickle(file_path+'top_sources.pkl'),
+            load_pickle(file_path+'top_seeds.pkl'),
+            load_pickle(file_path+'encoder.pkl'),
+            load_pickle(file_path+'scaler.pkl'),
+        )
 
     def generate_content_embeddings(self, df):
         # content_tensor = df_to_content_tensor(df)
-        content_tensor = df_to_content_tensor(preprocessing_content(df))
+        content_tensor = df_to_content_tensor(preprocessing_content(df, self.content_transformer))
         if len(df["content_id"].unique()) != len(content_tensor):
             logging.error("Mismatch in content tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_content(content_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).content(content_tensor)
         if len(embeddings) != len(content_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -201,7 +149,7 @@ class ModelWrapper:
             logging.error("Mismatch in user tensor length")
             return np.array([])
 
-        embeddings = self.model.forward_user(user_tensor).detach().numpy().astype(np.float32)
+        embeddings = tower_runner(self.model).user(user_tensor)
         if len(embeddings) != len(user_tensor) or embeddings.shape[1] > 64:
             logging.error("Mismatch in embeddings and tensor length or embedding size exceeds 64")
             return np.array([])
@@ -0,0 +1,188 @@
+import argparse
+import io
+import threading
+import time
+import traceback
+import weakref
+
+import numpy as np
+import torch
+import torch.nn as nn
+from flask import current_app, has_app_context
+
+BACKENDS = ["eager", "torchscript", "onnx"]
+# a compiled tower is only used when it reproduces the eager output of its first call
+PARITY_RTOL = 1e-4
+PARITY_ATOL = 1e-5
+
+_runners = weakref.WeakKeyDictionary()  # model => its TowerRunner
+_runners_lock = threading.Lock()
+
+
+class _Tower(nn.Module):
+    """One of a two tower model's forward_user / forward_content as a module's forward, to export it"""
+
+    def __init__(self, model, tower):
+        super(_Tower, self).__init__()
+        self.model = model
+        self.tower = tower
+
+    def forward(self, features):
+        return getattr(self.model, f"forward_{self.tower}")(features)
+
+
+def configure_threads(threads):
+    """torch's intra op threads for the process, 0 leaves torch's default"""
+    if threads and torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+
+class TowerRunner:
+    """
+    Runs a two tower model's user and content towers under torch.inference_mode, either
+    eagerly or through a TorchScript or ONNX Runtime export of the tower, made on its
+    first call. An export that fails, or whose output on that first call doesn't match
+    the eager one, is dropped and the tower stays eager. Returns float32 ndarrays like
+    the wrappers' .detach().numpy().astype(np.float32) did
+    """
+
+    def __init__(self, model, backend="eager", threads=0):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown two tower inference backend {backend}, expected one of {BACKENDS}")
+        self.model = model
+        self.backend = backend
+        self.threads = threads
+        self._compiled = {}  # (tower, input dimensions) => features tensor => ndarray
+        self._lock = threading.Lock()
+        configure_threads(threads)
+
+    def user(self, user_tensor):
+        return self.run("user", user_tensor)
+
+    def content(self, content_tensor):
+        return self.run("content", content_tensor)
+
+    def run(self, tower, features):
+        compiled = self._get_compiled(tower, features)
+        with torch.inference_mode():
+            embeddings = compiled(features)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _eager(self, tower):
+        forward = getattr(self.model, f"forward_{tower}")
+        return lambda features: forward(features).detach().numpy()
+
+    def _get_compiled(self, tower, features):
+        key = (tower, features.dim())
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    compiled = self._compile(tower, features) if self.backend != "eager" else None
+                    compiled = self._compiled[key] = compiled or self._eager(tower)
+        return compiled
+
+    def _compile(self, tower, example):
+        try:
+            with torch.no_grad():
+                compiled = (
+                    self._torchscript(tower, example) if self.backend == "torchscript" else self._onnx(tower, example)
+                )
+                if compiled is None:
+                    return None
+                expected = self._eager(tower)(example)
+                actual = np.asarray(compiled(example))
+            if actual.shape != expected.shape or not np.allclose(actual, expected, rtol=PARITY_RTOL, atol=PARITY_ATOL):
+                print(f"{self.backend} {tower} tower doesn't match the eager one, running it eagerly")
+                return None
+            return compiled
+        except Exception as e:
+            print(f"failed to export the {tower} tower to {self.backend}, running it eagerly, {e}")
+            print(traceback.format_exc())
+            return None
+
+    def _torchscript(self, tower, example):
+        traced = torch.jit.trace(_Tower(self.model, tower), example, check_trace=False)
+        if not self.model.training:
+            traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        return lambda features: traced(features).numpy()
+
+    def _onnx(self, tower, example):
+        try:
+            import onnxruntime
+        except ImportError:
+            print("onnxruntime isn't installed, running the two towers eagerly")
+            return None
+        buffer = io.BytesIO()
+        torch.onnx.export(
+            _Tower(self.model, tower), (example,), buffer,
+            input_names=["features"], output_names=["embeddings"],
+            dynamic_axes={"features": {0: "batch"}, "embeddings": {0: "batch"}} if example.dim() > 1 else None,
+        )
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        session = onnxruntime.InferenceSession(buffer.getvalue(), options, providers=["CPUExecutionProvider"])
+        return lambda features: session.run(None, {"features": features.numpy().astype(np.float32, copy=False)})[0]
+
+
+def tower_runner(model):
+    """
+    The TowerRunner of model, made on first use with TWO_TOWER_INFERENCE_BACKEND and
+    TORCH_INTRA_OP_THREADS. Outside of the app (training scripts) the towers run eagerly
+    """
+    runner = _runners.get(model)
+    if runner is None:
+        with _runners_lock:
+            runner = _runners.get(model)
+            if runner is None:
+                if has_app_context():
+                    runner = TowerRunner(
+                        model,
+                        current_app.config.get("TWO_TOWER_INFERENCE_BACKEND"),
+                        current_app.config.get("TORCH_INTRA_OP_THREADS"),
+                    )
+                else:
+                    runner = TowerRunner(model)
+                _runners[model] = runner
+    return runner
+
+
+def benchmark(model, user_dim, content_dim, backends=BACKENDS, threads=1, content_batch=1000, repeat=200):
+    """Mean milliseconds per call of each backend, for one user and for a batch of content"""
+    results = {}
+    shapes = {"user": (1, user_dim), "content": (content_batch, content_dim)}
+    for backend in backends:
+        runner = TowerRunner(model, backend, threads)
+        for tower, shape in shapes.items():
+            features = torch.rand(shape)
+            runner.run(tower, features)  # exports and warms up
+            started = time.perf_counter()
+            for _ in range(repeat):
+                runner.run(tower, features)
+            results[(backend, tower)] = 1000 * (time.perf_counter() - started) / repeat
+    return results
+
+
+if __name__ == "__main__":
+    # python -m src.recommendation_system.ml_models.tower_runtime --team beta --content-dim 592
+    parser = argparse.ArgumentParser(description="per call latency of a team's towers on each inference backend")
+    parser.add_argument("--team", required=True)
+    parser.add_argument("--user-dim", type=int, default=753)
+    parser.add_argument("--content-dim", type=int, default=593)
+    parser.add_argument("--content-batch", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    args = parser.parse_args()
+
+    module = __import__(f"src.recommendation_system.ml_models.{args.team}.two_tower", fromlist=["ModelWrapper"])
+    wrapper = getattr(module, "model_wrapper", None) or module.ModelWrapper()
+    timings = benchmark(
+        wrapper.model, args.user_dim, args.content_dim, args.backends,
+        args.threads, args.content_batch, args.repeat,
+    )
+    for (backend, tower), ms in timings.items():
+        shape = "1 user" if tower == "user" else f"{args.content_batch} content"
+        print(f"{args.team} {backend:<12} {tower:<8} {shape:<14} {ms:8.3f} ms/call")
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+def user_feature_names(n_content):
+    return (
+        [f"ms_engaged_{i}" for i in range(n_content)] +
+        [f"like_vector_{i}" for i in range(n_content)] +
+        [f"dislike_vector_{i}" for i in range(n_content)]
+    )
+
+
+class UserFeatureBuilder:
+    """
+    The user side features the two tower ModelWrappers share: per user, for each of the
+    top content, the summed engagement_value of non Like engagements, the number of
+    likes and the number of dislikes, laid out as [ms_engaged | like_vector | dislike_vector].
+    Built with one scatter over a dense content_id => column array instead of a
+    groupby().apply() plus an iterrows() loop with a list.index() per row.
+    Engagements are compared to the string 'Like' like the wrappers always did, so
+    engagement_type must already be the enum's name
+    """
+
+    def __init__(self, top_content_ids):
+        self.top_content_ids = np.asarray(list(top_content_ids), dtype=np.int64)
+        n_content = len(self.top_content_ids)
+        self.feature_names = user_feature_names(n_content)
+        self._column_by_content_id = np.full(
+            int(self.top_content_ids.max()) + 1 if n_content else 0, -1, dtype=np.int64
+        )
+        # assigned back to front so a content_id listed twice keeps its first column, like list.index
+        self._column_by_content_id[self.top_content_ids[::-1]] = np.arange(n_content)[::-1]
+
+    def columns(self, content_ids):
+        """Column of each content_id within a block, -1 for content outside the top content"""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        known = (content_ids >= 0) & (content_ids < len(self._column_by_content_id))
+        columns = np.full(len(content_ids), -1, dtype=np.int64)
+        columns[known] = self._column_by_content_id[content_ids[known]]
+        return columns
+
+    def matrix(self, df, user_ids=None):
+        """
+        (user_ids, users x 3 * len(top_content_ids) float64 matrix). user_ids defaults to
+        the users with an engagement on a top content, ascending, like a groupby on user_id
+        """
+        columns = self.columns(df["content_id"].to_numpy())
+        in_top = columns >= 0
+        users = df["user_id"].to_numpy()[in_top]
+        if user_ids is None:
+            user_ids = np.unique(users)
+        user_ids = np.asarray(user_ids)
+        rows = pd.Index(user_ids).get_indexer(users)
+        columns = columns[in_top]
+        is_like = (df["engagement_type"] == "Like").to_numpy()[in_top]
+        values = df["engagement_value"].to_numpy(dtype=np.float64)[in_top]
+
+        n_content = len(self.top_content_ids)
+        width = 3 * n_content
+        block = np.where(is_like, np.where(values == 1, 1, np.where(values == -1, 2, -1)), 0)
+        weights = np.where(is_like, 1.0, np.nan_to_num(values))  # a sum skips missing values
+        keep = (rows >= 0) & (block >= 0)
+        flat = rows[keep] * width + block[keep] * n_content + columns[keep]
+        matrix = np.bincount(flat, weights=weights[keep], minlength=len(user_ids) * width)
+        return user_ids, matrix.reshape(len(user_ids), width)
+
+    def frame(self, df, user_ids=None):
+        """matrix as a DataFrame indexed by user_id, with ms_engaged_i / like_vector_i / dislike_vector_i columns"""
+        user_ids, matrix = self.matrix(df, user_ids)
+        return pd.DataFrame(matrix, index=user_ids, columns=self.feature_names)
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class CandidateBatch:
+    """
+    The candidates of one request as parallel arrays, content_ids[i] has p_engage[i] and
+    the generator's scores[i] (nan when it had none). Models return it and rankers take
+    it, so ranking is a couple of array operations instead of a list of dicts per
+    candidate. to_dicts / from_dicts convert to and from the old
+    [{"content_id", "p_engage", "score"}] predictions
+    """
+
+    def __init__(self, content_ids, p_engage, scores=None):
+        self.content_ids = _as_content_ids(content_ids)
+        self.p_engage = np.asarray(p_engage, dtype=np.float64).reshape(-1)
+        if scores is None:
+            scores = np.full(len(self.content_ids), np.nan)
+        self.scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+        if not len(self.content_ids) == len(self.p_engage) == len(self.scores):
+            raise ValueError(
+                f"content_ids, p_engage and scores differ in length, "
+                f"{len(self.content_ids)}, {len(self.p_engage)} and {len(self.scores)}"
+            )
+
+    @classmethod
+    def from_candidates(cls, content_ids, p_engage, scores=None):
+        """
+        A batch for content_ids, with the generator scores looked up in scores, a
+        {content_id: score} dict, or the old {content_id: {"score": score}} one
+        """
+        scores = scores or {}
+        content_ids = _as_content_ids(content_ids)  # filters hand over sets, iterate them once
+        return cls(
+            content_ids,
+            p_engage,
+            np.fromiter(
+                (_score_value(scores.get(content_id)) for content_id in content_ids.tolist()),
+                dtype=np.float64,
+                count=len(content_ids),
+            ),
+        )
+
+    @classmethod
+    def from_dicts(cls, predictions):
+        predictions = list(predictions)
+        return cls(
+            [prediction["content_id"] for prediction in predictions],
+            [prediction["p_engage"] for prediction in predictions],
+            [_score_value(prediction.get("score")) for prediction in predictions],
+        )
+
+    @classmethod
+    def coerce(cls, predictions):
+        """predictions as a batch, whether a model returned one or the old list of dicts"""
+        if isinstance(predictions, cls):
+            return predictions
+        return cls.from_dicts(predictions)
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def take(self, indices):
+        return CandidateBatch(self.content_ids[indices], self.p_engage[indices], self.scores[indices])
+
+    def top_k(self, k):
+        """
+        Indices of the k highest p_engage, highest first. Ties go to the candidate that
+        came first, same as heapq.nlargest, so which ties make the cut doesn't depend on
+        how argpartition happened to split them
+        """
+        n = len(self)
+        k = max(0, min(int(k), n))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < n:
+            # the k-th largest value, everything above it is in and the earliest ties fill the rest
+            threshold = self.p_engage[np.argpartition(-self.p_engage, k - 1)[k - 1]]
+            above = np.flatnonzero(self.p_engage > threshold)
+            tied = np.flatnonzero(self.p_engage == threshold)[:k - len(above)]
+            indices = np.concatenate([above, tied])
+        else:
+            indices = np.arange(n)
+        return indices[np.lexsort((indices, -self.p_engage[indices]))]
+
+    def to_dicts(self):
+        return [
+            {
+                "content_id": content_id,
+                "p_engage": p_engage,
+                "score": None if np.isnan(score) else score,
+            }
+            for content_id, p_engage, score in zip(
+                self.content_ids.tolist(), self.p_engage.tolist(), self.scores.tolist()
+            )
+        ]
+
+
+def _as_content_ids(content_ids):
+    if isinstance(content_ids, np.ndarray):
+        return content_ids.astype(np.int64, copy=False).reshape(-1)
+    if not isinstance(content_ids, (list, tuple)):
+        content_ids = list(content_ids)  # a set or any other iterable
+    return np.asarray(content_ids, dtype=np.int64).reshape(-1)
+
+
+def _score_value(score):
+    if isinstance(score, dict):
+        score = score.get("score")
+    return np.nan if score is None else score
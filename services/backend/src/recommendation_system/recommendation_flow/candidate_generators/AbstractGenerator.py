@@ -4,11 +4,15 @@ import traceback
 
 from src.api.metrics.models import MetricFunnelType, MetricType
 from src.api.metrics.crud import add_metric
+from src.api.metrics.tracing import span
 
 
 class AbstractGenerator:
+    timeout_seconds = None  # how long GeneratorExecutor waits for this generator, None uses GENERATOR_TIMEOUT_SECONDS
+
     def get_content_ids(self, team_name, user_id, limit, offset, seed, starting_point):
-        response = self._get_content_ids(user_id, limit, offset, seed, starting_point)
+        with span(f"generator-{self._get_name()}", MetricFunnelType.CandidateGeneration):
+            response = self._get_content_ids(user_id, limit, offset, seed, starting_point)
         try:
             add_metric(
                 request_id=request.request_id,
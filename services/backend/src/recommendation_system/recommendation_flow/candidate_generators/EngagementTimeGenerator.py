@@ -1,10 +1,10 @@
-import operator
-
+from sqlalchemy import and_, or_
 from sqlalchemy.sql.expression import func
 from src import db
 from src.api.content.models import Content
 from src.api.engagement.models import Engagement, EngagementType
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
+from src.data_structures.approximate_nearest_neighbor import ann_many, ann_page
+from src.data_structures.feed_cursor import current_cursor
 
 from .AbstractGenerator import AbstractGenerator
 from .RandomGenerator import RandomGenerator
@@ -14,20 +14,27 @@ class EngagementTimeGenerator(AbstractGenerator):
     def _get_content_ids(self, user_id, limit, offset, seed, starting_point):
         if starting_point.get("content_id", None) is None:
             # TODO: should discount by creation_time so closer events have more weight
-            results = (
-                Engagement.query.with_entities(
-                    Engagement.content_id, func.max(Engagement.engagement_value)
-                )
+            longest = func.max(Engagement.engagement_value)
+            query = (
+                Engagement.query.with_entities(Engagement.content_id, longest)
                 .filter_by(
                     user_id=user_id,
                     engagement_type=EngagementType.MillisecondsEngagedWith,
                 )
                 .group_by(Engagement.content_id)
-                .order_by(func.max(Engagement.engagement_value))
-                .limit(limit + 1)
-                .offset(offset)
-                .all()
+                .order_by(longest, Engagement.content_id)
             )
+            cursor = current_cursor()
+            if cursor is None:
+                results = query.limit(limit + 1).offset(offset).all()
+            else:
+                after = cursor.after(self._get_name())
+                if after is not None:
+                    query = query.having(
+                        or_(longest > after[0], and_(longest == after[0], Engagement.content_id > after[1]))
+                    )
+                results = query.limit(limit + 1).all()
+                cursor.advance(self._get_name(), [(ms, content_id) for content_id, ms in results])
             num_results = len(results)
             if num_results == 0:
                 return RandomGenerator()._get_content_ids(
@@ -35,27 +42,19 @@ class EngagementTimeGenerator(AbstractGenerator):
                 )
             new_limit = 2 * (limit // num_results + 1)  # get 2x so we can take the best
             new_offset = offset // num_results + 1
-            new_result, new_scores = [], []
-            for (content_id, ms) in results:
-                # can probably do this faster as a heap so instead of `2 * limit * (1+log2(limit))` in `limit * log2(limit)`
-                content_ids, scores = ann_with_offset(
-                    content_id, 0.9, 2 * new_limit, new_offset, return_distances=True
-                )
-                new_result.extend(content_ids)
-                # TODO: score and ms should probably be normalized so multiplication makes sense
-                new_scores.extend(map(lambda score: score * ms, scores))
+            # every seed's neighbors in one index call, merged into the limit best with a heap
+            # TODO: score and ms should probably be normalized so multiplication makes sense
+            new_result, new_scores = ann_many(
+                [content_id for content_id, _ in results], 0.9, 2 * new_limit, new_offset,
+                weights=[ms for _, ms in results], limit=limit,
+            )
             if len(new_result) == 0:
                 return RandomGenerator().get_content_ids(
                     user_id, limit, offset, seed, starting_point
                 )
-            results_with_scores = sorted(
-                list(zip(new_result, new_scores)), key=operator.itemgetter(1)
-            )[:limit]
-            return list(map(operator.itemgetter(0), results_with_scores)), list(
-                map(operator.itemgetter(1), results_with_scores)
-            )
-        content_ids, scores = ann_with_offset(
-            starting_point["content_id"], 0.9, limit, offset, return_distances=True
+            return new_result, new_scores
+        content_ids, scores = ann_page(
+            self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
         )
         return content_ids, scores
 
@@ -1,9 +1,11 @@
 import operator
+from sqlalchemy import and_, or_
 from sqlalchemy.sql.expression import func
 from src import db
 from src.api.content.models import Content
 from src.api.engagement.models import Engagement, EngagementType
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
+from src.data_structures.approximate_nearest_neighbor import ann_page
+from src.data_structures.feed_cursor import current_cursor
 
 from .AbstractGenerator import AbstractGenerator
 
@@ -12,7 +14,7 @@ class ExampleGenerator(AbstractGenerator):
     def _get_content_ids(self, _, limit, offset, _seed, starting_point):
         if starting_point.get("content_id", None) is None:
             # TODO: should discount by creation_time so closer events have more weight
-            results = (
+            query = (
                 Engagement.query.with_entities(
                     Engagement.content_id, func.count()
                 )
@@ -20,14 +22,22 @@ class ExampleGenerator(AbstractGenerator):
                     engagement_type=EngagementType.Like,
                 )
                 .group_by(Engagement.content_id)
-                .order_by(func.count().desc())
-                .limit(limit)
-                .offset(offset)
-                .all()
+                .order_by(func.count().desc(), Engagement.content_id)
             )
+            cursor = current_cursor()
+            if cursor is None:
+                results = query.limit(limit).offset(offset).all()
+            else:
+                after = cursor.after(self._get_name())
+                if after is not None:
+                    query = query.having(
+                        or_(func.count() < after[0], and_(func.count() == after[0], Engagement.content_id > after[1]))
+                    )
+                results = query.limit(limit).all()
+                cursor.advance(self._get_name(), [(count, content_id) for content_id, count in results])
             return list(map(lambda x: x[0], results)), list(map(lambda x: x[1], results))
-        content_ids, scores = ann_with_offset(
-            starting_point["content_id"], 0.9, limit, offset, return_distances=True
+        content_ids, scores = ann_page(
+            self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
         )
         return content_ids, scores
     
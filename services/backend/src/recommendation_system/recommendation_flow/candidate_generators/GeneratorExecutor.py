@@ -0,0 +1,94 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import copy_current_request_context, current_app, request
+from src import db
+from src.api.metrics.crud import add_metric
+from src.api.metrics.models import MetricFunnelType, MetricType
+from src.api.metrics.tracing import carry_span_path
+
+
+class GeneratorExecutor:
+    """
+    Runs a controller's candidate generators concurrently on a bounded, process wide
+    thread pool, so a request waits for the slowest generator instead of all of them
+    in turn. Each worker runs in a copy of the request context, and so gets its own
+    app context and db session. A generator that hasn't returned within its timeout
+    (its timeout_seconds, or GENERATOR_TIMEOUT_SECONDS) or that raises is dropped and
+    recorded as a CandidateGenerationNumCandidates metric of -1. A dropped generator
+    can't be interrupted though: it keeps its worker, and its db connection, until it
+    finishes, so GENERATOR_EXECUTOR_MAX_WORKERS and SQLALCHEMY_ENGINE_OPTIONS are sized
+    together. GENERATOR_EXECUTOR_MAX_WORKERS = 0 runs the generators one after the other
+    """
+    _instance = None  # Singleton instance reference
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(GeneratorExecutor, cls).__new__(cls)
+            cls._instance._pool = None
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=current_app.config.get("GENERATOR_EXECUTOR_MAX_WORKERS"),
+                    thread_name_prefix="candidate-generator",
+                )
+            return self._pool
+
+    def run(self, generators, team_name, user_id, limit, offset, seed, starting_point):
+        """[(content_ids, scores), ...] of the generators that finished, in the order given"""
+        args = (team_name, user_id, limit, offset, seed, starting_point)
+        if len(generators) <= 1 or not current_app.config.get("GENERATOR_EXECUTOR_MAX_WORKERS"):
+            return [gen().get_content_ids(*args) for gen in generators]
+
+        pool = self._get_pool()
+        started = time.time()
+        futures = []
+        for gen in generators:
+            generator = gen()
+            # the open trace spans come along, so the generator's span nests under them
+            futures.append((generator, pool.submit(
+                carry_span_path(copy_current_request_context(generator.get_content_ids)), *args
+            )))
+
+        results = []
+        for generator, future in futures:
+            timeout = generator.timeout_seconds or current_app.config.get("GENERATOR_TIMEOUT_SECONDS")
+            try:
+                results.append(future.result(timeout=max(0, started + timeout - time.time())))
+            except TimeoutError:
+                future.cancel()  # only helps if it hasn't started, a running generator finishes in the background
+                print(f"dropping {generator._get_name()} for {team_name}, it took more than {timeout}s")
+                self._add_dropped_metric(generator, "timeout", timeout, *args)
+            except Exception as e:
+                print(f"dropping {generator._get_name()} for {team_name}, {e}")
+                print(traceback.format_exc())
+                self._add_dropped_metric(generator, "error", timeout, *args)
+        return results
+
+    def _add_dropped_metric(self, generator, reason, timeout, team_name, user_id, limit, offset, seed, starting_point):
+        try:
+            add_metric(
+                request_id=request.request_id,
+                team_name=team_name,
+                funnel_name=generator._get_name(),
+                user_id=user_id if user_id not in [None, 0] else None,
+                content_id=None,
+                metric_funnel_type=MetricFunnelType.CandidateGeneration,
+                metric_type=MetricType.CandidateGenerationNumCandidates,
+                metric_value=-1,
+                metric_metadata={
+                    "limit": limit, "offset": offset,
+                    "seed": seed, "starting_point": starting_point,
+                    "dropped": reason, "timeout_seconds": timeout,
+                    }
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"exception trying to add_metric {team_name}, {user_id}, {generator._get_name()}, {e}")
+            print(traceback.format_exc())
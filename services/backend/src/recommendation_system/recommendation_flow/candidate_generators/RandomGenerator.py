@@ -1,8 +1,9 @@
-from sqlalchemy import text
+from sqlalchemy import and_, or_, text
 from sqlalchemy.sql.expression import func
 from src import db
 from src.api.content.models import Content
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
+from src.data_structures.approximate_nearest_neighbor import ann_page
+from src.data_structures.feed_cursor import current_cursor
 
 from .AbstractGenerator import AbstractGenerator
 
@@ -10,6 +11,9 @@ from .AbstractGenerator import AbstractGenerator
 class RandomGenerator(AbstractGenerator):
     def _get_content_ids(self, user_id, limit, offset, seed, starting_point):
         if starting_point.get("content_id", None) is None:
+            cursor = current_cursor()
+            if cursor is not None:
+                return self._get_content_ids_after(cursor, limit, seed), None
             results = (
                 Content.query.with_entities(Content.id)
                 .order_by(func.random(seed))
@@ -18,10 +22,24 @@ class RandomGenerator(AbstractGenerator):
                 .all()
             )
             return list(map(lambda x: x[0], results)), None
-        content_ids, scores = ann_with_offset(
-            starting_point["content_id"], 0.9, limit, offset, return_distances=True
+        content_ids, scores = ann_page(
+            self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
         )
         return content_ids, scores
+
+    def _get_content_ids_after(self, cursor, limit, seed):
+        # RAND(seed) can't be resumed, so the seed shuffles by a per row hash instead,
+        # and the page continues after the (hash, id) the last one ended on
+        shuffle = func.crc32(func.concat(Content.id, "-", seed))
+        query = Content.query.with_entities(Content.id, shuffle)
+        after = cursor.after(self._get_name())
+        if after is not None:
+            query = query.filter(
+                or_(shuffle > after[0], and_(shuffle == after[0], Content.id > after[1]))
+            )
+        results = query.order_by(shuffle, Content.id).limit(limit).all()
+        cursor.advance(self._get_name(), [(key, content_id) for content_id, key in results])
+        return list(map(lambda x: x[0], results))
     
     def _get_name(self):
         return "Random"
@@ -1,63 +1,31 @@
 from src.recommendation_system.recommendation_flow.candidate_generators.AbstractGenerator import (
     AbstractGenerator,
 )
-from sqlalchemy.sql.expression import func
-from sqlalchemy.sql import text, select
-
-from src import db
-from src.api.content.models import Content
-from src.api.engagement.models import Engagement, EngagementType
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
-import pandas as pd
+from src.data_structures.approximate_nearest_neighbor import ann_page
+from src.data_structures.popularity_leaderboard import (
+    LIKE_COUNT,
+    LONGEST_DWELL_TIME,
+    PopularityLeaderboard,
+)
 
 
 class YourChoiceGenerator(AbstractGenerator):
     def _get_content_ids(self, user_id, limit, offset, seed, starting_point):
         if starting_point.get("content_id", None) is None:
-            # nb of likes subquery
-            results_like = (
-                Engagement.query.with_entities(Engagement.content_id, func.count())
-                .filter(Engagement.engagement_type == EngagementType.Like)
-                .group_by(Engagement.content_id)
-                .order_by(func.count().desc())
-                .limit(int(limit * 7))
-                .offset(offset)
-                .all()
-            )
+            # most liked content and the longest (1s to 20s) dwell time per content,
+            # * 7 to take into account filtering on both list will eventually decrease the nb of candidates by
+            # quite a lot
+            leaderboard = PopularityLeaderboard()
+            like_content_ids, like_counts = leaderboard.top_page(LIKE_COUNT, int(limit * 7), offset)
+            engage_time_content_ids, engage_times = leaderboard.top_page(LONGEST_DWELL_TIME, int(limit * 7), offset)
+            engage_time_by_content_id = dict(zip(engage_time_content_ids, engage_times))
 
-            # engagement time subquery
-            results_engage_time = (
-                Engagement.query.with_entities(
-                    Engagement.content_id, Engagement.engagement_value
-                )
-                .filter(Engagement.engagement_value <= 20000)
-                .filter(Engagement.engagement_value >= 1000)
-                .order_by(Engagement.engagement_value.desc())
-                .limit(
-                    int(limit * 7)
-                )  # * 7  to take into account filtering on both list will eventually decrease the nb of candidates by quite a lot
-                .offset(offset)
-                .all()
-            )
-
-            # Get content_ids from results_engage_time
-
-            engage_time_content_ids = [result[0] for result in results_engage_time]
-
-            # Filter results_like based on these content_ids
-            results_like_new = [
-                result
-                for result in results_like
-                if result[0] in engage_time_content_ids
-            ]
             # Create a dictionary where the keys are the content_ids and the values are tuples of (number_of_likes, engagement_time)
-            engagement_data = {result[0]: (result[1], 0) for result in results_like_new}
-            for result in results_engage_time:
-                if result[0] in engagement_data:
-                    engagement_data[result[0]] = (
-                        engagement_data[result[0]][0],
-                        result[1],
-                    )
+            engagement_data = {
+                content_id: (likes, engage_time_by_content_id[content_id])
+                for content_id, likes in zip(like_content_ids, like_counts)
+                if content_id in engage_time_by_content_id
+            }
 
             # Compute the engagement score for each content_id
             results_engagement_score = [
@@ -76,8 +44,8 @@ class YourChoiceGenerator(AbstractGenerator):
                     map(lambda x: x[1], results[:limit])  # engagement_score
                 )
         elif starting_point.get("content_id", False):
-            content_ids, scores = ann_with_offset(
-                starting_point["content_id"], 0.9, limit, offset, return_distances=True
+            content_ids, scores = ann_page(
+                self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
             )
             return content_ids, scores
         raise NotImplementedError("Need to provide a key we know about")
@@ -1,9 +1,5 @@
-from sqlalchemy import text
-from sqlalchemy.sql.expression import func
-from src import db
-from src.api.content.models import Content
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
-from src.api.engagement.models import Engagement, EngagementType
+from src.data_structures.approximate_nearest_neighbor import ann_page
+from src.data_structures.popularity_leaderboard import LIKE_COUNT, PopularityLeaderboard
 
 
 from src.recommendation_system.recommendation_flow.candidate_generators.AbstractGenerator import AbstractGenerator
@@ -11,22 +7,10 @@ from src.recommendation_system.recommendation_flow.candidate_generators.Abstract
 class YourChoiceGenerator(AbstractGenerator):
     def _get_content_ids(self, user_id, limit, offset, seed, starting_point):
         if starting_point.get("content_id", None) is None:
-            results = (
-                Engagement.query.with_entities(
-                    Engagement.content_id, func.count()
-                )
-                .filter_by(
-                    engagement_type=EngagementType.Like,
-                )
-                .group_by(Engagement.content_id)
-                .order_by(func.count().desc())
-                .limit(limit)
-                .offset(offset)
-                .all()
-            )
-            return list(map(lambda x: x[0], results)), [0]*(len(results))
-        content_ids, scores = ann_with_offset(
-            starting_point["content_id"], 0.9, limit, offset, return_distances=True
+            content_ids, _ = PopularityLeaderboard().top_page(LIKE_COUNT, limit, offset)
+            return content_ids, [0]*(len(content_ids))
+        content_ids, scores = ann_page(
+            self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
         )
         return content_ids, scores
     def _get_name(self):
@@ -1,9 +1,10 @@
 import operator
-from sqlalchemy.sql.expression import func
-from src import db
-from src.api.content.models import Content
-from src.api.engagement.models import Engagement, EngagementType
-from src.data_structures.approximate_nearest_neighbor import ann_with_offset
+from src.data_structures.approximate_nearest_neighbor import ann_page
+from src.data_structures.popularity_leaderboard import (
+    DWELL_TIME_SUM,
+    POSITIVE_LIKE_COUNT,
+    PopularityLeaderboard,
+)
 from src.recommendation_system.recommendation_flow.candidate_generators.AbstractGenerator import AbstractGenerator
 
 
@@ -11,40 +12,11 @@ class YourChoiceGenerator(AbstractGenerator):
     def _get_content_ids(self, _, limit, offset, _seed, starting_point):
         if starting_point.get("content_id", None) is None:
             # Create a list to select the content based on the number of "like" they gain from previous users.
-            results_popular = (
-                Engagement.query.with_entities(
-                    Engagement.content_id, func.count()
-                )
-                .filter_by(
-                    engagement_type=EngagementType.Like,
-                    engagement_value=1
-                )
-                .group_by(Engagement.content_id)
-                .order_by(func.count().desc())
-                .limit(limit)
-                .offset(offset)
-                .all()
-            )
-            Example_r = list(map(lambda x: x[0], results_popular))
+            Example_r, _ = PopularityLeaderboard().top_page(POSITIVE_LIKE_COUNT, limit, offset)
 
             # Select the items in "MillisecondsEngagedWith" to choose some items not rated by the user yet.
             # For the content we select, we order them by the Engagement_Value since longer time of engagement may mean a higher probability users will like.
-            results_top = (
-                Engagement.query.with_entities(
-                    Engagement.content_id, func.sum(Engagement.engagement_value)
-                )
-                .filter_by(
-                    engagement_type=EngagementType.MillisecondsEngagedWith,
-                )
-                .group_by(Engagement.content_id)
-                .order_by(func.sum(Engagement.engagement_value).desc())
-                .limit(limit)
-                .offset(offset)
-                .all()
-            )
-
-            # Extract content IDs from results_top
-            Example_t = list(map(lambda x: x[0], results_top))
+            Example_t, _ = PopularityLeaderboard().top_page(DWELL_TIME_SUM, limit, offset)
 
             # Combine the content we get from two selections.
             # In order to relieve consumers' visual fatigue, we make this new list have a picture with a higher engagement value appear every five popular pictures to give users a novel feeling.
@@ -56,8 +28,8 @@ class YourChoiceGenerator(AbstractGenerator):
             scores = [i for i in range(len(results),-1,-1)]  
 
             return results, scores
-        content_ids, scores = ann_with_offset(
-            starting_point["content_id"], 0.9, limit, offset, return_distances=True
+        content_ids, scores = ann_page(
+            self._get_name(), starting_point["content_id"], 0.9, limit, offset, return_distances=True
         )
         return content_ids, scores
 
@@ -7,7 +7,6 @@ class CollaberativeFilteredSimilarUsersGenerator(AbstractGenerator):
     def _get_content_ids(self, user_id, limit, offset, _seed, starting_point):
         if user_id:
             candidate_generator = UserBasedRecommender()
-            candidate_generator.compute_similarity()
             res = candidate_generator.recommend_items(user_id, limit, offset)
             return res
         else:
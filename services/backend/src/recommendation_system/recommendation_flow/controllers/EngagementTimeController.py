@@ -33,12 +33,7 @@ class EngagementTimeController(AbstractController):
             filtered_candidates,
             user_id,
             seed=seed,
-            scores={
-                content_id: {"score": score}
-                for content_id, score in zip(candidates, scores)
-            }
-            if scores is not None
-            else {},
+            scores=dict(zip(candidates, scores or [])),
         )
         rank = RandomRanker().rank_ids(limit, predictions, seed, starting_point)
         return rank
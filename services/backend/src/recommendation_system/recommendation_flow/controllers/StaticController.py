@@ -32,10 +32,7 @@ class StaticController(AbstractController):
             filtered_candidates,
             user_id,
             seed=seed,
-            scores={
-                content_id: {"score": score}
-                for content_id, score in zip(candidates, scores or [])
-            },
+            scores=dict(zip(candidates, scores or [])),
         )
         rank = RandomRanker().rank_ids(limit, predictions, seed, starting_point)
         return rank
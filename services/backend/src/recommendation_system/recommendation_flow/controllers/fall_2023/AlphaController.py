@@ -22,6 +22,9 @@ from src.recommendation_system.recommendation_flow.candidate_generators.alpha.Co
 from src.recommendation_system.recommendation_flow.candidate_generators.alpha.YourChoiceGenerator import (
     YourChoiceGenerator,
 )
+from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import (
+    GeneratorExecutor,
+)
 
 from src.api.metrics.models import TeamName
 
@@ -39,15 +42,15 @@ class AlphaController(AbstractController):
             generators.append(CollaberativeFilteredSimilarUsersGenerator)
         if starting_point.get("yourChoice", False):
             generators.append(YourChoiceGenerator)
-        for gen in generators:
-            cur_candidates, cur_scores = gen().get_content_ids(
-                TeamName.Alpha_F2023,
-                user_id,
-                candidate_limit,
-                offset,
-                seed,
-                starting_point,
-            )
+        for cur_candidates, cur_scores in GeneratorExecutor().run(
+            generators,
+            TeamName.Alpha_F2023,
+            user_id,
+            candidate_limit,
+            offset,
+            seed,
+            starting_point,
+        ):
             candidates += cur_candidates
             scores += cur_scores
         filtered_candidates = AlphaFilter().filter_ids(
@@ -60,12 +63,7 @@ class AlphaController(AbstractController):
             filtered_candidates,
             user_id,
             seed=seed,
-            scores={
-                content_id: {"score": score}
-                for content_id, score in zip(candidates, scores)
-            }
-            if scores is not None
-            else {},
+            scores=dict(zip(candidates, scores or [])),
         )
         rank = RandomRanker().rank_ids(limit, predictions, seed, starting_point)
         return rank
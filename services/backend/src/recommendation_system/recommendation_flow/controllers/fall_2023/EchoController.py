@@ -17,6 +17,7 @@ from src.recommendation_system.recommendation_flow.ranking.RandomRanker import (
 from src.recommendation_system.recommendation_flow.candidate_generators.echo.TwoTowerANNGenerator import TwoTowerANNGenerator
 from src.recommendation_system.recommendation_flow.candidate_generators.echo.CollaberativeFilteredSimilarUsersGenerator import CollaberativeFilteredSimilarUsersGenerator
 from src.recommendation_system.recommendation_flow.candidate_generators.echo.YourChoiceGenerator import YourChoiceGenerator
+from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import GeneratorExecutor
 
 from src.api.metrics.models import TeamName
 
@@ -33,11 +34,11 @@ class EchoController(AbstractController):
             generators.append(CollaberativeFilteredSimilarUsersGenerator)
         if starting_point.get("yourChoice", False):
             generators.append(YourChoiceGenerator)
-        for gen in generators:
-           cur_candidates, cur_scores = gen().get_content_ids(
-               TeamName.Echo_F2023,
-               user_id, candidate_limit, offset, seed, starting_point
-           )
+        for cur_candidates, cur_scores in GeneratorExecutor().run(
+            generators,
+            TeamName.Echo_F2023,
+            user_id, candidate_limit, offset, seed, starting_point
+        ):
            candidates += cur_candidates
            scores += cur_scores
         filtered_candidates = EchoFilter().filter_ids(
@@ -51,12 +52,7 @@ class EchoController(AbstractController):
             filtered_candidates,
             user_id,
             seed=seed,
-            scores={
-                content_id: {"score": score}
-                for content_id, score in zip(candidates, scores)
-            }
-            if scores is not None
-            else {},
+            scores=dict(zip(candidates, scores or [])),
         )
         rank = RandomRanker().rank_ids(limit, predictions, seed, starting_point)
         return rank
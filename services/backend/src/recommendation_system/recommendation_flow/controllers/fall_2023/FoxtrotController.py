@@ -19,6 +19,9 @@ from src.recommendation_system.recommendation_flow.candidate_generators.foxtrot.
 from src.recommendation_system.recommendation_flow.candidate_generators.ExampleGenerator import (
     ExampleGenerator,
 )
+from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import (
+    GeneratorExecutor,
+)
 
 from src.api.metrics.models import TeamName
 
@@ -35,11 +38,11 @@ class FoxtrotController(AbstractController):
             generators.append(CollaberativeFilteredSimilarUsersGenerator)
         if starting_point.get("yourChoice", False):
             generators.append(ExampleGenerator)
-        for gen in generators:
-           cur_candidates, cur_scores = gen().get_content_ids(
-               TeamName.Foxtrot_F2023,
-               user_id, candidate_limit, offset, seed, starting_point
-           )
+        for cur_candidates, cur_scores in GeneratorExecutor().run(
+            generators,
+            TeamName.Foxtrot_F2023,
+            user_id, candidate_limit, offset, seed, starting_point
+        ):
            candidates += cur_candidates
            scores += cur_scores if cur_scores else [0] * len(cur_candidates)
         filtered_candidates = FoxtrotFilter().filter_ids(
@@ -53,12 +56,7 @@ class FoxtrotController(AbstractController):
             filtered_candidates,
             user_id,
             seed=seed,
-            scores={
-                content_id: {"score": score}
-                for content_id, score in zip(candidates, scores)
-            }
-            if scores is not None
-            else {},
+            scores=dict(zip(candidates, scores or [])),
         )
         rank = RandomRanker().rank_ids(limit, predictions, seed, starting_point)
         return rank
@@ -4,10 +4,12 @@ import traceback
 
 from src.api.metrics.models import MetricFunnelType, MetricType
 from src.api.metrics.crud import add_metric
+from src.api.metrics.tracing import span
 
 class AbstractFilter:
     def filter_ids(self, team_name, user_id, content_ids, seed, starting_point):
-        response = self._filter_ids(user_id, content_ids, seed, starting_point)
+        with span(f"filter-{self._get_name()}", MetricFunnelType.Filtering):
+            response = self._filter_ids(user_id, content_ids, seed, starting_point)
         try:
             add_metric(
                 request_id=request.request_id,
@@ -1,5 +1,8 @@
 from src.recommendation_system.recommendation_flow.filtering.AbstractFilter import AbstractFilter
-from src.recommendation_system.recommendation_flow.filtering.linear_model_helper import DataCollector
+from src.recommendation_system.recommendation_flow.filtering.linear_model_helper import (
+    DataCollector,
+    per_content_id_policy,
+)
 import random
 
 class DataCollectorAlpha(DataCollector):
@@ -71,50 +74,46 @@ class DataCollectorAlpha(DataCollector):
             'num_inference_steps_other': -44.57077873559393
         }
 
-    def policy_filter_one(self, training_data, content_id):
+    def policy_filter_one_batch(self, training_data, content_ids):
         """
         Filtering on Likes: only keeping images with a 'decent' number of likes (or over a small negative number, say -1)
         """
-        try:
-            if training_data[training_data.content_id == content_id].content_engagement_time_avg.mean() > 1e3:
-                # making sure people saw the img, say at least 1s
-                like_value = training_data[training_data.content_id == content_id].content_likes.iloc[0]
-                dislike_value = training_data[training_data.content_id == content_id].content_dislikes.iloc[0]
-                diff = like_value - dislike_value
-                # only keep first line since we only care about the nb of likes
-                if diff > 0:
-                    return True
-                return False
-            else:
-                return True
-        except Exception as e:
-            print(f"got an an exception {e} in policy_filter_one for Alpha")
-            # if no like value, that means
-            return True
+        if 'content_id' not in training_data:
+            return set(content_ids)  # no engagements to go on, every content is kept
+        per_content = training_data.groupby('content_id').agg(
+            engagement_time_avg=('content_engagement_time_avg', 'mean'),
+            likes=('content_likes', 'first'),
+            dislikes=('content_dislikes', 'first'),
+        )
+        # making sure people saw the img, say at least 1s, then only keep it when liked more than disliked
+        dropped = per_content.index[
+            (per_content.engagement_time_avg > 1e3) & (per_content.likes - per_content.dislikes <= 0)
+        ]
+        return set(content_ids) - set(dropped)
 
-    def policy_filter_two(self, training_data, content_id):
+    def policy_filter_two_batch(self, training_data, content_ids):
         """ Checking if source is from the 'other' category;
         most of the movies pictures being in this category, we will return this type of image only x% of the time.
         The random package MUST be imported"""
-        try:
-            source = training_data[training_data.content_id == content_id].source.iloc[0]
-            if source not in [
-                    'human_prompts', 'r/Showerthoughts', 'r/EarthPorn', 'r/scifi', 'r/pics',
-                    'r/Damnthatsinteresting', 'r/MadeMeSmile', 'r/educationalgifs',
-                    'r/SimplePrompts'
-                ]:
-                random_number = random.random()
+        if 'content_id' not in training_data:
+            return set()  # without a source nothing is known to be 'other'
+        sources = training_data.groupby('content_id')['source'].first()
+        other_sources = sources[~sources.isin([
+            'human_prompts', 'r/Showerthoughts', 'r/EarthPorn', 'r/scifi', 'r/pics',
+            'r/Damnthatsinteresting', 'r/MadeMeSmile', 'r/educationalgifs',
+            'r/SimplePrompts'
+        ])].index
 
-                # threshold for selection
-                threshold = 0.90
+        # threshold for selection
+        threshold = 0.90
+        return set(
+            content_id
+            for content_id in content_ids
+            if content_id in other_sources and random.random() < threshold
+        )
 
-                # Check if the random number is less than the probability threshold
-                if random_number < threshold:
-                    return True
-            return False
-        except Exception as e:
-            print(f"got an an exception {e} in policy_filter_two for Alpha")
-            return False
+    policy_filter_one = per_content_id_policy(policy_filter_one_batch)
+    policy_filter_two = per_content_id_policy(policy_filter_two_batch)
 
 
 class AlphaFilter(AbstractFilter):
@@ -123,19 +122,11 @@ class AlphaFilter(AbstractFilter):
         dc.gather_data(user_id, content_ids)
         dc.feature_eng()
         if starting_point.get("policy_filter_one", False):
-            pf_one = set(
-                content_id
-                for content_id in content_ids
-                if dc.policy_filter_one(dc.results, content_id)
-            )
+            pf_one = dc.run_policy_filter(dc.policy_filter_one_batch, content_ids)
         else:
             pf_one = set(content_ids)
         if starting_point.get("policy_filter_two", False):
-            pf_two = set(
-                content_id
-                for content_id in content_ids
-                if dc.policy_filter_two(dc.results, content_id)
-            )
+            pf_two = dc.run_policy_filter(dc.policy_filter_two_batch, content_ids)
         else:
             pf_two = set(content_ids)
         if starting_point.get("linear_model", False) and user_id not in [0, None]:
@@ -61,10 +61,17 @@ class DataCollectorBeta(DataCollector):
         return pd.Series(result)
 
     def feature_generation_user(self):
-        aggregated_data = self.user_data.merge(self.generated_content_metadata_data, on=['content_id'], how='left').groupby('user_id').apply(lambda data: self.custom_aggregation('user', data))
-        if 'user_id' in aggregated_data:
-            aggregated_data = aggregated_data.drop('user_id', axis=1)
-        return aggregated_data.reset_index()
+        data = self.user_data.merge(self.generated_content_metadata_data, on=['content_id'], how='left')
+        # same columns as custom_aggregation('user', ...), per artist style / source like and dislike counts
+        artist_styles_categories = ['van_gogh', 'jean-michel_basquiat', 'detailed_portrait',
+                                    'kerry_james_marshall', 'medieval']
+        sources_categories = ['human_prompts', 'r/Showerthoughts', 'r/EarthPorn', 'r/scifi', 'r/pics']
+        extra_masks = {}
+        for artist_style in artist_styles_categories:
+            extra_masks[artist_style] = (data['artist_style'] == artist_style).values
+        for source in sources_categories:
+            extra_masks[source] = (data['source'] == source).values
+        return self.aggregate_engagements('user', data, 'user_id', extra_masks)
 
     def coefficients(self):
         return {
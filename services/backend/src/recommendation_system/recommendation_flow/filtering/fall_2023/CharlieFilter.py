@@ -10,7 +10,10 @@ Original file is located at
 """
 
 from src.recommendation_system.recommendation_flow.filtering.AbstractFilter import AbstractFilter
-from src.recommendation_system.recommendation_flow.filtering.linear_model_helper import DataCollector
+from src.recommendation_system.recommendation_flow.filtering.linear_model_helper import (
+    DataCollector,
+    per_content_id_policy,
+)
 
 
 # from sqlalchemy.sql.schema import ScalarElementColumnDefault
@@ -45,25 +48,30 @@ class DataCollectorCharlie(DataCollector):
   def threshold(self):
       return 1.19833
 
-  def policy_filter_one(self, training_data, content_id):
+  def policy_filter_one_batch(self, training_data, content_ids):
       desired_styles = ['human_prompts', 'r/EarthPorn', 'r/Showerthoughts']
-      artist_style = training_data[training_data['content_id'] == content_id]['artist_style'].values[0]
-      if artist_style in desired_styles:
-          return True
-      else:
-          return False
+      if 'content_id' not in training_data:
+          return set()  # no artist style is known to be desired
+      artist_styles = training_data.groupby('content_id')['artist_style'].first()
+      desired = set(artist_styles[artist_styles.isin(desired_styles)].index)
+      return set(content_id for content_id in content_ids if content_id in desired)
 
-  def policy_filter_two(self, training_data, content_id):
+  def policy_filter_two_batch(self, training_data, content_ids):
       net_likes_threshold = 4
-      training_data = training_data.merge(self.engagement_data[["content_id", "engagement_type", "engagement_value", ]],
-                                          on="content_id", how="left")
-      net_likes = \
-      training_data[(training_data['content_id'] == content_id) & (training_data["engagement_type"] == "Like")][
-          'engagement_value'].sum()
-      if net_likes >= net_likes_threshold:
-          return True
-      else:
-          return False
+      if 'content_id' not in training_data:
+          return set()  # no likes to count
+      # the same totals as summing over training_data merged with engagement_data on content_id,
+      # without building the merge: every results row of a content_id counts all of its likes
+      likes = self.engagement_data[self.engagement_data["engagement_type"] == "Like"]
+      net_likes = (
+          training_data.groupby('content_id').size()
+          * likes.groupby('content_id')['engagement_value'].sum()
+      ).fillna(0)
+      passing = set(net_likes[net_likes >= net_likes_threshold].index)
+      return set(content_id for content_id in content_ids if content_id in passing)
+
+  policy_filter_one = per_content_id_policy(policy_filter_one_batch)
+  policy_filter_two = per_content_id_policy(policy_filter_two_batch)
 
 class CharlieFilter(AbstractFilter):
     def _filter_ids(self, user_id, content_ids, seed, starting_point):
@@ -71,19 +79,11 @@ class CharlieFilter(AbstractFilter):
         dc.gather_data(user_id, content_ids)
         dc.feature_eng()
         if starting_point.get("policy_filter_one", False):
-            pf_one = set(
-                content_id
-                for content_id in content_ids
-                if dc.policy_filter_one(dc.results, content_id)
-            )
+            pf_one = dc.run_policy_filter(dc.policy_filter_one_batch, content_ids)
         else:
             pf_one = set(content_ids)
         if starting_point.get("policy_filter_two", False):
-            pf_two = set(
-                content_id
-                for content_id in content_ids
-                if dc.policy_filter_two(dc.results, content_id)
-            )
+            pf_two = dc.run_policy_filter(dc.policy_filter_two_batch, content_ids)
         else:
             pf_two = set(content_ids)
         if starting_point.get("linear_model", False) and user_id not in [0, None]:
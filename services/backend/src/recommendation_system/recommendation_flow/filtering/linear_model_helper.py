@@ -1,15 +1,17 @@
 from src import db
 import pandas as pd
 import copy
-from sqlalchemy import text, func, over, and_, cast, String
+from sqlalchemy import text, func, over, and_, cast, select, true, String
 from sqlalchemy.sql import alias
 from sqlalchemy.sql.expression import bindparam
 from src.api.content.models import Content, GeneratedContentMetadata
 from src.api.engagement.models import Engagement
+from src.api.engagement.stats import get_content_engagement_stats
+from src.api.metrics.models import MetricFunnelType
+from src.api.metrics.tracing import span
 from flask import current_app
 import traceback
 from typing import List
-from sklearn.preprocessing import OneHotEncoder
 import numpy as np
 
 
@@ -42,6 +44,39 @@ def fetch_engagement_data(_filter, n_rows_per_content):
         return None
 
 
+def fetch_engagement_sample(content_ids, n_rows_per_content):
+    """
+    The first n_rows_per_content engagements (by id) of each content_id, as fetch_engagement_data
+    returns them. A LATERAL subquery per content stops after n_rows_per_content entries of the
+    content_id index, where ROW_NUMBER() OVER (PARTITION BY content_id) reads and sorts every
+    engagement of every candidate
+    """
+    candidates = db.session.query(Content.id).filter(Content.id.in_(content_ids)).subquery()
+    sample = (
+        select(
+            Engagement.content_id,
+            Engagement.user_id,
+            cast(Engagement.engagement_type, String).label('engagement_type'),
+            Engagement.engagement_value,
+        )
+        .where(Engagement.content_id == candidates.c.id)
+        .order_by(Engagement.id)
+        .limit(n_rows_per_content)
+        .lateral()
+    )
+    try:
+        df = pd.DataFrame(
+            db.session.query(sample).select_from(candidates).join(sample, true()).all(),
+            columns=['content_id', 'user_id', 'engagement_type', 'engagement_value']
+        )
+        df['row_num'] = df.groupby('content_id').cumcount() + 1
+        return df
+    except Exception as e:
+        print(f"Error fetching engagement data: {e}")
+        print(traceback.format_exc())
+        return None
+
+
 def fetch_generated_content_metadata_data(content_ids):
     try:
         return pd.DataFrame(
@@ -68,6 +103,16 @@ def fetch_generated_content_metadata_data(content_ids):
         return None
 
 
+def per_content_id_policy(batch_policy):
+    """
+    Adapter giving a batch policy, (training_data, content_ids) -> surviving content_ids,
+    the per content_id signature, (training_data, content_id) -> bool
+    """
+    def policy(self, training_data, content_id):
+        return content_id in set(batch_policy(self, training_data, [content_id]))
+    return policy
+
+
 class DataCollector:
     def artist_styles_one_hot(self):
         raise NotImplementedError(
@@ -102,32 +147,67 @@ class DataCollector:
         }
         return pd.Series(result)
 
-    def feature_generation_user(self):
-        # Use `groupby` without including 'user_id' in the Series returned by `custom_aggregation`
-        aggregated_data = self.user_data.groupby('user_id').apply(lambda data: self.custom_aggregation('user', data))
-
-        # Drop the 'user_id' level from the index if it's there to avoid conflicts when resetting the index
-        if 'user_id' in aggregated_data:
-            aggregated_data = aggregated_data.drop('user_id', axis=1)
+    def aggregate_engagements(self, prefix, data, key, extra_masks=None):
+        """
+        Vectorized custom_aggregation for every `key` group at once: likes, dislikes and
+        average engagement time as masked grouped sums/means, plus one masked like and
+        dislike count per entry of extra_masks ({name: boolean mask over data})
+        """
+        is_like = (data['engagement_type'] == 'Like').values
+        like = is_like & (data['engagement_value'] == 1).values
+        dislike = is_like & (data['engagement_value'] == -1).values
+        columns = {
+            key: data[key].values,
+            f'{prefix}_likes': like.astype(np.int64),
+            f'{prefix}_dislikes': dislike.astype(np.int64),
+            f'{prefix}_engagement_time_avg': data['engagement_value'].where(
+                data['engagement_type'] == 'MillisecondsEngagedWith'
+            ).values.astype(np.float64),
+        }
+        for name, mask in (extra_masks or {}).items():
+            mask = np.asarray(mask, dtype=bool)
+            columns[f'{prefix}_{name}_likes'] = (like & mask).astype(np.int64)
+            columns[f'{prefix}_{name}_dislikes'] = (dislike & mask).astype(np.int64)
+        grouped = pd.DataFrame(columns).groupby(key)
+        aggregated = grouped.sum()
+        aggregated[f'{prefix}_engagement_time_avg'] = grouped[f'{prefix}_engagement_time_avg'].mean()
+        return aggregated.astype(np.float64).reset_index()
 
-        # Reset the index after ensuring 'user_id' is not in the columns
-        return aggregated_data.reset_index()
+    def feature_generation_user(self):
+        return self.aggregate_engagements('user', self.user_data, 'user_id')
+
+    def one_hot_encode(self, values, categories, col_name):
+        # same columns as a OneHotEncoder fit on categories + ['other'], anything unknown is 'other'
+        all_categories = list(categories) + ['other']
+        codes = pd.Categorical(
+            values.where(values.isin(categories), 'other'), categories=all_categories
+        ).codes
+        return pd.DataFrame(
+            np.eye(len(all_categories))[codes],
+            columns=[f'{col_name}_{category}' for category in all_categories],
+            index=values.index,
+        )
 
     def feature_generation_content_one_hot_encoding(self):
         for (categories, _coefficient), col_name in self.one_hot_encoding_functions():
-            transformed_col = self.generated_content_metadata_data[col_name].apply(
-                lambda x: x if x in categories else 'other').to_frame()
-            encoder = OneHotEncoder(categories=[categories + ['other']], sparse=False)
-            encoded_data = encoder.fit_transform(transformed_col)
-            encoded_df = pd.DataFrame(encoded_data, columns=encoder.get_feature_names_out([col_name]))
+            encoded_df = self.one_hot_encode(self.generated_content_metadata_data[col_name], categories, col_name)
             for col in encoded_df.columns:
                 self.generated_content_metadata_data[col] = encoded_df[col]
         return self.generated_content_metadata_data
 
     def feature_generation_content_engagement_value(self):
-        return self.engagement_data.groupby('content_id').apply(
-            lambda data: self.custom_aggregation('content', data)
-        ).reset_index()
+        content_stats = getattr(self, 'content_stats', None)
+        if content_stats is None:
+            # training data, aggregate the engagement rows
+            return self.aggregate_engagements('content', self.engagement_data, 'content_id')
+        # totals over every engagement of the content, from content_engagement_stats
+        engagement_time_count = content_stats['engagement_time_count'].replace(0, np.nan)
+        return pd.DataFrame({
+            'content_id': content_stats.index.values,
+            'content_likes': content_stats['likes'].values.astype(np.float64),
+            'content_dislikes': content_stats['dislikes'].values.astype(np.float64),
+            'content_engagement_time_avg': (content_stats['engagement_time_sum'] / engagement_time_count).values,
+        })
 
     def feature_generation(self):
         self.feature_generation_user()
@@ -135,8 +215,8 @@ class DataCollector:
         self.feature_generation_content_engagement_value()
 
     def get_engagement_data(self, content_ids):
-        return fetch_engagement_data(
-            Engagement.content_id.in_(content_ids),
+        return fetch_engagement_sample(
+            content_ids,
             3
         )
 
@@ -151,10 +231,15 @@ class DataCollector:
             3
         )
 
+    def get_content_stats(self, content_ids):
+        return get_content_engagement_stats(content_ids)
+
     def gather_data(self, user_id, content_ids):
-        self.engagement_data = self.get_engagement_data(content_ids)
-        self.generated_content_metadata_data = self.get_generated_content_metadata_data(content_ids)
-        self.user_data = self.get_user_data(user_id)
+        with span("fetch", MetricFunnelType.Filtering):
+            self.engagement_data = self.get_engagement_data(content_ids)
+            self.content_stats = self.get_content_stats(content_ids)
+            self.generated_content_metadata_data = self.get_generated_content_metadata_data(content_ids)
+            self.user_data = self.get_user_data(user_id)
 
     def gather_training_data(self):
         self.engagement_data = pd.read_csv('sample_data/engagement.csv', sep="\t")
@@ -166,6 +251,10 @@ class DataCollector:
         return self.training_results
 
     def feature_eng(self):
+        with span("features", MetricFunnelType.Filtering):
+            return self._feature_eng()
+
+    def _feature_eng(self):
         user_attr = self.feature_generation_user()
         if len(user_attr) == 0:
             self.results = pd.DataFrame()
@@ -198,6 +287,10 @@ class DataCollector:
     def threshold(self):
         raise NotImplementedError("you need to implement")
 
+    def run_policy_filter(self, batch_policy, content_ids):
+        # a batch policy sees all of self.results once instead of being called per content_id
+        return set(batch_policy(self.results, content_ids))
+
     def coefficients(self):
         return {
             'content_likes': 0.0,
@@ -210,6 +303,10 @@ class DataCollector:
         }
 
     def run_linear_model(self):
+        with span("linear-model", MetricFunnelType.Filtering):
+            return self._run_linear_model()
+
+    def _run_linear_model(self):
         coeffs = self.coefficients()
         for (categories, _coefficients), col_name in self.one_hot_encoding_functions():
             for category, coefficient in zip(categories + ['other'], _coefficients):
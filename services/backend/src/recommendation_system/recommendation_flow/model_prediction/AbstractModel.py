@@ -1,3 +1,18 @@
+import numpy as np
+from src.api.metrics.models import MetricFunnelType
+from src.api.metrics.tracing import span
+
+
 class AbstractModel:
     def predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
-        pass
+        """
+        A CandidateBatch of content_ids with their p_engage, scores is the generator's
+        {content_id: score}
+        """
+        if not isinstance(content_ids, (list, tuple, np.ndarray)):
+            content_ids = list(content_ids)  # the filters return sets, the models index and len() them
+        with span(f"model-{type(self).__name__}", MetricFunnelType.Prediction):
+            return self._predict_probabilities(content_ids, user_id, seed=seed, **kwargs)
+
+    def _predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
+        raise NotImplementedError("you need to implement")
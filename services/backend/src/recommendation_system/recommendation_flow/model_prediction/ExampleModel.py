@@ -1,40 +1,14 @@
-import random
-from src import db
-from sqlalchemy.sql import text
+import numpy as np
+from src.data_structures.artist_style_lookup import ArtistStyleLookup, UserStyleCache
+from src.recommendation_system.recommendation_flow.candidate_batch import CandidateBatch
 
 from .AbstractModel import AbstractModel
 
 
 class ExampleModel(AbstractModel):
-    def predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
-        get_styles_for_content_ids = text(f"""
-            SELECT content_id, artist_style 
-            from generated_content_metadata 
-            where content_id in ({','.join(map(str, content_ids))})
-        """)
-        get_styles_user_has_engaged_with = text(f"""
-            select DISTINCT artist_style 
-            from engagement 
-            inner join generated_content_metadata 
-                using (content_id) 
-                where user_id = {user_id};
-        """)
-        with db.engine.connect() as con:
-            styles_for_content_ids = list(con.execute(get_styles_for_content_ids))
-            content_id_to_style_map = {}
-            for (content_id, artist_style) in styles_for_content_ids:
-                content_id_to_style_map[content_id] = artist_style
-
-            results = con.execute(get_styles_user_has_engaged_with)
-            styles_user_has_engaged_with = set(map(lambda x: x[0], results))
-
-        return list(
-            map(
-                lambda content_id: {
-                    "content_id": content_id,
-                    "p_engage": float(content_id_to_style_map[content_id] in styles_user_has_engaged_with),
-                    "score": kwargs.get("scores", {}).get(content_id, {}).get("score", None),
-                },
-                content_ids,
-            )
-        )
+    def _predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
+        # 1 when the user engaged with content of the same artist style before
+        style_codes = ArtistStyleLookup().codes(content_ids)
+        styles_user_has_engaged_with = np.fromiter(UserStyleCache().get(user_id), dtype=np.int32)
+        p_engage = np.isin(style_codes, styles_user_has_engaged_with).astype(np.float64)
+        return CandidateBatch.from_candidates(content_ids, p_engage, kwargs.get("scores"))
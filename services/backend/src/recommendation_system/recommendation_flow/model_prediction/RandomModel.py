@@ -1,19 +1,15 @@
 import random
 
+import numpy as np
+from src.recommendation_system.recommendation_flow.candidate_batch import CandidateBatch
+
 from .AbstractModel import AbstractModel
 
 
 class RandomModel(AbstractModel):
-    def predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
-        if seed:
-            random.seed(seed)
-        return list(
-            map(
-                lambda content_id: {
-                    "content_id": content_id,
-                    "p_engage": random.random(),
-                    "score": kwargs.get("scores", {}).get(content_id, {}).get("score", None),
-                },
-                content_ids,
-            )
+    def _predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
+        # seeds are floats, so they're spread into a 64 bit numpy seed the way random.seed would
+        rng = np.random.default_rng(random.Random(seed).getrandbits(64) if seed else None)
+        return CandidateBatch.from_candidates(
+            content_ids, rng.random(len(content_ids)), kwargs.get("scores"),
         )
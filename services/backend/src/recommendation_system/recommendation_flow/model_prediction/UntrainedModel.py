@@ -1,5 +1,6 @@
 import numpy as np
 import tensorflow as tf
+from src.recommendation_system.recommendation_flow.candidate_batch import CandidateBatch
 from src.recommendation_system.ml_models.untrained_model.not_training import (
     ModelController,
 )
@@ -24,18 +25,8 @@ class UntrainedModel(AbstractModel):
             )
         ).reshape((len(content_ids), 2))
 
-    def predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
+    def _predict_probabilities(self, content_ids, user_id, seed=None, **kwargs):
         predictions = model(self._create_all_data(content_ids, user_id)).numpy()
         predictions = tf.nn.softmax(predictions).numpy()
-        return list(
-            map(
-                lambda i: {
-                    "content_id": content_ids[i],
-                    "p_engage": predictions[i][
-                        0
-                    ],  # hard coding that first output is p(Engage | data)
-                    "score": kwargs.get("score", None),
-                },
-                range(len(content_ids)),
-            )
-        )
+        # hard coding that first output is p(Engage | data)
+        return CandidateBatch.from_candidates(content_ids, predictions[:, 0], kwargs.get("scores"))
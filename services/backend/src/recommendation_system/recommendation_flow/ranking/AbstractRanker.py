@@ -1,3 +1,15 @@
+from src.api.metrics.models import MetricFunnelType
+from src.api.metrics.tracing import span
+
+
 class AbstractRanker:
     def rank_ids(self, limit, probabilities, seed, starting_point):
-        pass
+        """
+        The content_ids to serve, probabilities is a model's CandidateBatch (or the old
+        list of prediction dicts)
+        """
+        with span(f"ranker-{type(self).__name__}", MetricFunnelType.Ranking):
+            return self._rank_ids(limit, probabilities, seed, starting_point)
+
+    def _rank_ids(self, limit, probabilities, seed, starting_point):
+        raise NotImplementedError("you need to implement")
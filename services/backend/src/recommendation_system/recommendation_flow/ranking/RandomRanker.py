@@ -1,14 +1,14 @@
-import heapq
 import random
 
+from src.recommendation_system.recommendation_flow.candidate_batch import CandidateBatch
+
 from .AbstractRanker import AbstractRanker
 
 
 class RandomRanker(AbstractRanker):
-    def rank_ids(self, limit, probabilities, seed, starting_point):
-        k = limit
-        top_k = heapq.nlargest(k, probabilities, key=lambda x: x["p_engage"])
-        top_k_ids = list(map(lambda x: x["content_id"], top_k))
+    def _rank_ids(self, limit, probabilities, seed, starting_point):
+        batch = CandidateBatch.coerce(probabilities)
+        top_k_ids = batch.content_ids[batch.top_k(limit)].tolist()
         if seed:
             random.seed(seed)
         return random.sample(top_k_ids, len(top_k_ids))  # shuffle
@@ -2,11 +2,13 @@ from enum import Enum
 import time
 import random
 from src import db
-from flask import request
+from flask import current_app, request
 import traceback
 
 from src.api.content.models import Content, get_url
 from src.api.users.models import User
+from src.data_structures.candidate_pool_cache import CandidatePoolCache
+from src.data_structures.feed_cursor import current_cursor
 from src.recommendation_system.recommendation_flow.controllers import (
     RandomController,
     ExampleController,
@@ -23,6 +25,7 @@ from src.recommendation_system.recommendation_flow.controllers import (
 
 from src.api.metrics.models import MetricFunnelType, MetricType, TeamName
 from src.api.metrics.crud import add_metric
+from src.api.metrics.tracing import set_trace_owner, span
 
 
 class ControllerEnum(Enum):
@@ -100,8 +103,36 @@ def add_metric_time_took(team_name, user_id, val, limit, offset, seed, starting_
     )
 
 
+def get_ranked_content_ids(controller, user_id, limit, offset, seed, starting_point):
+    """
+    A page of the controller's ranking, sliced from the session's candidate pool when the
+    page falls within CANDIDATE_POOL_SIZE, the pipeline runs for the whole pool on a miss.
+    Cursor pages already cost the same at any depth and go to the controller directly, so
+    do pages past the end of a pool the pipeline returned short of CANDIDATE_POOL_SIZE
+    """
+    pool_size = current_app.config.get("CANDIDATE_POOL_SIZE")
+    if not pool_size or offset + limit > pool_size or current_cursor() is not None:
+        return controller.value().get_content_ids(
+            user_id, limit, offset, seed, starting_point
+        )
+    pools = CandidatePoolCache()
+    key = pools.key(user_id, controller, seed, starting_point)
+    pool = pools.get(key)
+    if pool is None:
+        pool = controller.value().get_content_ids(
+            user_id, pool_size, 0, seed, starting_point
+        )
+        pools.put(key, pool)
+    if offset + limit > len(pool):
+        return controller.value().get_content_ids(
+            user_id, limit, offset, seed, starting_point
+        )
+    return list(pool[offset:offset + limit])
+
+
 def get_content_data(controller, user_id, limit, offset, seed, starting_point):
     start = time.time()
+    set_trace_owner(ControllerEnum.controller_to_team_name(controller), user_id)
 
     if False: # controller == ControllerEnum.ENGAGEMENT_ASSIGNMENT:
         content_ids, new_controller = controller.value().get_content_ids(
@@ -109,9 +140,10 @@ def get_content_data(controller, user_id, limit, offset, seed, starting_point):
         )
         controller = ControllerEnum.controller_to_string(new_controller)
     else:
-        content_ids = controller.value().get_content_ids(
-            user_id, limit, offset, seed, starting_point
-        )
+        with span("pipeline"):
+            content_ids = get_ranked_content_ids(
+                controller, user_id, limit, offset, seed, starting_point
+            )
     try:
         add_metric_time_took(ControllerEnum.controller_to_team_name(controller), 
                              user_id, int(1000 * (time.time() - start)), 
@@ -120,6 +152,7 @@ def get_content_data(controller, user_id, limit, offset, seed, starting_point):
         db.session.rollback()
         print(f"exception trying to add_metric_time_took {e}")
         print(traceback.format_exc())
-    all_content = Content.query.filter(Content.id.in_(content_ids)).all()
-    responses = map(content_to_response, all_content)
+    with span("hydrate"):
+        all_content = Content.query.filter(Content.id.in_(content_ids)).all()
+        responses = list(map(content_to_response, all_content))
     return list(map(lambda x: {**x, "controller": controller.human_string()}, responses))
@@ -1,12 +1,18 @@
+import os
+
 import pytest
+import src.api  # noqa: F401, imports the recommendation flow in the same order as the app does
 from src import create_app, db
 from src.api.users.models import User
 
+# create_app starts the background threads from the config it loads, so every app the tests
+# create has to load TestingConfig, not the APP_SETTINGS of the container they run in
+os.environ["APP_SETTINGS"] = "src.config.TestingConfig"
+
 
 @pytest.fixture(scope="module")
 def test_app():
     app = create_app()
-    app.config.from_object("src.config.TestingConfig")
     with app.app_context():
         yield app  # testing happens here
 
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+import src.data_structures.approximate_nearest_neighbor.two_tower_ann as two_tower_ann
+from src import db
+from src.api.content.models import Content, GeneratedContentMetadata, MediaType, ModelType
+from src.api.engagement.models import Engagement, EngagementType
+from src.api.metrics.models import MetricType, TeamName
+
+
+class Wrapper:
+    # one embedding per distinct content_id, in content_id order, like the teams' wrappers
+    def generate_content_embeddings(self, df):
+        content_ids = np.sort(df["content_id"].unique())
+        return np.stack([content_ids, np.zeros(len(content_ids))], axis=1).astype(np.float32)
+
+
+def _content(content_ids):
+    return pd.DataFrame({"content_id": content_ids})
+
+
+def test_rebuild_publishes_a_new_bundle_and_leaves_the_old_one_intact(test_app, monkeypatch):
+    metrics = []
+    content = {"count": 200, "max_id": 200}
+    frames = [_content(np.arange(1, 201)), _content(np.arange(101, 301))]
+    engagement_marks = [1000, 1500]
+    engaged_after = []
+    monkeypatch.setitem(test_app.config, "ANN_VECTOR_QUANTIZATION", "int8")
+    monkeypatch.setattr(two_tower_ann, "BUNDLES", {})
+    monkeypatch.setattr(two_tower_ann, "team_wrappers", {"beta": Wrapper()})
+    monkeypatch.setattr(two_tower_ann, "engaged_content_fingerprint", lambda: dict(content))
+    monkeypatch.setattr(two_tower_ann, "latest_engagement_id", lambda: engagement_marks.pop(0))
+    monkeypatch.setattr(
+        two_tower_ann, "fetch_ann_content_data", lambda after=None: engaged_after.append(after) or frames.pop(0)
+    )
+    monkeypatch.setattr(two_tower_ann, "add_metric", lambda **metric: metrics.append(metric))
+
+    assert two_tower_ann.rebuild_index("beta").generation == 1
+    first = two_tower_ann.BUNDLES["beta"]
+    recommendations = two_tower_ann.get_ANN_recommednations(np.array([[150, 0]], dtype=np.float32), "beta", 3)
+    assert recommendations[0] == [150, 149, 151]
+    assert two_tower_ann.rebuild_index("beta") is None  # content didn't change
+
+    content.update(count=300, max_id=300)
+    second = two_tower_ann.rebuild_index("beta")
+    assert two_tower_ann.BUNDLES["beta"] is second and second.generation == 2
+    assert engaged_after == [None, 1000]  # the second build took in everything engaged with after the first
+    assert two_tower_ann.get_ANN_recommednations(np.array([[290, 0]], dtype=np.float32), "beta", 1)[0] == [290]
+    # a query still holding the first bundle sees its own index and mapping
+    assert first.index_to_content_id[first.index.ann(np.array([290, 0], dtype=np.float32), k=1)[0]] == 200
+    assert first.content_id_to_index[200] == 199 and 290 not in first.content_id_to_index
+
+    assert [metric["metric_type"] for metric in metrics] == [MetricType.TimeTakenMS] * 2
+    assert metrics[1]["team_name"] == TeamName.Beta_F2023 and metrics[1]["funnel_name"] == "ann-rebuild"
+    assert metrics[1]["metric_metadata"]["rows"] == 200 and metrics[1]["metric_metadata"]["index_bytes"] > 0
+
+
+def test_content_engaged_with_for_the_first_time_is_picked_up_by_the_next_rebuild(
+    test_app, test_database, add_user, monkeypatch
+):
+    user = add_user("ann_refresh_user", "password")
+    for content_id in (601, 602, 603):
+        db.session.add(Content(id=content_id, media_type=MediaType.Image))
+        db.session.add(GeneratedContentMetadata(
+            content_id=content_id, model=ModelType.StableDiffusion, model_version="1.5"
+        ))
+    db.session.commit()
+
+    def engage(content_id):
+        db.session.add(
+            Engagement(user_id=user.id, content_id=content_id, engagement_type=EngagementType.Like, engagement_value=1)
+        )
+        db.session.commit()
+
+    engage(602)
+    engage(603)
+    content = two_tower_ann.engaged_content_fingerprint()
+    assert content == {"count": 2, "max_id": 603}
+    engagement_mark = two_tower_ann.latest_engagement_id()
+
+    engage(602)  # more engagements with content already counted don't change it
+    assert two_tower_ann.engaged_content_fingerprint() == content
+
+    # 601 only becomes part of the index source now, under an id below the largest one already in it
+    engage(601)
+    assert two_tower_ann.engaged_content_fingerprint() == {"count": 3, "max_id": 603}
+
+    monkeypatch.setitem(test_app.config, "NUMBER_OF_CONTENT_IN_ANN", 0)  # only the content engaged with since
+    monkeypatch.setattr(two_tower_ann, "INGESTION_LOOKBACK_IDS", 0)
+    monkeypatch.setattr(two_tower_ann, "to_dataframe", pd.DataFrame)
+    df = two_tower_ann.fetch_ann_content_data(engagement_mark)
+    # every engagement of the content engaged with after the mark, 603 wasn't
+    assert df["content_id"].tolist() == [601, 602, 602]
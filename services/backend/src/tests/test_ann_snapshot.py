@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.data_structures.approximate_nearest_neighbor.two_tower_ann as two_tower_ann
+
+
+class Wrapper:
+    # one embedding per distinct content_id, in content_id order, like the teams' wrappers
+    content_transformer = {"fit_on": "the index rows"}
+
+    def generate_content_embeddings(self, df):
+        content_ids = np.sort(df["content_id"].unique())
+        return np.stack([content_ids, np.ones(len(content_ids))], axis=1).astype(np.float32)
+
+
+def test_bundle_is_saved_and_reloaded_until_its_fingerprint_changes(test_app, monkeypatch, tmp_path):
+    monkeypatch.setitem(test_app.config, "ANN_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setitem(test_app.config, "ANN_VECTOR_QUANTIZATION", "int8")
+    monkeypatch.setattr(two_tower_ann, "BUNDLES", {})
+    monkeypatch.setattr(two_tower_ann, "team_wrappers", {"beta": Wrapper()})
+    fetched = []
+
+    def fetch_df():
+        # engagements of content 300 down to 101, several rows per content
+        fetched.append(True)
+        return pd.DataFrame({"content_id": np.repeat(np.arange(300, 100, -1), 2)})
+
+    content = {"count": 200, "max_id": 300}
+    built = two_tower_ann.make_bundle("beta", content, fetch_df)
+    assert built.source == "build" and built.index_to_content_id.tolist() == list(range(101, 301))
+    # the quantized index reranks from the saved rows, not the matrix the wrapper returned
+    assert isinstance(built.embeddings, np.memmap) and built.index.data is built.embeddings
+
+    # the next boot, its wrapper takes the fitted content_transformer from the snapshot
+    two_tower_ann.team_wrappers["beta"] = Wrapper()
+    two_tower_ann.team_wrappers["beta"].content_transformer = None
+    loaded = two_tower_ann.make_bundle("beta", content, fetch_df)
+    assert loaded.source == "snapshot" and len(fetched) == 1
+    assert isinstance(loaded.embeddings, np.memmap)
+    np.testing.assert_array_equal(loaded.embeddings, built.embeddings)
+    assert loaded.index_to_content_id.tolist() == built.index_to_content_id.tolist()
+    assert loaded.content_id_to_index[150] == built.content_id_to_index[150] == 49
+    query = np.array([150, 1], dtype=np.float32)
+    assert loaded.index.ann(query, k=3).tolist() == built.index.ann(query, k=3).tolist()
+    assert two_tower_ann.team_wrappers["beta"].content_transformer == Wrapper.content_transformer
+
+    # new content changes the fingerprint, the snapshot is rebuilt
+    rebuilt = two_tower_ann.make_bundle("beta", {"count": 201, "max_id": 301}, fetch_df)
+    assert rebuilt.source == "build" and len(fetched) == 2
+
+
+def test_build_rejects_embeddings_that_dont_match_the_content(test_app, monkeypatch):
+    class ShortWrapper(Wrapper):
+        def generate_content_embeddings(self, df):
+            return super().generate_content_embeddings(df)[1:]
+
+    monkeypatch.setitem(test_app.config, "ANN_VECTOR_QUANTIZATION", "int8")
+    monkeypatch.setattr(two_tower_ann, "team_wrappers", {"beta": ShortWrapper()})
+    with pytest.raises(ValueError, match="199 content embeddings for 200 content"):
+        two_tower_ann.build_index("beta", pd.DataFrame({"content_id": np.arange(101, 301)}))
+
+
+def test_a_snapshot_that_cant_be_written_keeps_the_built_bundle(test_app, monkeypatch, tmp_path):
+    not_a_directory = tmp_path / "snapshots"
+    not_a_directory.write_text("not a directory")  # makes every write under it fail
+    monkeypatch.setitem(test_app.config, "ANN_SNAPSHOT_DIR", str(not_a_directory))
+    monkeypatch.setitem(test_app.config, "ANN_VECTOR_QUANTIZATION", "int8")
+    monkeypatch.setattr(two_tower_ann, "BUNDLES", {})
+    monkeypatch.setattr(two_tower_ann, "team_wrappers", {"beta": Wrapper()})
+
+    bundle = two_tower_ann.make_bundle(
+        "beta", {"count": 200, "max_id": 300}, lambda: pd.DataFrame({"content_id": np.arange(101, 301)})
+    )
+    assert bundle.source == "build" and len(bundle) == 200
@@ -0,0 +1,31 @@
+import numpy as np
+
+import src.data_structures.approximate_nearest_neighbor as prompt_ann
+from src.data_structures.approximate_nearest_neighbor.prompt_embedding_store import PromptEmbeddingStore
+
+
+class ExactIndex:
+    def __init__(self, data):
+        self.data = data
+        self.queries = 0
+
+    def ann(self, q, k, return_distances=False):
+        self.queries += 1
+        distances = np.linalg.norm(q[:, None, :] - self.data[None, :, :], axis=2)
+        indices = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return indices, np.take_along_axis(distances, indices, axis=1)
+
+
+def test_ann_many_merges_every_query_in_one_index_call(test_app, monkeypatch):
+    data = np.array([[0, 0], [1, 0], [3, 0], [10, 0]], dtype=np.float32)
+    index = ExactIndex(data)
+    monkeypatch.setitem(test_app.config, "INSTANTIATE_PROMPT_ANN", True)
+    monkeypatch.setattr(prompt_ann, "read_data", lambda: data)
+    monkeypatch.setitem(prompt_ann.INDEXES, 0.9, index)
+    monkeypatch.setattr(PromptEmbeddingStore, "_instance", PromptEmbeddingStore.from_arrays(data, [10, 11, 12, 13]))
+
+    content_ids, scores = prompt_ann.ann_many([10, 12, 99], 0.9, k=2, offset=1, weights=[1, 2, 5], limit=3)
+    assert index.queries == 1
+    # 11 is 1 from 10 and 2 from 12 (weighted 4), kept once with its best score, 99 has no embedding
+    assert content_ids == [11, 12, 10]
+    assert scores == [1.0, 3.0, 6.0]
@@ -0,0 +1,46 @@
+from src import db
+from src.api.content.models import Content, GeneratedContentMetadata, MediaType, ModelType
+from src.api.engagement.crud import add_engagement, delete_engagement
+from src.api.engagement.models import EngagementType
+from src.data_structures.artist_style_lookup import ArtistStyleLookup, UserStyleCache
+from src.recommendation_system.recommendation_flow.model_prediction.ExampleModel import ExampleModel
+
+
+def _add_content(content_id, artist_style):
+    db.session.add(Content(id=content_id, media_type=MediaType.Image))
+    db.session.add(GeneratedContentMetadata(
+        content_id=content_id, artist_style=artist_style, model=ModelType.StableDiffusion, model_version="2.1",
+    ))
+    db.session.commit()
+
+
+def test_example_model_scores_by_cached_user_styles(test_app, test_database, add_user, monkeypatch):
+    monkeypatch.setattr(ArtistStyleLookup, "_instance", None)
+    monkeypatch.setattr(UserStyleCache, "_instance", None)
+    monkeypatch.setitem(test_app.config, "USER_STYLE_CACHE_SIZE", 10)
+    loads = []
+    load_after = ArtistStyleLookup._load_after
+
+    def counting_load_after(self, content_id):
+        loads.append(content_id)
+        return load_after(self, content_id)
+    monkeypatch.setattr(ArtistStyleLookup, "_load_after", counting_load_after)
+    user = add_user("style_user", "password")
+    for content_id, artist_style in [(201, "anime"), (202, "anime"), (203, "van_gogh"), (204, None)]:
+        _add_content(content_id, artist_style)
+    add_engagement(user.id, 201, EngagementType.Like, 1)
+
+    def p_engage(content_ids):
+        return ExampleModel().predict_probabilities(content_ids, user.id).p_engage.tolist()
+
+    assert p_engage([201, 202, 203, 204, 999]) == [1.0, 1.0, 0.0, 0.0, 0.0]
+    assert p_engage([202, 999]) == [1.0, 0.0]
+    assert loads == [0, 204]  # 999 has no metadata, it's only looked for once
+    # uploaded after the lookup loaded, picked up the first time it's a candidate
+    _add_content(1000, "van_gogh")
+    engagement = add_engagement(user.id, 1000, EngagementType.MillisecondsEngagedWith, 1000)
+    assert p_engage([202, 203, 1000]) == [1.0, 1.0, 1.0]
+    assert UserStyleCache().stats()["misses"] == 1  # the engagement updated the cached set, no requery
+
+    delete_engagement(engagement)
+    assert p_engage([202, 203]) == [1.0, 0.0]
@@ -0,0 +1,62 @@
+import heapq
+
+import numpy as np
+
+from src.recommendation_system.recommendation_flow.candidate_batch import CandidateBatch
+from src.recommendation_system.recommendation_flow.model_prediction.RandomModel import RandomModel
+from src.recommendation_system.recommendation_flow.ranking.RandomRanker import RandomRanker
+
+
+def test_top_k_matches_heapq_including_ties():
+    rng = np.random.default_rng(0)
+    content_ids = np.arange(100, 400)
+    p_engage = rng.integers(0, 3, len(content_ids)) / 2  # lots of ties, like ExampleModel's 0 or 1
+    batch = CandidateBatch(content_ids, p_engage)
+    for k in (0, 1, 7, 150, 300, 500):
+        expected = [
+            prediction["content_id"]
+            for prediction in heapq.nlargest(k, batch.to_dicts(), key=lambda x: x["p_engage"])
+        ]
+        assert batch.content_ids[batch.top_k(k)].tolist() == expected
+
+
+def test_dict_adapters_round_trip():
+    batch = CandidateBatch.from_candidates([3, 1, 2], [0.5, 0.1, 0.9], {3: 7.0, 2: {"score": 1.5}})
+    assert batch.to_dicts() == [
+        {"content_id": 3, "p_engage": 0.5, "score": 7.0},
+        {"content_id": 1, "p_engage": 0.1, "score": None},
+        {"content_id": 2, "p_engage": 0.9, "score": 1.5},
+    ]
+    assert CandidateBatch.from_dicts(batch.to_dicts()).to_dicts() == batch.to_dicts()
+
+
+def test_random_model_and_ranker_are_seeded():
+    content_ids = list(range(50))
+    predictions = RandomModel().predict_probabilities(content_ids, 1, seed=0.25)
+    again = RandomModel().predict_probabilities(content_ids, 1, seed=0.25)
+    assert np.array_equal(predictions.p_engage, again.p_engage)
+
+    ranked = RandomRanker().rank_ids(10, predictions, 0.25, None)
+    assert ranked == RandomRanker().rank_ids(10, predictions.to_dicts(), 0.25, None)
+    assert sorted(ranked) == sorted(predictions.content_ids[predictions.top_k(10)].tolist())
+
+
+def test_controller_ranks_the_set_its_filter_returns(test_app, test_database, monkeypatch):
+    from flask import request
+    from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import GeneratorExecutor
+    from src.recommendation_system.recommendation_flow.controllers.fall_2023.BetaController import BetaController
+    from src.recommendation_system.recommendation_flow.filtering.fall_2023.BetaFilter import BetaFilter
+
+    monkeypatch.setattr(GeneratorExecutor, "run", lambda self, *args: [([5, 6, 7, 8], [0.1, 0.2, 0.3, 0.4])])
+    monkeypatch.setattr(BetaFilter, "_filter_ids", lambda self, user_id, content_ids, seed, starting_point: {6, 8})
+    with test_app.test_request_context():
+        request.request_id = "request"
+        ranked = BetaController().get_content_ids(1, 10, 0, 0.25, {"twoTower": True})
+        assert sorted(ranked) == [6, 8]
+        inverse = BetaController().get_content_ids(1, 10, 0, 0.25, {"twoTower": True, "inverseFilter": True})
+        assert sorted(inverse) == [5, 7]
+    batch = CandidateBatch.from_candidates({3, 1}, [0.5, 0.5], {1: 2.0})
+    assert sorted(batch.to_dicts(), key=lambda x: x["content_id"]) == [
+        {"content_id": 1, "p_engage": 0.5, "score": 2.0},
+        {"content_id": 3, "p_engage": 0.5, "score": None},
+    ]
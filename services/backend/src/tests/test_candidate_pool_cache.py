@@ -0,0 +1,58 @@
+from src.data_structures.candidate_pool_cache import CandidatePoolCache
+from src.recommendation_system.recommendation_flow.retriever import get_ranked_content_ids
+
+
+class CountingController:
+    calls = []
+
+    def get_content_ids(self, user_id, limit, offset, seed, starting_point):
+        CountingController.calls.append((limit, offset))
+        return list(range(offset, offset + limit))
+
+
+class FakeControllerEnum:
+    value = CountingController
+
+    def human_string(self):
+        return "COUNTING"
+
+
+def test_pages_are_sliced_from_one_pipeline_run(test_app, monkeypatch):
+    monkeypatch.setitem(test_app.config, "CANDIDATE_POOL_SIZE", 30)
+    monkeypatch.setitem(test_app.config, "CANDIDATE_POOL_CACHE_SIZE", 10)
+    monkeypatch.setattr(CandidatePoolCache, "_instance", None)
+    CountingController.calls = []
+    controller = FakeControllerEnum()
+    with test_app.test_request_context():
+        pages = [get_ranked_content_ids(controller, 1, 10, offset, 0.5, {"twoTower": True}) for offset in (0, 10, 20)]
+        assert pages == [list(range(0, 10)), list(range(10, 20)), list(range(20, 30))]
+        assert CountingController.calls == [(30, 0)]
+
+        # a different session and a page past the pool both run the pipeline
+        get_ranked_content_ids(controller, 1, 10, 0, 0.7, {"twoTower": True})
+        assert get_ranked_content_ids(controller, 1, 10, 30, 0.5, {"twoTower": True}) == list(range(30, 40))
+        assert CountingController.calls == [(30, 0), (30, 0), (10, 30)]
+
+
+class ShortController(CountingController):
+    def get_content_ids(self, user_id, limit, offset, seed, starting_point):
+        CountingController.calls.append((limit, offset))
+        # the pipeline only finds 15 candidates at offset 0, deeper offsets page on
+        return list(range(offset, offset + min(limit, 15)))
+
+
+class FakeShortControllerEnum(FakeControllerEnum):
+    value = ShortController
+
+
+def test_pages_past_a_short_pool_go_to_the_controller(test_app, monkeypatch):
+    monkeypatch.setitem(test_app.config, "CANDIDATE_POOL_SIZE", 30)
+    monkeypatch.setitem(test_app.config, "CANDIDATE_POOL_CACHE_SIZE", 10)
+    monkeypatch.setattr(CandidatePoolCache, "_instance", None)
+    CountingController.calls = []
+    controller = FakeShortControllerEnum()
+    with test_app.test_request_context():
+        assert get_ranked_content_ids(controller, 1, 10, 0, 0.5, {"twoTower": True}) == list(range(0, 10))
+        assert get_ranked_content_ids(controller, 1, 10, 10, 0.5, {"twoTower": True}) == list(range(10, 20))
+        assert get_ranked_content_ids(controller, 1, 10, 20, 0.5, {"twoTower": True}) == list(range(20, 30))
+        assert CountingController.calls == [(30, 0), (10, 10), (10, 20)]
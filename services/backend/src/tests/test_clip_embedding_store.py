@@ -0,0 +1,33 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import src.recommendation_system.ml_models.beta.clip_embedding_store as clip_embedding_store
+from src.recommendation_system.ml_models.beta.clip_embedding_store import ClipEmbeddingStore
+
+
+def test_vectors_zero_fill_content_without_an_embedding():
+    store = ClipEmbeddingStore.from_arrays(np.array([[1, 2], [3, 4], [5, 6]], dtype=np.float16), [81576, 28619, 81576])
+    assert store.rows([28619, 81576, 7, 1]).tolist() == [1, 0, -1, -1]
+    vectors = store.vectors([7, 81576, 28619])
+    assert vectors.dtype == np.float32 and vectors.flags["C_CONTIGUOUS"]
+    assert vectors.tolist() == [[0, 0], [1, 2], [3, 4]]
+
+
+def test_large_stores_are_memory_mapped_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(clip_embedding_store, "legalize", lambda s: os.path.join(tmp_path, s))
+    monkeypatch.setattr(clip_embedding_store, "MEMMAP_MIN_BYTES", 0)
+    with open(tmp_path / "clip_embed.pkl", "wb") as f:
+        pickle.dump(np.array([[0.5, 1.0], [2.0, 3.0]], dtype=np.float16), f)
+    pd.DataFrame({"content_id": [112990, 81576], "group": ["r/EarthPorn"] * 2, "counter": [1, 2]}).to_csv(
+        tmp_path / "clip_lookup.csv", index=False
+    )
+
+    for _ in range(2):  # converted the first time, reopened from the cache the second
+        monkeypatch.setattr(ClipEmbeddingStore, "_instance", None)
+        store = ClipEmbeddingStore()
+        assert isinstance(store.embeddings, np.memmap)
+        assert store.vectors([81576, 112990]).tolist() == [[2.0, 3.0], [0.5, 1.0]]
+    assert (tmp_path / "clip_embed.f32.json").exists()
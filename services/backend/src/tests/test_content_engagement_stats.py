@@ -0,0 +1,46 @@
+from src import db
+from src.api.content.models import Content, MediaType
+from src.api.engagement.crud import (
+    add_engagement,
+    delete_engagement,
+    get_like_dislike_data_by_content_ids,
+    increment_engagement,
+    update_engagement,
+)
+from src.api.engagement.models import Engagement, EngagementType
+from src.api.engagement.stats import get_content_engagement_stats, rollup_content_engagement_stats
+
+
+def test_engagement_crud_keeps_content_stats_current(test_app, test_database, add_user):
+    users = [add_user(f"stats_user_{i}", "password") for i in range(3)]
+    db.session.add_all([Content(id=content_id, media_type=MediaType.Image) for content_id in (101, 102)])
+    db.session.commit()
+
+    add_engagement(users[0].id, 101, EngagementType.Like, 1)
+    dislike = add_engagement(users[1].id, 101, EngagementType.Like, -1)
+    add_engagement(users[2].id, 101, EngagementType.Like, 1)
+    update_engagement(dislike, 1)
+    elapsed = add_engagement(users[0].id, 101, EngagementType.MillisecondsEngagedWith, 1500)
+    increment_engagement(elapsed.id, 500)
+    add_engagement(users[1].id, 101, EngagementType.MillisecondsEngagedWith, 1000)
+    removed = add_engagement(users[0].id, 102, EngagementType.Like, -1)
+    delete_engagement(removed)
+
+    stats = get_content_engagement_stats([101, 102, 103])
+    assert stats.loc[101].tolist() == [3, 0, 3000, 2]
+    assert stats.loc[102].tolist() == [0, 0, 0, 0] and stats.loc[103].tolist() == [0, 0, 0, 0]
+    # the rollup recomputes the same totals from the engagement table, nothing drifted
+    assert rollup_content_engagement_stats() == 0
+    assert get_content_engagement_stats([101, 102]).values.tolist() == stats.loc[[101, 102]].values.tolist()
+
+    like_data = get_like_dislike_data_by_content_ids(users[1].id, [101, 102])
+    assert like_data[101] == {"total_likes": 3, "total_dislikes": 0, "user_engagement_value": 1}
+    assert like_data[102] == {"total_likes": 0, "total_dislikes": 0, "user_engagement_value": None}
+
+    # an engagement written outside the crud is corrected, only on its content
+    db.session.add(Engagement(
+        user_id=users[2].id, content_id=102, engagement_type=EngagementType.Like, engagement_value=-1,
+    ))
+    db.session.commit()
+    assert rollup_content_engagement_stats() == 1
+    assert get_content_engagement_stats([102]).loc[102].tolist() == [0, 1, 0, 0]
@@ -0,0 +1,67 @@
+import pandas as pd
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.recommendation_system.ml_models.content_feature_transformer import ContentFeatureTransformer
+
+
+def _content_df():
+    return pd.DataFrame(
+        {
+            "content_id": [1, 2, 3, 4, 5, 6],
+            "artist_style": ["a", "a", "b", "c", "a", "b"],
+            "source": ["x", "y", "x", "x", "z", "y"],
+            "seed": [7, 7, 8, 9, 7, 8],
+            "model_version": ["1.4", "1.4", "1.5", "1.4", "1.4", "1.5"],
+            "guidance_scale": [7, 9, 12, 7, 3, 15],
+            "num_inference_steps": [50, 20, 100, 75, 50, 50],
+        }
+    )
+
+
+def test_fit_transform_matches_sklearn():
+    df = _content_df()
+    transformer = ContentFeatureTransformer.fit(df, n_artist_styles=2, n_sources=2, n_seeds=2)
+    transformed = transformer.transform(df.copy())
+
+    expected = transformer.bucket(df.copy())
+    encoder = OneHotEncoder().fit(expected[["artist_style", "model_version", "seed", "source"]])
+    scaler = StandardScaler().fit(df[["guidance_scale", "num_inference_steps"]])
+    assert transformer.feature_names == list(
+        encoder.get_feature_names_out(["artist_style", "model_version", "seed", "source"])
+    )
+    assert (
+        transformed[transformer.feature_names].values
+        == encoder.transform(expected[["artist_style", "model_version", "seed", "source"]]).toarray()
+    ).all()
+    pd.testing.assert_frame_equal(
+        transformed[["guidance_scale", "num_inference_steps"]],
+        pd.DataFrame(
+            scaler.transform(df[["guidance_scale", "num_inference_steps"]]),
+            columns=["guidance_scale", "num_inference_steps"],
+        ),
+    )
+
+
+def test_single_row_keeps_the_fitted_feature_space():
+    df = _content_df()
+    transformer = ContentFeatureTransformer.fit(df, n_artist_styles=2, n_sources=2, n_seeds=2)
+    row = transformer.transform(df.iloc[[3]].copy())
+    assert list(row.columns) == list(transformer.transform(df.copy()).columns)
+    # "c" wasn't a top artist style when fit, so it is bucketed as other
+    assert row["artist_style_other"].tolist() == [1.0]
+
+
+def test_foxtrot_transformer_keeps_other_for_every_category():
+    from src.recommendation_system.ml_models.foxtrot.utils import fit_content_transformer
+
+    df = _content_df()
+    transformer = fit_content_transformer(df, ["a", "b"], ["x", "y"], [7, 8])
+    assert transformer.feature_names == [
+        "artist_style_a", "artist_style_b", "artist_style_other",
+        "model_version_1.4", "model_version_1.5",
+        "seed_7", "seed_8", "seed_other",
+        "source_x", "source_y", "source_other",
+    ]
+    # a single content row is scaled with the fitted mean, not its own
+    row = transformer.transform(df.iloc[[4]].copy())
+    assert row["guidance_scale"].iloc[0] < 0
+    assert row[["source_other", "seed_7"]].values.tolist() == [[1.0, 1.0]]
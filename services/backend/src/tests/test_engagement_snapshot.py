@@ -0,0 +1,71 @@
+from collections import namedtuple
+import src.data_structures.user_based_recommender.data_collector as data_collector
+from src.data_structures.user_based_recommender.alpha.UserBasedRecommender import UserBasedRecommender as Alpha
+from src.data_structures.user_based_recommender.charlie.UserBasedRecommender import UserBasedRecommender as Charlie
+from src.data_structures.user_based_recommender.data_collector import EngagementRow, EngagementSnapshot
+
+
+def test_append_keeps_users_under_the_per_user_cap():
+    snapshot = EngagementSnapshot.from_rows([
+        EngagementRow(10, 1, "Like", 1),
+        EngagementRow(11, 1, "Like", 1),
+        EngagementRow(12, 2, "Like", -1),
+    ])
+    appended = snapshot.append([
+        EngagementRow(13, 1, "Like", 1),
+        EngagementRow(14, 3, "Like", 1),
+        EngagementRow(15, 2, "Like", 1),
+    ], max_per_user=2)
+
+    # user 1 drops their oldest row, the rest fit, grouped by user like gather_data's rows
+    assert appended.rows() == [
+        EngagementRow(11, 1, "Like", 1),
+        EngagementRow(13, 1, "Like", 1),
+        EngagementRow(12, 2, "Like", -1),
+        EngagementRow(15, 2, "Like", 1),
+        EngagementRow(14, 3, "Like", 1),
+    ]
+    assert len(snapshot) == 3  # readers of the old snapshot are unaffected
+
+
+def test_refresh_skips_recommenders_that_dont_read_the_snapshot(monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(data_collector, "refresh_recommender", refreshed.append)
+    monkeypatch.setattr(Alpha, "_instance", object())
+    monkeypatch.setattr(Charlie, "_instance", object())
+    data_collector.refresh_recommenders(["alpha", "charlie", "delta"])
+    # charlie aggregates the engagement table itself, delta was never instantiated
+    assert refreshed == [Alpha]
+
+
+class _FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def limit(self, limit):
+        return _FakeQuery(self.rows[:limit])
+
+    def all(self):
+        return self.rows
+
+
+def test_ingestion_picks_up_engagements_that_commit_late(monkeypatch):
+    committed = []
+    Row = namedtuple("Row", ["id"] + EngagementRow._fields)
+    monkeypatch.setattr(
+        data_collector.DataCollector, "_query_new_engagements",
+        lambda self, after_id: _FakeQuery([row for row in committed if row.id > after_id]),
+    )
+    collector = object.__new__(data_collector.DataCollector)
+    collector.snapshot = EngagementSnapshot.from_rows([EngagementRow(10, 1, "Like", 1)])
+    collector.high_water_mark = 1
+    collector.seen_ids = {1}
+    committed[:] = [Row(1, 10, 1, "Like", 1), Row(3, 11, 1, "Like", 1)]
+    assert collector.ingest_new_engagements(batch_size=1) == 1
+
+    # id 2 was inserted before id 3 but committed after it was read
+    committed[:] = [Row(1, 10, 1, "Like", 1), Row(2, 12, 2, "Like", 1), Row(3, 11, 1, "Like", 1)]
+    assert collector.ingest_new_engagements(batch_size=1) == 1
+    assert collector.ingest_new_engagements() == 0
+    assert sorted(collector.get_snapshot().content_id.tolist()) == [10, 11, 12]
+    assert collector.high_water_mark == 3
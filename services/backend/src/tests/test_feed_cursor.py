@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import src.data_structures.approximate_nearest_neighbor as prompt_ann
+from src.data_structures.approximate_nearest_neighbor.prompt_embedding_store import PromptEmbeddingStore
+from src.data_structures.feed_cursor import FeedCursor
+from src.data_structures.popularity_leaderboard import LIKE_COUNT, PopularityLeaderboard
+
+
+def test_cursor_round_trip():
+    cursor = FeedCursor(limit=2, seed=0.25)
+    cursor.advance("Random", [(np.int64(7), 3), (np.float64(1.5), 4), (9, 5)])
+    cursor.advance("Empty", [])
+    decoded = FeedCursor.decode(cursor.next_cursor().encode())
+    assert (decoded.page, decoded.limit, decoded.seed) == (1, 2, 0.25)
+    assert decoded.after("Random") == (1.5, 4)  # a page moves past limit items
+    assert decoded.after("Empty") is None
+    with pytest.raises(ValueError):
+        FeedCursor.decode("not a cursor")
+
+
+def test_leaderboard_pages_by_cursor_like_by_offset(test_app):
+    leaderboard = object.__new__(PopularityLeaderboard)
+    leaderboard.boards = {LIKE_COUNT: (np.array([4, 1, 2, 3, 9, 5]), np.array([5.0, 3.0, 3.0, 3.0, 2.0, 1.0]))}
+    after = None
+    for offset in range(0, 6, 2):
+        content_ids, scores = leaderboard.top_after(LIKE_COUNT, 2, after)
+        assert (content_ids, scores) == leaderboard.top(LIKE_COUNT, 2, offset)
+        after = (scores[-1], content_ids[-1])
+    assert leaderboard.top_after(LIKE_COUNT, 2, after) == ([], [])
+
+
+def test_ann_after_pages_through_the_exact_neighbors(test_app, monkeypatch):
+    data = np.array([[0, 0], [1, 0], [0, 1], [-1, 0], [2, 2], [0, -3]], dtype=np.float32)
+    monkeypatch.setitem(test_app.config, "INSTANTIATE_PROMPT_ANN", True)
+    monkeypatch.setattr(prompt_ann, "read_data", lambda: data)
+    monkeypatch.setattr(
+        PromptEmbeddingStore, "_instance", PromptEmbeddingStore.from_arrays(data, [10, 11, 12, 13, 14, 15])
+    )
+    queried = []
+
+    class NearestThree:
+        # an index that can't go past the 3 nearest neighbors, in no particular order
+        def ann(self, q, k):
+            queried.append(k)
+            nearest = np.argsort(np.square(data - q).sum(axis=1), kind="stable")[:min(k, 3)][::-1]
+            return np.concatenate([nearest, np.full(max(0, k - 3), -1)])[:k]
+
+    monkeypatch.setitem(prompt_ann.INDEXES, 0.9, NearestThree())
+    monkeypatch.setattr(prompt_ann, "NEIGHBORS", None)
+
+    pages, after = [], None
+    for _ in range(4):
+        page, distances = prompt_ann.ann_after(10, 0.9, 2, after, return_distances=True)
+        pages.append(page)
+        if page:
+            after = (distances[-1], page[-1])
+    # itself first, then the three at distance 1 by content_id
+    assert pages == [[10, 11], [12, 13], [14, 15], []]
+    # the first page came from the index, the rest from the cached ranking, scanned once the index ran out
+    assert queried == [2, 4]
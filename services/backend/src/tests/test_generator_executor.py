@@ -0,0 +1,55 @@
+import threading
+import time
+
+from flask import request
+from src import db
+from src.recommendation_system.recommendation_flow.candidate_generators.AbstractGenerator import AbstractGenerator
+from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import GeneratorExecutor
+
+
+def _generator(name, content_ids, delay=0.0, sessions=None):
+    class Generator(AbstractGenerator):
+        def get_content_ids(self, team_name, user_id, limit, offset, seed, starting_point):
+            time.sleep(delay)
+            assert request.request_id == "request"  # runs in a copy of the request context
+            if sessions is not None:
+                sessions.append(db.session())
+            return content_ids, [threading.current_thread().name] * len(content_ids)
+
+        def _get_name(self):
+            return name
+    return Generator
+
+
+def test_generators_run_concurrently_and_slow_ones_are_dropped(test_app, monkeypatch):
+    dropped = []
+    monkeypatch.setattr(
+        "src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor.add_metric",
+        lambda **metric: dropped.append(metric),
+    )
+    monkeypatch.setattr(GeneratorExecutor, "_instance", None)
+    monkeypatch.setitem(test_app.config, "GENERATOR_EXECUTOR_MAX_WORKERS", 4)
+    monkeypatch.setitem(test_app.config, "GENERATOR_TIMEOUT_SECONDS", 0.5)
+    sessions = []
+    generators = [
+        _generator("first", [1, 2], delay=0.2, sessions=sessions),
+        _generator("slow", [3], delay=2),
+        _generator("third", [4], delay=0.2, sessions=sessions),
+    ]
+
+    with test_app.test_request_context():
+        request.request_id = "request"
+        request_session = db.session()
+        started = time.time()
+        results = GeneratorExecutor().run(generators, None, 7, 500, 0, 1, {})
+        took = time.time() - started
+
+    # every worker gets its own app context and so its own db session
+    assert len(sessions) == 2 and all(session is not request_session for session in sessions)
+    assert sessions[0] is not sessions[1]
+
+    assert [content_ids for content_ids, _ in results] == [[1, 2], [4]]
+    assert all(scores[0].startswith("candidate-generator") for _, scores in results)
+    assert took < 1.0
+    assert [(metric["funnel_name"], metric["metric_value"]) for metric in dropped] == [("slow", -1)]
+    assert dropped[0]["metric_metadata"]["dropped"] == "timeout"
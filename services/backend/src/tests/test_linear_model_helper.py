@@ -0,0 +1,56 @@
+import pandas as pd
+from src import db
+from src.api.content.models import Content, MediaType
+from src.api.engagement.models import Engagement, EngagementType
+from src.recommendation_system.recommendation_flow.filtering.linear_model_helper import (
+    DataCollector,
+    fetch_engagement_sample,
+)
+
+
+def test_aggregate_engagements_matches_custom_aggregation():
+    data = pd.DataFrame(
+        {
+            "content_id": [1, 1, 1, 2, 2],
+            "user_id": [7, 8, 9, 7, 8],
+            "engagement_type": ["Like", "Like", "MillisecondsEngagedWith", "Like", "MillisecondsEngagedWith"],
+            "engagement_value": [1, -1, 3000, 1, 1000],
+        }
+    )
+    dc = DataCollector()
+    aggregated = dc.aggregate_engagements("content", data, "content_id").set_index("content_id")
+    for content_id, group in data.groupby("content_id"):
+        expected = dc.custom_aggregation("content", group)
+        pd.testing.assert_series_equal(
+            aggregated.loc[content_id], expected.astype(float), check_names=False
+        )
+    assert dc.aggregate_engagements("user", data.iloc[:0], "user_id").empty
+
+
+def test_one_hot_encode_maps_unknown_to_other():
+    values = pd.Series(["van_gogh", "medieval", None, "van_gogh"])
+    encoded = DataCollector().one_hot_encode(values, ["van_gogh", "medieval"], "artist_style")
+    assert list(encoded.columns) == ["artist_style_van_gogh", "artist_style_medieval", "artist_style_other"]
+    assert encoded.values.tolist() == [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 0, 0]]
+
+
+def test_engagement_sample_keeps_the_first_rows_of_each_content(test_app, test_database, add_user):
+    users = [add_user(f"sample_user_{i}", "password") for i in range(4)]
+    db.session.add_all([Content(id=content_id, media_type=MediaType.Image) for content_id in (201, 202, 203)])
+    db.session.commit()
+    db.session.add_all([
+        Engagement(user_id=user.id, content_id=201, engagement_type=EngagementType.Like, engagement_value=1)
+        for user in users
+    ] + [
+        Engagement(
+            user_id=users[0].id, content_id=202,
+            engagement_type=EngagementType.MillisecondsEngagedWith, engagement_value=1500,
+        )
+    ])
+    db.session.commit()
+
+    sample = fetch_engagement_sample([201, 202, 203], 3).sort_values(['content_id', 'row_num'])
+    assert sample['content_id'].tolist() == [201, 201, 201, 202]
+    assert sample['user_id'].tolist() == [users[0].id, users[1].id, users[2].id, users[0].id]
+    assert sample['engagement_type'].tolist() == ['Like', 'Like', 'Like', 'MillisecondsEngagedWith']
+    assert sample['row_num'].tolist() == [1, 2, 3, 1]
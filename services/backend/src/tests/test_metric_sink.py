@@ -0,0 +1,23 @@
+from src.api.metrics.sink import MetricSink
+
+
+def test_metric_sink_drops_when_full_and_flushes_on_stop(test_app, monkeypatch):
+    written = []
+    monkeypatch.setattr(MetricSink, "_instance", None)
+    # keep the worker idle so the queue only drains on stop()
+    monkeypatch.setattr(MetricSink, "_run", lambda self: self._stop_event.wait())
+    monkeypatch.setattr(MetricSink, "_write", lambda self, rows: written.extend(rows))
+    test_app.config["METRIC_SINK_MAX_QUEUE_SIZE"] = 2
+    test_app.config["METRIC_SINK_FLUSH_SIZE"] = 1
+
+    sink = MetricSink()
+    sink.start(test_app)
+    assert sink.is_running()
+    assert sink.enqueue({"metric_value": 1})
+    assert sink.enqueue({"metric_value": 2})
+    assert not sink.enqueue({"metric_value": 3})
+    assert sink.stats()["dropped"] == 1
+
+    sink.stop()
+    assert not sink.is_running()
+    assert [row["metric_value"] for row in written] == [1, 2]
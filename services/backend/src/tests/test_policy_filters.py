@@ -0,0 +1,48 @@
+import pandas as pd
+
+from src.recommendation_system.recommendation_flow.filtering.fall_2023.AlphaFilter import (
+    AlphaFilter,
+    DataCollectorAlpha,
+)
+from src.recommendation_system.recommendation_flow.filtering.fall_2023.CharlieFilter import (
+    CharlieFilter,
+    DataCollectorCharlie,
+)
+
+
+def _without_engagements(monkeypatch, collector):
+    # what gather_data + feature_eng leave behind for a user and content without engagements
+    def gather_data(self, user_id, content_ids):
+        self.engagement_data = pd.DataFrame()
+
+    def feature_eng(self):
+        self.results = pd.DataFrame()
+    monkeypatch.setattr(collector, "gather_data", gather_data)
+    monkeypatch.setattr(collector, "feature_eng", feature_eng)
+
+
+def test_policy_filters_without_engagements_match_the_per_content_id_outcome(monkeypatch):
+    _without_engagements(monkeypatch, DataCollectorAlpha)
+    _without_engagements(monkeypatch, DataCollectorCharlie)
+    content_ids = [1, 2, 3]
+
+    alpha = AlphaFilter()
+    assert alpha._filter_ids(None, content_ids, 0, {"policy_filter_one": True}) == {1, 2, 3}
+    assert alpha._filter_ids(None, content_ids, 0, {"policy_filter_two": True}) == set()
+    charlie = CharlieFilter()
+    assert charlie._filter_ids(None, content_ids, 0, {"policy_filter_one": True}) == set()
+    assert charlie._filter_ids(None, content_ids, 0, {"policy_filter_two": True}) == set()
+    # the per content_id adapters give the same answers
+    dc = DataCollectorAlpha()
+    assert dc.policy_filter_one(pd.DataFrame(), 1) is True and dc.policy_filter_two(pd.DataFrame(), 1) is False
+
+
+def test_alpha_policy_filter_one_drops_seen_content_liked_no_more_than_disliked():
+    training_data = pd.DataFrame({
+        "content_id": [1, 1, 2, 3],
+        "content_engagement_time_avg": [2e3, 4e3, 2e3, 10],
+        "content_likes": [3, 3, 1, 0],
+        "content_dislikes": [1, 1, 1, 5],
+    })
+    # 2 was seen and not liked more than disliked, 3 wasn't seen long enough to judge, 4 has no engagements
+    assert DataCollectorAlpha().policy_filter_one_batch(training_data, [1, 2, 3, 4]) == {1, 3, 4}
@@ -0,0 +1,52 @@
+import pandas as pd
+from src.data_structures.popularity_leaderboard import (
+    DWELL_TIME_SUM,
+    LIKE_COUNT,
+    LONGEST_DWELL_TIME,
+    MAX_COLUMNS,
+    SUM_COLUMNS,
+    PopularityLeaderboard,
+)
+
+
+def _aggregates(rows):
+    return pd.DataFrame(rows, columns=["content_id"] + SUM_COLUMNS + MAX_COLUMNS, dtype=float).set_index("content_id")
+
+
+def test_leaderboard_refreshes_incrementally(test_app, monkeypatch):
+    # content_id, like_count, positive_like_count, dwell_count, dwell_time_sum, like_value_sum,
+    # like_value_created_sum, longest_dwell_time
+    batches = {
+        10: _aggregates([
+            (1, 3, 3, 0, 0, 3, 0, None), (2, 1, 1, 2, 5000, 1, 0, 4000), (3, 2, 0, 1, 900, -2, 0, None),
+        ]),
+        (12,): _aggregates([(2, 3, 3, 1, 3000, 3, 0, 3000)]),
+        # id 11 was inserted before id 12 but committed after the refresh that read it
+        (11,): _aggregates([(4, 0, 0, 1, 15000, 0, 0, 15000)]),
+    }
+    committed_ids = set(range(1, 11))
+    monkeypatch.setattr(PopularityLeaderboard, "_instance", None)
+    monkeypatch.setattr(PopularityLeaderboard, "_latest_engagement_id", lambda self: max(committed_ids))
+    monkeypatch.setattr(
+        PopularityLeaderboard, "_engagement_ids",
+        lambda self, low, high=None: {i for i in committed_ids if i > low and (high is None or i <= high)},
+    )
+    monkeypatch.setattr(
+        PopularityLeaderboard, "_query_aggregates",
+        lambda self, high_id=None, ids=None: batches[high_id if ids is None else tuple(ids)],
+    )
+
+    leaderboard = PopularityLeaderboard()
+    assert leaderboard.top(LIKE_COUNT, 10) == ([1, 3, 2], [3.0, 2.0, 1.0])
+    assert leaderboard.top(LIKE_COUNT, 1, offset=1) == ([3], [2.0])
+
+    committed_ids.add(12)
+    assert leaderboard.refresh() == 1
+    assert leaderboard.top(LIKE_COUNT, 10)[0] == [2, 1, 3]
+    assert leaderboard.top(DWELL_TIME_SUM, 10) == ([2, 3], [8000.0, 900.0])
+
+    committed_ids.add(11)
+    assert leaderboard.refresh() == 1
+    assert leaderboard.refresh() == 0
+    assert leaderboard.top(DWELL_TIME_SUM, 10) == ([4, 2, 3], [15000.0, 8000.0, 900.0])
+    assert leaderboard.top(LONGEST_DWELL_TIME, 10) == ([4, 2], [15000.0, 4000.0])
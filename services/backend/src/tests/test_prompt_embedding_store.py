@@ -0,0 +1,48 @@
+import numpy as np
+
+import src.data_structures.approximate_nearest_neighbor.prompt_embedding_store as prompt_embedding_store
+from src.api.content.models import Content, GeneratedContentMetadata, MediaType, ModelType
+from src.data_structures.approximate_nearest_neighbor import get_embedding
+from src.data_structures.approximate_nearest_neighbor.prompt_embedding_store import PromptEmbeddingStore
+
+
+def _add_metadata(db, content_id, prompt_embedding):
+    db.session.add(Content(id=content_id, media_type=MediaType.Image))
+    db.session.add(GeneratedContentMetadata(
+        content_id=content_id, model=ModelType.StableDiffusion, model_version="1.5", prompt_embedding=prompt_embedding,
+    ))
+    db.session.commit()
+
+
+def test_store_is_built_once_and_memory_mapped(test_app, test_database, monkeypatch, tmp_path):
+    monkeypatch.setattr(prompt_embedding_store, "PICKLED_EMBEDDINGS_PATH", str(tmp_path / "missing.pkl"))
+    monkeypatch.setitem(test_app.config, "PROMPT_EMBEDDING_STORE_DIR", str(tmp_path / "store"))
+    for content_id, prompt_embedding in [(5, [0.5, 1.0]), (2, [2.0, 3.0]), (9, None)]:
+        _add_metadata(test_database, content_id, prompt_embedding)
+
+    monkeypatch.setattr(PromptEmbeddingStore, "_instance", None)
+    store = PromptEmbeddingStore()
+    assert store.content_ids.tolist() == [2, 5]
+    assert store.embeddings.dtype == np.float32
+    assert store.get(5).tolist() == [0.5, 1.0]
+    assert store.rows([5, 9, 1000, 2]).tolist() == [1, -1, -1, 0]
+
+    # reopened from the files
+    monkeypatch.setattr(PromptEmbeddingStore, "_instance", None)
+    store = PromptEmbeddingStore()
+    assert isinstance(store.embeddings, np.memmap)
+    assert store.get(2).tolist() == [2.0, 3.0]
+
+    # content created since the store was built is read from the database
+    _add_metadata(test_database, 7, [4.0, 4.0])
+    assert store.row(7) is None
+    column = store.column([2, 7, 9])
+    assert column[0].tolist() == [2.0, 3.0] and column[1] == [4.0, 4.0] and column[2] is None
+    assert get_embedding(7).tolist() == [4.0, 4.0]
+    assert get_embedding(9) is None and get_embedding(1000) is None
+
+    # the content table changed, so the next boot rebuilds the store with it
+    monkeypatch.setattr(PromptEmbeddingStore, "_instance", None)
+    store = PromptEmbeddingStore()
+    assert store.content_ids.tolist() == [2, 5, 7]
+    assert store.get(7).tolist() == [4.0, 4.0]
@@ -0,0 +1,59 @@
+import sys
+
+import numpy as np
+import pytest
+
+from src.data_structures.approximate_nearest_neighbor.quantized_index import QuantizedIndex, compare
+
+
+def _exact_neighbors(data, query, k):
+    distances = np.linalg.norm(data - query, axis=1)
+    order = np.lexsort((np.arange(len(data)), distances))[:k]
+    return order, distances[order]
+
+
+@pytest.mark.parametrize("quantization, bytes_per_value", [("float16", 2), ("int8", 1)])
+def test_rerank_returns_the_exact_neighbors(quantization, bytes_per_value):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(2000, 64)).astype(np.float32)
+    index = QuantizedIndex(data, quantization, rerank_factor=4)
+    assert index.codes.nbytes == data.nbytes * bytes_per_value // 4
+
+    queries = data[:20] + rng.normal(scale=0.1, size=(20, 64)).astype(np.float32)
+    indices, distances = index.ann(queries, k=10, return_distances=True)
+    for query, found, found_distances in zip(queries, indices, distances):
+        expected, expected_distances = _exact_neighbors(data, query, 10)
+        assert found.tolist() == expected.tolist()
+        np.testing.assert_allclose(found_distances, expected_distances, rtol=1e-5)
+
+
+def test_queries_scanned_in_blocks_find_the_same_neighbors(monkeypatch):
+    rng = np.random.default_rng(2)
+    data = rng.normal(size=(300, 8)).astype(np.float32)
+    queries = rng.normal(size=(7, 8)).astype(np.float32)
+    index = QuantizedIndex(data, "int8")
+    expected = index.ann(queries, k=5, return_distances=True)
+    # two queries per block, the package's quantized_index() shadows the module as an attribute
+    monkeypatch.setattr(sys.modules[QuantizedIndex.__module__], "QUERY_BLOCK_BYTES", 2 * 4 * len(data))
+    found = index.ann(queries, k=5, return_distances=True)
+    assert found[0].tolist() == expected[0].tolist()
+    np.testing.assert_array_equal(found[1], expected[1])
+
+
+def test_ann_pads_missing_neighbors_and_keeps_the_query_shape(tmp_path):
+    data = np.array([[0, 0], [1, 0], [3, 0]], dtype=np.float32)
+    index = QuantizedIndex(data, "int8")
+    indices, distances = index.ann(np.array([0.9, 0], dtype=np.float32), k=5, return_distances=True)
+    assert indices.tolist() == [1, 0, 2, -1, -1]
+    assert distances[:3] == pytest.approx([0.1, 0.9, 2.1], abs=1e-6) and np.isinf(distances[3:]).all()
+
+    index.save(tmp_path / "index")
+    loaded = QuantizedIndex.load(tmp_path / "index", data)
+    assert loaded.ann(np.array([[2.9, 0]]), k=2).tolist() == [[2, 1]]
+
+
+def test_compare_reports_recall_latency_and_memory():
+    data = np.random.default_rng(1).normal(size=(500, 16)).astype(np.float32)
+    report = {row["index"]: row for row in compare(data, data[:5], k=5)}
+    assert report["int8 + rerank"]["recall"] == 1.0
+    assert report["int8 + rerank"]["bytes"] < report["float16 + rerank"]["bytes"] < data.nbytes
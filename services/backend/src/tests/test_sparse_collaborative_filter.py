@@ -0,0 +1,43 @@
+import numpy as np
+from src.data_structures.user_based_recommender.sparse_collaborative_filter import (
+    SparseCollaborativeFilter,
+    top_k_similar_rows,
+)
+
+
+def test_top_k_similar_rows():
+    matrix = np.array([[1, 0, 1], [1, 0, 0.9], [0, 1, 0], [0.1, 1, 0]])
+    neighbours = top_k_similar_rows(matrix, n_neighbours=1)
+    assert neighbours.shape == (4, 4)
+    assert neighbours.getrow(0).indices.tolist() == [1]
+    assert neighbours.getrow(2).indices.tolist() == [3]
+    assert neighbours.diagonal().sum() == 0
+
+
+def test_recommend_scores_unseen_content_of_neighbours():
+    user_ids = [1, 1, 2, 2, 2, 3, 3]
+    content_ids = [10, 11, 10, 11, 12, 20, 21]
+    values = [1, 1, 1, 1, 5, 1, 1]
+    engine = SparseCollaborativeFilter(user_ids, content_ids, values, n_neighbours=1)
+
+    assert [user for user, _ in engine.similar_users(1)] == [2]
+    content, scores = engine.recommend(1, 10)
+    assert content == [12]
+    assert scores[0] > 0
+    assert engine.recommend(1, 10, exclude_content_ids=[12]) == ([], [])
+    assert engine.recommend(404, 10) == ([], [])
+
+
+def test_similarity_can_keep_the_last_value_of_duplicate_interactions():
+    # user 2 disliked content 10, then liked it
+    user_ids = [1, 2, 2, 2]
+    content_ids = [10, 10, 12, 10]
+    values = [1, -1, 5, 1]
+    summed = SparseCollaborativeFilter(user_ids, content_ids, values, n_neighbours=1)
+    assert summed.similar_users(1) == []
+
+    last = SparseCollaborativeFilter(user_ids, content_ids, values, n_neighbours=1, similarity_keep_last=True)
+    assert [user for user, _ in last.similar_users(1)] == [2]
+    # the recommendations still sum the duplicates
+    assert last.recommend(1, 10, weighted=False) == ([12], [5.0])
+    assert last.interactions.toarray().tolist() == [[1, 0], [0, 5]]
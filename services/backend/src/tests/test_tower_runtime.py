@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from src.recommendation_system.ml_models.tower_runtime import TowerRunner, benchmark  # noqa: E402
+
+
+class Towers(torch.nn.Module):
+    # the layers the teams' towers are made of
+    def __init__(self):
+        super(Towers, self).__init__()
+        self.user_tower = torch.nn.Sequential(
+            torch.nn.Linear(12, 16), torch.nn.LeakyReLU(), torch.nn.BatchNorm1d(16), torch.nn.Dropout(0.5),
+            torch.nn.Linear(16, 4),
+        )
+        self.content_tower = torch.nn.Linear(8, 4)
+
+    def forward_user(self, user_tensor):
+        return self.user_tower(user_tensor)
+
+    def forward_content(self, content_tensor):
+        return self.content_tower(content_tensor)
+
+
+class RandomTowers(torch.nn.Module):
+    def forward_content(self, content_tensor):
+        return torch.randn((len(content_tensor), 4))
+
+
+@pytest.mark.parametrize("backend", ["torchscript", "onnx"])
+def test_compiled_towers_match_eager(backend):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    torch.manual_seed(0)
+    model = Towers().eval()
+    eager, compiled = TowerRunner(model), TowerRunner(model, backend, threads=1)
+    for batch in [1, 3, 50]:  # the export is made on the first shape and reused for the others
+        user_tensor, content_tensor = torch.rand((batch, 12)), torch.rand((batch, 8))
+        np.testing.assert_allclose(compiled.user(user_tensor), eager.user(user_tensor), rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(
+            compiled.content(content_tensor), eager.content(content_tensor), rtol=1e-4, atol=1e-5
+        )
+        assert compiled.content(content_tensor).dtype == np.float32
+    assert torch.get_num_threads() == 1
+
+
+def test_towers_that_dont_match_their_export_run_eagerly():
+    runner = TowerRunner(RandomTowers(), "torchscript")
+    assert runner.content(torch.rand((3, 8))).shape == (3, 4)
+    assert runner._compiled[("content", 2)].__qualname__ == "TowerRunner._eager.<locals>.<lambda>"
+
+
+def test_benchmark_times_every_backend_and_tower():
+    timings = benchmark(Towers().eval(), 12, 8, backends=["eager", "torchscript"], content_batch=20, repeat=2)
+    assert set(timings) == {(backend, tower) for backend in ["eager", "torchscript"] for tower in ["user", "content"]}
+    assert all(ms > 0 for ms in timings.values())
@@ -0,0 +1,57 @@
+from flask import request
+from src.api.metrics.models import MetricFunnelType, TeamName
+from src.api.metrics.tracing import finish_trace, set_trace_owner, span
+from src.recommendation_system.recommendation_flow.candidate_generators.AbstractGenerator import AbstractGenerator
+from src.recommendation_system.recommendation_flow.candidate_generators.GeneratorExecutor import GeneratorExecutor
+
+
+def _generator(name):
+    class Generator(AbstractGenerator):
+        def _get_content_ids(self, user_id, limit, offset, seed, starting_point):
+            with span("query"):
+                return [1, 2], [0.5, 0.5]
+
+        def _get_name(self):
+            return name
+    return Generator
+
+
+def test_spans_nest_across_generator_workers_and_are_emitted(test_app, monkeypatch):
+    metrics = []
+    for module in ["tracing", "crud"]:
+        monkeypatch.setattr(f"src.api.metrics.{module}.add_metric", lambda **metric: metrics.append(metric))
+    monkeypatch.setitem(test_app.config, "TRACING_ENABLED", True)
+    monkeypatch.setitem(test_app.config, "TRACING_SERVER_TIMING_HEADER", True)
+    monkeypatch.setitem(test_app.config, "GENERATOR_EXECUTOR_MAX_WORKERS", 2)
+    monkeypatch.setattr(GeneratorExecutor, "_instance", None)
+
+    with test_app.test_request_context():
+        request.request_id = "request"
+        set_trace_owner(TeamName.Alpha_F2023, 7)
+        with span("pipeline"):
+            GeneratorExecutor().run([_generator("first"), _generator("second")], TeamName.Alpha_F2023, 7, 10, 0, 1, {})
+        response = finish_trace(test_app.response_class())
+
+    spans = [
+        metric for metric in metrics
+        if metric["metric_metadata"] is not None and "span" in metric["metric_metadata"]
+    ]
+    assert sorted(metric["funnel_name"] for metric in spans) == [
+        "pipeline",
+        "pipeline.generator-first",
+        "pipeline.generator-first.query",
+        "pipeline.generator-second",
+        "pipeline.generator-second.query",
+    ]
+    generator_span = next(metric for metric in spans if metric["funnel_name"] == "pipeline.generator-first")
+    assert generator_span["metric_funnel_type"] == MetricFunnelType.CandidateGeneration
+    assert generator_span["team_name"] == TeamName.Alpha_F2023 and generator_span["user_id"] == 7
+    server_timing = response.headers["Server-Timing"].split(", ")
+    assert len(server_timing) == 5 and any(entry.startswith("pipeline;dur=") for entry in server_timing)
+
+
+def test_spans_are_free_when_tracing_is_off(test_app):
+    with test_app.test_request_context():
+        with span("pipeline"):
+            pass
+        assert getattr(request, "trace", None) is None
@@ -0,0 +1,35 @@
+from src.data_structures.lru_cache import LRUCache
+from src.data_structures.user_embedding_cache import UserEmbeddingCache, invalidate_user_embeddings
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("src.data_structures.lru_cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # "b" is the least recently used
+    assert cache.get("b") is None
+    now[0] = 11.0
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+
+
+def test_new_engagement_invalidates_user_embeddings(test_app, monkeypatch):
+    monkeypatch.setattr(UserEmbeddingCache, "_instance", None)
+    test_app.config["USER_EMBEDDING_CACHE_SIZE"] = 10
+    cache = UserEmbeddingCache()
+    cache.put("alpha", 1, [0.1], cache.generation(1))
+    cache.put("beta", 1, [0.2], cache.generation(1))
+    cache.put("alpha", 2, [0.3], cache.generation(2))
+
+    generation = cache.generation(1)
+    invalidate_user_embeddings(1)
+    assert cache.get("alpha", 1) is None
+    assert cache.get("beta", 1) is None
+    assert cache.get("alpha", 2) == [0.3]
+    # computed before the engagement landed, so it must not be cached
+    cache.put("alpha", 1, [0.4], generation)
+    assert cache.get("alpha", 1) is None
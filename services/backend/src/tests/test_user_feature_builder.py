@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from src.recommendation_system.ml_models.user_feature_builder import UserFeatureBuilder
+
+
+def _reference_frame(df, top_n_content):
+    # the groupby().apply() + iterrows() the two tower wrappers used to run
+    def aggregate_engagement(group):
+        is_like = group['engagement_type'] == 'Like'
+        return pd.Series({
+            'millisecond_engagement_sum': group.loc[~is_like, 'engagement_value'].sum(),
+            'likes_count': group.loc[is_like & (group['engagement_value'] == 1)].shape[0],
+            'dislikes_count': group.loc[is_like & (group['engagement_value'] == -1)].shape[0],
+        })
+
+    n = len(top_n_content)
+    vectors = {}
+    aggregate = (
+        df[df['content_id'].isin(top_n_content)]
+        .groupby(['user_id', 'content_id'])
+        .apply(aggregate_engagement)
+        .reset_index()
+    )
+    for _, row in aggregate.iterrows():
+        vector = vectors.setdefault(row['user_id'], np.zeros(3 * n))
+        idx = top_n_content.index(row['content_id'])
+        vector[[idx, n + idx, 2 * n + idx]] = row[['millisecond_engagement_sum', 'likes_count', 'dislikes_count']]
+    return pd.DataFrame.from_dict(vectors, orient='index').sort_index()
+
+
+def test_matches_the_groupby_iterrows_features():
+    rng = np.random.default_rng(0)
+    size = 2000
+    likes = rng.random(size) < 0.4
+    df = pd.DataFrame({
+        'user_id': rng.integers(1, 40, size),
+        'content_id': rng.integers(100, 160, size),
+        'engagement_type': np.where(likes, 'Like', 'MillisecondsEngagedWith'),
+        'engagement_value': np.where(likes, rng.choice([-1, 1], size), rng.integers(0, 20000, size)),
+    })
+    top_n_content = rng.permutation(np.arange(100, 170))[:30].tolist()
+
+    frame = UserFeatureBuilder(top_n_content).frame(df)
+    expected = _reference_frame(df, top_n_content)
+    assert frame.index.tolist() == expected.index.tolist()
+    np.testing.assert_array_equal(frame.values, expected.values)
+    assert frame.columns[[0, 30, 60]].tolist() == ['ms_engaged_0', 'like_vector_0', 'dislike_vector_0']
+
+    # users without a top content engagement are all zeros when asked for
+    user_ids, matrix = UserFeatureBuilder(top_n_content).matrix(df.iloc[:0], [5, 6])
+    assert user_ids.tolist() == [5, 6] and matrix.shape == (2, 90) and not matrix.any()